@@ -0,0 +1,174 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(model_name, prompt, generation_kwargs) -> str:
+    # the generated text only depends on these, so a changed prompt simply gets a new key
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "generation": generation_kwargs},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier cache for generated analyses: an in-memory LRU in front of a SQLite file.
+
+    The disk tier evicts least recently used rows, counting hits served from memory too: those
+    are batched and written to the accessed column on the next put. Its size is a running
+    total, recounted from the table every resync_every puts and before evicting, because
+    worker processes write to the same file.
+    """
+
+    def __init__(self, path="analysis_cache.sqlite", max_memory_entries=256,
+                 max_disk_bytes=64 * 1024 * 1024, ttl_seconds=12 * 60 * 60, resync_every=256):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.resync_every = resync_every
+
+        self._memory = OrderedDict()
+        # memory hits not yet written to the disk rows, key -> time
+        self._touched = {}
+        self._disk_bytes = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS analyses_accessed ON analyses (accessed)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS analyses_created ON analyses (created)")
+            self._db.commit()
+            self._disk_bytes = self._count_disk()
+
+    def _count_disk(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+
+    def _expired(self, created, now) -> bool:
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    if self._db is not None:
+                        self._touched[key] = now
+                    self.stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created, size FROM analyses WHERE key = ?",
+                                       (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        self._db.execute("UPDATE analyses SET accessed = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._touched.pop(key, None)
+                        self._remember(key, row[0], row[1])
+                        self.stats["disk_hits"] += 1
+                        return row[0]
+                    self._db.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._disk_bytes -= row[2]
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self.stats["stores"] += 1
+            if self._db is None:
+                return
+            size = len(value.encode("utf-8"))
+            old = self._db.execute("SELECT size FROM analyses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO analyses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._touched.pop(key, None)
+            self._disk_bytes += size - (old[0] if old else 0)
+            self._puts += 1
+            if self._puts % self.resync_every == 0:
+                self._disk_bytes = self._count_disk()
+            self._flush_touched()
+            self._evict_disk(now)
+            self._db.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE analyses SET accessed = MAX(accessed, ?) WHERE key = ?",
+                                 [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def _evict_disk(self, now):
+        if self.ttl_seconds is not None:
+            expired = self._db.execute("SELECT key, size FROM analyses WHERE created < ?",
+                                       (now - self.ttl_seconds,)).fetchall()
+            if expired:
+                self._db.executemany("DELETE FROM analyses WHERE key = ?", [(key,) for key, _ in expired])
+                self._disk_bytes -= sum(size for _, size in expired)
+                self.stats["evictions"] += len(expired)
+
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        # other processes may have added or evicted rows, so the total is recounted before acting on it
+        total = self._disk_bytes = self._count_disk()
+        if total <= self.max_disk_bytes:
+            return
+        # least recently used rows go first until the file is back under budget
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM analyses ORDER BY accessed"):
+            if total <= self.max_disk_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM analyses WHERE key = ?", victims)
+        self._disk_bytes = total
+        self.stats["evictions"] += len(victims)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analyses")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return hits / lookups if lookups else 0.0
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._flush_touched()
+                self._db.commit()
+                self._db.close()
+                self._db = None
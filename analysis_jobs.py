@@ -0,0 +1,211 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+DROPPED = "dropped"
+
+# user requests always run before speculative prefetches
+USER_PRIORITY = 0
+PREFETCH_PRIORITY = 1
+
+
+class AnalysisJob:
+    __slots__ = ('symbol', 'status', 'result', 'error', 'prefetch', 'generation', 'submitted', 'started',
+                 'first_token', 'finished', 'chunks', '_done')
+
+    def __init__(self, symbol, prefetch, generation=0):
+        self.symbol = symbol
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.prefetch = prefetch
+        # the queue's data generation at submit time, a result from an older one is thrown away
+        self.generation = generation
+        self.submitted = time.time()
+        self.started = None
+        self.first_token = None
+        self.finished = None
+        # AI text received so far, filled while a streaming queue generates
+        self.chunks = []
+        self._done = threading.Event()
+
+    @property
+    def pending(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def partial_text(self) -> str:
+        return "".join(self.chunks)
+
+    def wait(self, timeout=None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "symbol": self.symbol,
+            "status": self.status,
+            "error": self.error,
+            "prefetch": self.prefetch,
+            "queued_seconds": (self.started or time.time()) - self.submitted,
+            "run_seconds": (self.finished or time.time()) - self.started if self.started else 0.0,
+            "first_token_seconds": self.first_token - self.submitted if self.first_token else None,
+        }
+
+
+class AnalysisJobQueue:
+    """Runs analyzer.analyze_stock on background threads with a bounded, deduplicated queue.
+
+    There is at most one job per symbol: submitting a symbol that is queued, running or
+    already finished returns that job. When the queue is full a prefetch is skipped and a
+    user request displaces the newest prefetch; if only user requests are queued, submit
+    raises queue.Full. With stream=True jobs run analyze_stock_stream and job.partial_text
+    grows while the model decodes. invalidate() starts a new data generation: queued jobs are
+    dropped and jobs already running finish as dropped instead of publishing a stale result.
+    """
+
+    def __init__(self, analyzer, workers=1, max_pending=32, max_finished=256, stream=False):
+        self.analyzer = analyzer
+        self.stream = stream
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+
+        self._jobs = OrderedDict()
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._pending = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "deduplicated": 0, "prefetched": 0, "dropped": 0, "completed": 0}
+
+        self._workers = [threading.Thread(target=self._run, name=f"analysis-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, symbol, prefetch=False):
+        with self._lock:
+            job = self._jobs.get(symbol)
+            if job is not None and job.status != DROPPED:
+                self._jobs.move_to_end(symbol)
+                if job.status == FAILED and not prefetch:
+                    del self._jobs[symbol]
+                else:
+                    self.stats["deduplicated"] += 1
+                    if job.status == QUEUED and job.prefetch and not prefetch:
+                        # somebody is now waiting for it, requeue at user priority
+                        job.prefetch = False
+                        self._queue.put((USER_PRIORITY, next(self._order), job))
+                    return job
+
+            if self._pending >= self.max_pending:
+                # prefetches never displace anything, user requests displace the newest prefetch
+                if prefetch:
+                    return None
+                if not self._drop_prefetch():
+                    raise queue.Full("Analysis queue is full")
+
+            job = AnalysisJob(symbol, prefetch, self.generation)
+            self._jobs[symbol] = job
+            self._pending += 1
+            self.stats["prefetched" if prefetch else "submitted"] += 1
+            self._queue.put((PREFETCH_PRIORITY if prefetch else USER_PRIORITY, next(self._order), job))
+            return job
+
+    def _drop_prefetch(self) -> bool:
+        for job in reversed(self._jobs.values()):
+            if job.status == QUEUED and job.prefetch:
+                self._drop(job)
+                return True
+        return False
+
+    def _drop(self, job):
+        job.status = DROPPED
+        job._done.set()
+        self._pending -= 1
+        self.stats["dropped"] += 1
+
+    def prefetch(self, symbols) -> list:
+        return [job for job in (self.submit(symbol, prefetch=True) for symbol in symbols) if job is not None]
+
+    def status(self, symbol):
+        with self._lock:
+            return self._jobs.get(symbol)
+
+    def result(self, symbol, timeout=None):
+        job = self.submit(symbol)
+        job.wait(timeout)
+        return job.result if job.status == DONE else None
+
+    def invalidate(self, symbols=None):
+        """Forgets the jobs of symbols (all by default), e.g. after new stock data was loaded.
+
+        Finished jobs are forgotten, queued ones dropped, and running ones will drop their result
+        when they finish, so the next submit starts over on the new data.
+        """
+        with self._lock:
+            self.generation += 1
+            targets = set(symbols) if symbols is not None else None
+            for symbol, job in list(self._jobs.items()):
+                if targets is not None and symbol not in targets:
+                    # not invalidated, still current in the new generation
+                    job.generation = self.generation
+                    continue
+                del self._jobs[symbol]
+                if job.status == QUEUED:
+                    self._drop(job)
+
+    def pending_count(self) -> int:
+        return self._pending
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            with self._lock:
+                # a requeued job has two entries, and dropped prefetches stay in the heap
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                job.started = time.time()
+
+            result = {"error": "Analysis did not finish"}
+            try:
+                result = self._stream(job) if self.stream else self.analyzer.analyze_stock(job.symbol)
+            except Exception as e:
+                # the worker thread must survive, or every later job would stay queued forever
+                result = {"error": str(e)}
+            finally:
+                with self._lock:
+                    job.finished = time.time()
+                    if job.generation != self.generation:
+                        # invalidated while it ran, the result was computed from replaced data
+                        self._drop(job)
+                    else:
+                        job.result = result
+                        job.error = result.get("error")
+                        job.status = FAILED if job.error else DONE
+                        self._pending -= 1
+                        self.stats["completed"] += 1
+                    self._trim()
+                job._done.set()
+
+    def _stream(self, job):
+        result = {"error": "Analysis stream ended early"}
+        for event, payload in self.analyzer.analyze_stock_stream(job.symbol):
+            if event == "token":
+                if job.first_token is None:
+                    job.first_token = time.time()
+                job.chunks.append(payload)
+            elif event in ("done", "error"):
+                result = payload
+        return result
+
+    def _trim(self):
+        finished = [symbol for symbol, job in self._jobs.items() if not job.pending]
+        for symbol in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[symbol]
@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from analysis_cache import AnalysisCache
+from inference import InferenceConfig
+from main import EnhancedStockAnalyzer
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+MAX_BODY_BYTES = 1 << 20
+ENDPOINTS = ('analyze', 'screen', 'health', 'metrics')
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class Overloaded(Exception):
+    pass
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """Coalesces identical symbol requests and groups the rest into analyze_many batches.
+
+    A symbol that is already queued or generating is never queued twice: later requests wait on
+    the same future. The model runs on one thread; while it works on a batch, new symbols queue
+    up and go out together as the next one. A batch leaves as soon as it is full or its oldest
+    symbol has waited max_wait seconds. With max_queue symbols waiting, new ones are refused
+    with Overloaded instead of piling up behind a queue that cannot drain in time.
+    """
+
+    def __init__(self, analyzer, max_batch_size=8, max_wait=0.02, max_queue=64):
+        self.analyzer = analyzer
+        self.metrics = analyzer.metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue = deque()
+        self._in_flight = {}
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis-model")
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        for future in self._in_flight.values():
+            if not future.done():
+                future.set_result({"error": "Service shutting down"})
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def admit(self, symbols):
+        # all or nothing, a batch request never gets half its symbols queued
+        new = sum(1 for symbol in dict.fromkeys(symbols) if symbol not in self._in_flight)
+        if new and len(self._queue) + new > self.max_queue:
+            self.metrics.inc("stock_analysis_service_rejected_total", reason="queue_full")
+            raise Overloaded(f"Analysis queue is full ({len(self._queue)} waiting)")
+
+    def submit(self, symbols) -> dict:
+        """Queues every symbol that is not already in flight and returns a future per symbol.
+
+        Admission and queueing happen with no await in between, so no other request can take
+        the room that admit() found: either all the symbols are queued or none are.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        self.admit(symbols)
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for symbol in symbols:
+            future = self._in_flight.get(symbol)
+            if future is None:
+                future = self._in_flight[symbol] = loop.create_future()
+                self._queue.append((symbol, time.perf_counter()))
+            else:
+                self.metrics.inc("stock_analysis_service_coalesced_total")
+            futures[symbol] = future
+        self._wakeup.set()
+        return futures
+
+    async def analyze(self, symbol) -> dict:
+        # shielded, so a caller that gives up does not cancel the result for everyone else waiting on it
+        return await asyncio.shield(self.submit([symbol])[symbol])
+
+    async def analyze_all(self, symbols) -> dict:
+        futures = self.submit(symbols)
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return dict(zip(futures, results))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            deadline = self._queue[0][1] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch_size))]
+            now = time.perf_counter()
+            for _, queued_at in batch:
+                self.metrics.observe("stock_analysis_service_queue_seconds", now - queued_at)
+            self.metrics.observe("stock_analysis_service_batch_size", len(batch), buckets=BATCH_BUCKETS)
+
+            symbols = [symbol for symbol, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.analyzer.analyze_many, symbols,
+                                                     self.max_batch_size)
+            except Exception as e:
+                results = {symbol: {"error": str(e)} for symbol in symbols}
+
+            for symbol in symbols:
+                future = self._in_flight.pop(symbol, None)
+                if future is not None and not future.done():
+                    future.set_result(results.get(symbol, {"error": "No result"}))
+
+
+class AnalysisService:
+    """Asyncio HTTP/1.1 API over an EnhancedStockAnalyzer.
+
+    GET  /analyze/<symbol>[?ai=0]   one stock, the AI text goes through the MicroBatcher
+    POST /analyze/batch             {"symbols": [...], "ai": true}
+    POST /screen                    Screener.screen keyword arguments as a JSON object
+    GET  /health, GET /metrics      status and the metrics registry in Prometheus format
+
+    Connections beyond max_connections and symbols beyond the batcher's queue get 503 with
+    Retry-After; a request still waiting after request_timeout seconds gets 504.
+    """
+
+    def __init__(self, analyzer, max_batch_size=8, max_wait=0.02, max_queue=64, max_connections=256,
+                 request_timeout=120.0):
+        self.analyzer = analyzer
+        self.metrics = analyzer.metrics
+        self.batcher = MicroBatcher(analyzer, max_batch_size, max_wait, max_queue)
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self.connections = 0
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=8000):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.close()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            if self.connections > self.max_connections:
+                self.metrics.inc("stock_analysis_service_rejected_total", reason="connections")
+                await self._respond(writer, 503, {"error": "Too many connections"}, keep_alive=False)
+                return
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                method, target, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                status, payload = await self._dispatch(method, target, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            # NaN and inf are not JSON, strict parsers reject the whole body, so they go out as null
+            body, content_type = json.dumps(_finite(payload), default=_json_default,
+                                            allow_nan=False).encode(), "application/json"
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        path = url.path.rstrip('/')
+        endpoint = _endpoint(path)
+        start = time.perf_counter()
+        try:
+            status, payload = await asyncio.wait_for(self._route(method, path, parse_qs(url.query), body),
+                                                     self.request_timeout)
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Overloaded as e:
+            status, payload = 503, {"error": str(e)}
+        except asyncio.TimeoutError:
+            self.metrics.inc("stock_analysis_service_rejected_total", reason="timeout")
+            status, payload = 504, {"error": f"No result within {self.request_timeout:g}s"}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        self.metrics.inc("stock_analysis_service_requests_total", endpoint=endpoint, status=str(status))
+        self.metrics.observe("stock_analysis_service_seconds", time.perf_counter() - start, endpoint=endpoint)
+        return status, payload
+
+    async def _route(self, method, path, query, body):
+        if path == '/health':
+            return 200, {"status": "ok", "stocks": len(self.analyzer.records), "queued": self.batcher.queued,
+                         "in_flight": self.batcher.in_flight, "connections": self.connections}
+        if path == '/metrics':
+            return 200, self.metrics.to_prometheus()
+        if path == '/analyze/batch':
+            _expect(method, 'POST')
+            request = _json_body(body)
+            symbols = request.get('symbols')
+            if not isinstance(symbols, list) or not symbols:
+                raise HTTPError(400, "'symbols' must be a non-empty list")
+            include_ai = bool(request.get('ai', True))
+            results = await self._analyze_all(symbols, include_ai)
+            # unknown symbols are the caller's mistake, a failed analysis of a known one is ours
+            failed = [r for symbol, r in results.items() if "error" in r and symbol in self.analyzer.records]
+            return (self._failure_status(include_ai) if failed else 200), results
+        if path.startswith('/analyze/'):
+            _expect(method, 'GET')
+            symbol = unquote(path[len('/analyze/'):])
+            include_ai = query.get('ai', ['1'])[0].lower() not in ('0', 'false', 'no')
+            if symbol not in self.analyzer.records:
+                raise HTTPError(404, f"Symbol {symbol} not found")
+            result = await self._analyze(symbol, include_ai)
+            return (self._failure_status(include_ai) if "error" in result else 200), result
+        if path == '/screen':
+            _expect(method, 'POST')
+            return 200, await self._screen(_json_body(body))
+        raise HTTPError(404, f"No route for {path or '/'}")
+
+    def _failure_status(self, include_ai) -> int:
+        # a model that never loaded is an outage clients can wait out, anything else is a server error
+        if include_ai and not self.analyzer.rules_only and not self.analyzer.model_loaded:
+            return 503
+        return 500
+
+    async def _analyze(self, symbol, include_ai):
+        if include_ai and not self.analyzer.rules_only:
+            return await self.batcher.analyze(symbol)
+        # the rule-based part is a few column reads, it does not need to wait for the model thread
+        return await asyncio.get_running_loop().run_in_executor(None, self.analyzer.analyze_stock, symbol, False)
+
+    async def _analyze_all(self, symbols, include_ai):
+        known = [symbol for symbol in dict.fromkeys(symbols) if symbol in self.analyzer.records]
+        if include_ai and not self.analyzer.rules_only:
+            found = await self.batcher.analyze_all(known)
+        else:
+            results = await asyncio.gather(*(self._analyze(symbol, include_ai) for symbol in known))
+            found = dict(zip(known, results))
+        return {symbol: found.get(symbol, {"error": f"Symbol {symbol} not found"}) for symbol in dict.fromkeys(symbols)}
+
+    async def _screen(self, request):
+        options = {key: request[key] for key in ('industry', 'flags', 'near_high', 'near_low', 'by', 'ascending',
+                                                 'limit', 'columns') if key in request}
+        screener = self.analyzer.screener
+
+        def run():
+            try:
+                options['filters'] = [tuple(f) for f in request.get('filters', ())]
+                frame = screener.screen(**options)
+            except KeyError as e:
+                # str() of a KeyError is the repr of its key, the message is the argument itself
+                raise HTTPError(400, str(e.args[0]) if e.args else "Unknown key")
+            except (ValueError, TypeError) as e:
+                raise HTTPError(400, str(e))
+            # to_json turns NaN into null and numpy scalars into plain numbers
+            return json.loads(frame.to_json(orient='records'))
+
+        rows = await asyncio.get_running_loop().run_in_executor(None, run)
+        return {"count": len(rows), "rows": rows}
+
+
+def _endpoint(path) -> str:
+    # a fixed label set, whatever paths clients send
+    if path == '/analyze/batch':
+        return 'analyze_batch'
+    name = path.split('/')[1] if path.count('/') else ''
+    return name if name in ENDPOINTS else 'other'
+
+
+def _expect(method, allowed):
+    if method != allowed:
+        raise HTTPError(405, f"Use {allowed}")
+
+
+def _json_body(body) -> dict:
+    try:
+        request = json.loads(body or b'{}')
+    except ValueError as e:
+        raise HTTPError(400, f"Invalid JSON: {e}")
+    if not isinstance(request, dict):
+        raise HTTPError(400, "Expected a JSON object")
+    return request
+
+
+def _finite(value):
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _json_default(value):
+    # numpy scalars in the insight details
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+async def serve(analyzer, host, port, **options):
+    service = AnalysisService(analyzer, **options)
+    server = await service.start(host, port)
+    print(f"Serving stock analysis on http://{host}:{service.port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API for stock analysis")
+    parser.add_argument("--data", default="stock_data.csv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--profile", default="quality")
+    parser.add_argument("--quantize", action="store_true")
+    parser.add_argument("--cache", default="analysis_cache.sqlite", help="empty to disable")
+    args = parser.parse_args()
+
+    analyzer = EnhancedStockAnalyzer(cache=AnalysisCache(args.cache) if args.cache else None, preload="background",
+                                     inference=InferenceConfig(profile=args.profile, quantize=args.quantize))
+    analyzer.load_stock_data(args.data)
+    try:
+        asyncio.run(serve(analyzer, args.host, args.port, max_batch_size=args.max_batch_size,
+                          max_wait=args.max_wait_ms / 1000, max_queue=args.max_queue,
+                          max_connections=args.max_connections, request_timeout=args.timeout))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+from main import EnhancedStockAnalyzer
+
+
+def report(label, latencies, total):
+    latencies = sorted(latencies)
+    n = len(latencies)
+    p50 = latencies[n // 2]
+    p95 = latencies[min(n - 1, int(n * 0.95))]
+    print(f"{label:<18} total {total:8.2f}s | per stock p50 {p50:6.2f}s p95 {p95:6.2f}s "
+          f"| throughput {n / total:6.2f} stocks/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stock loop vs batched analyze_many on CPU")
+    parser.add_argument("--csv", default="stock_data.csv")
+    parser.add_argument("--limit", type=int, default=None, help="only analyze the first N symbols")
+    parser.add_argument("--batch-sizes", default="4,8,16")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--model-name", default="AventIQ-AI/t5-stockmarket-qa-chatbot")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    analyzer = EnhancedStockAnalyzer(preload="eager", model_name=args.model_name)
+    analyzer.load_stock_data(args.csv)
+    symbols = analyzer.stock_data['symbol'].tolist()[:args.limit]
+    print(f"{len(symbols)} symbols, {torch.get_num_threads()} threads\n")
+
+    latencies = []
+    start = time.perf_counter()
+    for symbol in symbols:
+        t0 = time.perf_counter()
+        analyzer.analyze_stock(symbol)
+        latencies.append(time.perf_counter() - t0)
+    report("loop", latencies, time.perf_counter() - start)
+
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        start = time.perf_counter()
+        results = analyzer.analyze_many(symbols, batch_size=batch_size)
+        total = time.perf_counter() - start
+        # analyze_many hands nothing back until every batch is done, so each stock waited the whole call
+        errors = sum(1 for r in results.values() if "error" in r)
+        report(f"batch_size={batch_size}", [total] * len(symbols), total)
+        if errors:
+            print(f"  {errors} symbols returned errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nse_fetcher import NSEFetcher
+from replay_server import ReplayServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch wall time for N indices against a local replay server")
+    parser.add_argument("--payload", default="stock_data.json")
+    parser.add_argument("--indices", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated server latency in seconds")
+    parser.add_argument("--workers", default="1,4,8")
+    parser.add_argument("--rate", type=float, default=0, help="per-host requests per second, 0 disables")
+    args = parser.parse_args()
+
+    with open(args.payload) as f:
+        payload = json.load(f)
+    indices = [f"INDEX {i}" for i in range(args.indices)]
+
+    with ReplayServer([payload], latency=args.latency) as server:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            with NSEFetcher(server.url, max_workers=workers, requests_per_second=args.rate) as fetcher:
+                start = time.perf_counter()
+                results = fetcher.fetch_indices(indices)
+                elapsed = time.perf_counter() - start
+            failed = sum(1 for r in results.values() if "error" in r)
+            print(f"workers={workers:<3} {len(indices)} indices in {elapsed:6.2f}s "
+                  f"({elapsed / len(indices) * 1000:7.1f} ms/index, {failed} failed)")
+
+        server.fail_first = server.requests + 2
+        with NSEFetcher(server.url, max_workers=1, backoff=0.05, requests_per_second=args.rate) as fetcher:
+            start = time.perf_counter()
+            result = fetcher.fetch_index("NIFTY 50")
+            print(f"retry after two 503s: {'ok' if 'data' in result else 'failed'} "
+                  f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from indicators import IndicatorEngine
+
+
+def recompute(history, window=20, span=20, period=14, periods_per_year=252):
+    # what a per-snapshot refresh costs without incremental state: every window re-read from the history
+    prices = history['close']
+    grouped = prices.groupby(history['symbol'])
+    sma = grouped.rolling(window).mean()
+    ema = grouped.transform(lambda p: p.ewm(span=span, adjust=False).mean())
+    change = grouped.diff()
+    gain = change.clip(lower=0).groupby(history['symbol']).transform(lambda g: g.ewm(alpha=1 / period).mean())
+    loss = (-change).clip(lower=0).groupby(history['symbol']).transform(lambda g: g.ewm(alpha=1 / period).mean())
+    rsi = 100 - 100 / (1 + gain / loss)
+    returns = np.log(prices / grouped.shift())
+    volatility = returns.groupby(history['symbol']).rolling(window).std() * np.sqrt(periods_per_year) * 100
+    traded = (prices * history['volume']).groupby(history['symbol']).rolling(window).sum()
+    volume = history['volume'].groupby(history['symbol']).rolling(window).sum()
+    drawdown = prices / grouped.cummax() - 1
+    return sma, ema, rsi, volatility, traded / volume, drawdown
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-tick cost of incremental indicators vs recomputing the windows")
+    parser.add_argument("--symbols", default="50,500,5000")
+    parser.add_argument("--history", type=int, default=250, help="bars already seen before the timed ticks")
+    parser.add_argument("--ticks", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'symbols':>8} {'load history':>13} {'incremental':>12} {'per symbol':>11} {'values()':>9} "
+          f"{'recompute':>10} {'speedup':>8}")
+    for n in [int(s) for s in args.symbols.split(",")]:
+        symbols = [f"S{i:05d}" for i in range(n)]
+        bars = args.history + args.ticks
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, n)), axis=0))
+        volumes = rng.integers(1_000, 100_000, (bars, n)).astype(np.float64)
+        history = pd.DataFrame({
+            'timestamp': np.repeat(np.arange(args.history), n),
+            'symbol': np.tile(symbols, args.history),
+            'close': prices[:args.history].ravel(),
+            'volume': volumes[:args.history].ravel(),
+        })
+
+        start = time.perf_counter()
+        engine = IndicatorEngine().load_history(history)
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for t in range(args.history, bars):
+            engine.append(symbols, prices[t], volumes[t])
+        incremental = (time.perf_counter() - start) / args.ticks
+
+        start = time.perf_counter()
+        engine.values()
+        values = time.perf_counter() - start
+
+        # one refresh at the end of the history, the same work every tick would repeat
+        start = time.perf_counter()
+        recompute(history)
+        full = time.perf_counter() - start
+
+        print(f"{n:>8} {load:12.2f}s {incremental * 1000:10.2f}ms {incremental / n * 1e6:9.2f}us "
+              f"{values * 1000:7.2f}ms {full * 1000:8.1f}ms {full / (incremental + values):7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
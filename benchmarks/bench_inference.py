@@ -0,0 +1,78 @@
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# each configuration runs in its own interpreter so RSS reflects only that model variant
+CHILD = """
+import json, resource, time
+from inference import InferenceConfig
+from main import EnhancedStockAnalyzer
+
+config = InferenceConfig(profile={profile!r}, quantize={quantize!r}, threads={threads!r})
+analyzer = EnhancedStockAnalyzer(preload="eager", model_name={model_name!r}, inference=config)
+analyzer.load_stock_data({csv!r})
+symbols = analyzer.stock_data['symbol'].tolist()[:{limit!r}]
+
+texts, latencies = {{}}, []
+start = time.perf_counter()
+for symbol in symbols:
+    t0 = time.perf_counter()
+    texts[symbol] = analyzer.analyze_stock(symbol).get("ai_analysis")
+    latencies.append(time.perf_counter() - t0)
+total = time.perf_counter() - start
+print(json.dumps({{
+    "latencies": latencies,
+    "total": total,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "texts": texts,
+}}))
+"""
+
+
+def similarity(a, b) -> float:
+    if not a and not b:
+        return 1.0
+    return difflib.SequenceMatcher(None, (a or "").split(), (b or "").split()).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, throughput, RSS and output similarity per inference setup")
+    parser.add_argument("--csv", default="stock_data.csv")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--profiles", default="quality,balanced,fast")
+    parser.add_argument("--model-name", default="AventIQ-AI/t5-stockmarket-qa-chatbot")
+    args = parser.parse_args()
+
+    configs = [(profile, quantize) for profile in args.profiles.split(",") for quantize in (False, True)]
+    runs = {}
+    for profile, quantize in configs:
+        code = CHILD.format(profile=profile, quantize=quantize, threads=args.threads,
+                            model_name=args.model_name, csv=args.csv, limit=args.limit)
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        runs[(profile, quantize)] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    # the baseline is today's behaviour: quality profile, float32
+    baseline = runs.get(("quality", False))
+    print(f"{'profile':<9} {'int8':<5} {'p50 s':>7} {'p95 s':>7} {'stocks/s':>9} {'RSS MB':>8} "
+          f"{'similarity':>11} {'exact':>6}")
+    for (profile, quantize), run in runs.items():
+        latencies = sorted(run["latencies"])
+        n = len(latencies)
+        if baseline:
+            scores = [similarity(run["texts"][s], baseline["texts"][s]) for s in baseline["texts"]]
+            sim = f"{sum(scores) / len(scores):11.3f}"
+            exact = f"{sum(1 for s in scores if s == 1.0) / len(scores):6.0%}"
+        else:
+            sim, exact = f"{'-':>11}", f"{'-':>6}"
+        print(f"{profile:<9} {'yes' if quantize else 'no':<5} {latencies[n // 2]:7.2f} "
+              f"{latencies[min(n - 1, int(n * 0.95))]:7.2f} {n / run['total']:9.2f} {run['rss_mb']:8.0f} {sim} {exact}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from ingestion import ingest_json, load_frame
+from measure import peak_growth_mib, reset_peak, run_isolated, warm_up
+from synthetic import write_payload
+
+NUMERIC_COLUMNS = ['open', 'dayHigh', 'dayLow', 'lastPrice', 'previousClose',
+                   'change', 'pChange', 'yearHigh', 'yearLow', 'totalTradedVolume',
+                   'totalTradedValue', 'perChange365d', 'perChange30d']
+
+
+def csv_format(json_path, csv_path):
+    # the previous data_formatting.py: whole payload in memory, list of dicts, then CSV
+    with open(json_path) as f:
+        data = json.load(f)
+    formatted = []
+    for record in data['data']:
+        formatted.append({
+            'symbol': record['symbol'],
+            'companyName': record['meta']['companyName'] if 'meta' in record else None,
+            'industry': record['meta']['industry'] if 'meta' in record else None,
+            **{col: record[col] for col in NUMERIC_COLUMNS}
+        })
+    pd.DataFrame(formatted).to_csv(csv_path, index=False)
+
+
+def csv_load(csv_path):
+    # the CSV branch of load_stock_data
+    df = pd.read_csv(csv_path)
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+STAGES = {
+    'csv_format': csv_format,
+    'csv_load': csv_load,
+    'ingest_json': ingest_json,
+    'load_frame': load_frame,
+}
+
+
+def _run(stage, args, queue):
+    warm_up()
+    before = reset_peak()
+    start = time.perf_counter()
+    try:
+        STAGES[stage](*args)
+    except Exception as e:
+        queue.put(e)
+        return
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, peak_growth_mib(before)))
+
+
+def measure(stage, *args):
+    return run_isolated(_run, stage, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV vs streaming columnar ingestion and load")
+    parser.add_argument("--sizes", default="50,5000,50000")
+    args = parser.parse_args()
+
+    # MiB is the peak RSS growth of the stage
+    print(f"{'records':>8} {'stage':<8} {'csv s':>8} {'csv MiB':>8} {'col s':>8} {'col MiB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [int(s) for s in args.sizes.split(",")]:
+            json_path = write_payload(os.path.join(tmp, f"payload_{n}.json"), n)
+            csv_path = os.path.join(tmp, f"stock_data_{n}.csv")
+            col_path = os.path.join(tmp, f"stock_data_{n}.columns")
+
+            rows = [
+                ("format", measure('csv_format', json_path, csv_path), measure('ingest_json', json_path, col_path)),
+                ("load", measure('csv_load', csv_path), measure('load_frame', col_path)),
+            ]
+            for stage, (csv_s, csv_mb), (col_s, col_mb) in rows:
+                print(f"{n:>8} {stage:<8} {csv_s:8.3f} {csv_mb:8.1f} {col_s:8.3f} {col_mb:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
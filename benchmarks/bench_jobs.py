@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_jobs import AnalysisJobQueue
+from main import EnhancedStockAnalyzer
+
+
+def report(label, waits, total):
+    waits = sorted(waits)
+    n = len(waits)
+    print(f"{label:<22} time-to-result mean {sum(waits) / n:6.2f}s p50 {waits[n // 2]:6.2f}s "
+          f"max {waits[-1]:6.2f}s | session {total:7.2f}s")
+
+
+def browse_sync(analyzer, symbols, think):
+    # what the page did before: every click blocks on the model
+    waits = []
+    for symbol in symbols:
+        t0 = time.perf_counter()
+        analyzer.analyze_stock(symbol)
+        waits.append(time.perf_counter() - t0)
+        time.sleep(think)
+    return waits
+
+
+def browse_queued(analyzer, symbols, think, workers):
+    jobs = AnalysisJobQueue(analyzer, workers=workers)
+    waits = []
+    for i, symbol in enumerate(symbols):
+        t0 = time.perf_counter()
+        job = jobs.submit(symbol)
+        if i == 0:
+            jobs.prefetch(symbols[1:])
+        job.wait()
+        waits.append(time.perf_counter() - t0)
+        time.sleep(think)
+    return waits, jobs.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-result of a simulated user browsing one industry")
+    parser.add_argument("--csv", default="stock_data.csv")
+    parser.add_argument("--industry", default=None, help="defaults to the industry with the most symbols")
+    parser.add_argument("--limit", type=int, default=5, help="symbols the user looks at")
+    parser.add_argument("--think", type=float, default=3.0, help="seconds spent reading each analysis")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--model-name", default="AventIQ-AI/t5-stockmarket-qa-chatbot")
+    args = parser.parse_args()
+
+    analyzer = EnhancedStockAnalyzer(preload="eager", model_name=args.model_name)
+    analyzer.load_stock_data(args.csv)
+    industry = args.industry or max(analyzer.records.industries(),
+                                    key=lambda name: len(analyzer.records.symbols_for_industry(name)))
+    symbols = analyzer.records.symbols_for_industry(industry)[:args.limit]
+    print(f"{industry}: {len(symbols)} symbols, {args.think:.1f}s reading time each\n")
+
+    start = time.perf_counter()
+    report("synchronous", browse_sync(analyzer, symbols, args.think), time.perf_counter() - start)
+
+    # a fresh analyzer, so nothing is served from the first run's results
+    analyzer = EnhancedStockAnalyzer(preload="eager", model_name=args.model_name)
+    analyzer.load_stock_data(args.csv)
+    start = time.perf_counter()
+    waits, stats = browse_queued(analyzer, symbols, args.think, args.workers)
+    report("queue + prefetch", waits, time.perf_counter() - start)
+    print(f"  queue stats: {stats}")
+
+
+if __name__ == "__main__":
+    main()
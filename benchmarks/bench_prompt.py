@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from ingestion import ingest_json
+from insight_rules import analysis_insights
+from main import DEFAULT_MODEL_NAME, EnhancedStockAnalyzer
+from prompt_builder import PromptBuilder
+from synthetic import write_payload
+
+
+def distribution(lengths) -> str:
+    lengths = np.asarray(lengths)
+    return (f"min {lengths.min():4d} p50 {int(np.percentile(lengths, 50)):4d} "
+            f"p95 {int(np.percentile(lengths, 95)):4d} max {lengths.max():4d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokenization time and encoder length distribution")
+    parser.add_argument("--csv", default="stock_data.csv")
+    parser.add_argument("--symbols", type=int, default=None, help="use a synthetic universe of this size instead")
+    parser.add_argument("--budgets", default="512,384,256")
+    parser.add_argument("--generate", type=int, default=0, help="also time generate on this many symbols per budget")
+    parser.add_argument("--model-name", default=DEFAULT_MODEL_NAME)
+    args = parser.parse_args()
+
+    analyzer = EnhancedStockAnalyzer(model_name=args.model_name)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.symbols:
+            path = os.path.join(tmp, "universe.columns")
+            ingest_json(write_payload(os.path.join(tmp, "universe.json"), args.symbols), path)
+            analyzer.load_stock_data(path)
+        else:
+            analyzer.load_stock_data(args.csv)
+    tokenizer = analyzer.tokenizer
+
+    prompts = []
+    for symbol in analyzer.records.symbols():
+        stock = analyzer._find_stock(symbol)
+        prompts.append(analyzer.prompt_builder.build(symbol, stock, analysis_insights(stock)))
+    print(f"{len(prompts)} prompts\n")
+
+    # what _generate did before: the whole f-string through the tokenizer, cut at 512
+    start = time.perf_counter()
+    old = [tokenizer(p.text, max_length=512, truncation=True)["input_ids"] for p in prompts]
+    old_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    tokenizer([p.text for p in prompts], max_length=512, truncation=True)
+    old_batch_seconds = time.perf_counter() - start
+    untruncated = [len(tokenizer(p.text)["input_ids"]) for p in prompts]
+    print(f"{'full f-string':<22} {old_seconds / len(prompts) * 1e6:8.1f} us/prompt | {distribution([len(i) for i in old])}"
+          f" | {sum(1 for n in untruncated if n > 512)} truncated")
+    print(f"{'  batched':<22} {old_batch_seconds / len(prompts) * 1e6:8.1f} us/prompt")
+
+    for budget in [int(b) for b in args.budgets.split(",")]:
+        builder = PromptBuilder(budget=budget)
+        builder.encode(prompts[0], tokenizer)
+        start = time.perf_counter()
+        encoded = [builder.encode(p, tokenizer) for p in prompts]
+        seconds = time.perf_counter() - start
+        # analyze_many encodes all its prompts together
+        start = time.perf_counter()
+        builder.encode_many(prompts, tokenizer)
+        batch_seconds = time.perf_counter() - start
+        dropped = sum(1 for e in encoded if e.dropped)
+        truncated = sum(1 for e in encoded if e.truncated)
+        same = sum(1 for e, ids in zip(encoded, old) if e.input_ids == ids)
+        print(f"{'budget ' + str(budget):<22} {seconds / len(prompts) * 1e6:8.1f} us/prompt | "
+              f"{distribution([e.token_count for e in encoded])} | {dropped} with dropped lines, "
+              f"{truncated} truncated, {same} identical to before")
+        print(f"{'  batched':<22} {batch_seconds / len(prompts) * 1e6:8.1f} us/prompt")
+
+        if args.generate:
+            analyzer.prompt_builder = builder
+            symbols = analyzer.records.symbols()[:args.generate]
+            analyzer.analyze_stock(symbols[0])
+            start = time.perf_counter()
+            for symbol in symbols:
+                analyzer.analyze_stock(symbol)
+            print(f"{'':<22} generate {(time.perf_counter() - start) / len(symbols):.3f} s/stock")
+
+
+if __name__ == "__main__":
+    main()
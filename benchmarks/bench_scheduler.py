@@ -0,0 +1,89 @@
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingestion import records_frame
+from main import EnhancedStockAnalyzer
+from metrics import MetricsRegistry
+from nse_fetcher import NSEFetcher
+from refresh_scheduler import RefreshScheduler
+from replay_server import ReplayServer
+from synthetic import make_payload
+
+
+def recorded_feed(n, polls, changed_fraction, seed=0):
+    # what a poller sees during the day: repeats of the same body, re-rendered bodies with the same
+    # timestamp, and new snapshots where only some prices moved
+    rng = random.Random(seed)
+    payload = make_payload(n, seed)
+    payload['timestamp'] = '24-Mar-2025 10:00:00'
+    feed = [payload]
+    for i in range(1, polls):
+        kind = i % 3
+        if kind == 0:
+            feed.append(payload)
+            continue
+        payload = copy.deepcopy(payload)
+        payload['metadata']['timeVal'] = f"24-Mar-2025 10:{i // 60:02d}:{i % 60:02d}"
+        if kind == 2:
+            payload['timestamp'] = f"24-Mar-2025 {10 + i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+            for record in rng.sample(payload['data'], max(1, int(n * changed_fraction))):
+                record['lastPrice'] = round(record['lastPrice'] * (1 + rng.gauss(0, 0.002)), 2)
+                record['totalTradedVolume'] += rng.randint(1, 10_000)
+        feed.append(payload)
+    return feed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-poll cost of change-detected refreshes vs full reloads")
+    parser.add_argument("--symbols", default="50,500,5000")
+    parser.add_argument("--polls", type=int, default=30)
+    parser.add_argument("--changed", type=float, default=0.05, help="fraction of rows moving per new snapshot")
+    args = parser.parse_args()
+
+    print(f"{'symbols':>8} {'fetch/poll':>11} {'reload/poll':>12} {'scheduler/poll':>15} {'speedup':>8} {'skipped':>8} "
+          f"{'published':>9} {'rows':>7}")
+    for n in [int(s) for s in args.symbols.split(",")]:
+        feed = recorded_feed(n, args.polls, args.changed)
+        with ReplayServer(feed) as server, NSEFetcher(server.url, requests_per_second=0) as fetcher:
+            # the server caches its encoded bodies, the first pass fills that and the second times
+            # the bare transfer, which both sides below pay on every poll
+            for _ in range(2):
+                server.position = 0
+                start = time.perf_counter()
+                for _ in feed:
+                    fetcher.fetch_index_raw()
+                    server.advance()
+            fetch = (time.perf_counter() - start) / len(feed)
+            server.position = 0
+
+            # every poll reloads the whole universe, like scrapper.py + load_stock_data
+            analyzer = EnhancedStockAnalyzer(rules_only=True, metrics=MetricsRegistry(track_gc=False))
+            start = time.perf_counter()
+            for _ in feed:
+                analyzer.set_stock_data(records_frame(fetcher.fetch_index()['data']))
+                server.advance()
+            reload = (time.perf_counter() - start) / len(feed)
+
+            server.position = 0
+            analyzer = EnhancedStockAnalyzer(rules_only=True, metrics=MetricsRegistry(track_gc=False))
+            scheduler = RefreshScheduler(fetcher, analyzer)
+            start = time.perf_counter()
+            for _ in feed:
+                scheduler.poll()
+                server.advance()
+            polled = (time.perf_counter() - start) / len(feed)
+
+        totals = scheduler.totals
+        skipped = totals["unchanged_body"] + totals["unchanged_timestamp"] + totals["unchanged_rows"]
+        print(f"{n:>8} {fetch * 1000:9.1f}ms {reload * 1000:10.1f}ms {polled * 1000:13.1f}ms {reload / polled:7.1f}x "
+              f"{skipped:>8} {totals['published']:>9} {totals['rows_published']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from analysis_service import AnalysisService
+from main import EnhancedStockAnalyzer
+from metrics import MetricsRegistry
+from stub_model import install_stub
+
+
+async def request(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+        elif name.lower() == 'connection' and value.strip() == 'close':
+            writer.close()
+    await reader.readexactly(length)
+    return status
+
+
+async def load(host, port, symbols, concurrency, total):
+    # every client keeps one connection open and sends its next request when the last one returns
+    counter = itertools.count()
+    latencies, statuses = [], []
+
+    async def client():
+        reader = writer = None
+        while (i := next(counter)) < total:
+            if writer is None or writer.is_closing():
+                reader, writer = await asyncio.open_connection(host, port)
+            t0 = time.perf_counter()
+            try:
+                status = await request(reader, writer, host, "/analyze/" + quote(symbols[i % len(symbols)]))
+            except (ConnectionError, asyncio.IncompleteReadError, IndexError):
+                status, writer = 0, None
+            latencies.append(time.perf_counter() - t0)
+            statuses.append(status)
+        if writer is not None:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def start_service(analyzer, options):
+    # the service gets its own loop and thread, so the clients do not share a loop with it
+    ready = threading.Event()
+    state = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        state['loop'] = loop
+        state['service'] = AnalysisService(analyzer, **options)
+        loop.run_until_complete(state['service'].start(port=0))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return state
+
+
+def stop_service(state):
+    asyncio.run_coroutine_threadsafe(state['service'].close(), state['loop']).result()
+    state['loop'].call_soon_threadsafe(state['loop'].stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the analysis HTTP service")
+    parser.add_argument("--url", default=None, help="test a running service instead of an in-process stub one")
+    parser.add_argument("--csv", default="stock_data.csv")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--distinct", type=int, default=None, help="spread requests over this many symbols")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub model seconds per generate call")
+    parser.add_argument("--max-batch-size", default="1,8", help="compare these batch sizes (in-process only)")
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--max-queue", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'batch':>5} {'conc':>5} {'req/s':>8} {'p50':>8} {'p99':>8} {'503':>5} {'other':>5} "
+          f"{'mean batch':>10} {'coalesced':>9}")
+    if args.url:
+        url = urlsplit(args.url)
+        symbols = (os.environ.get("BENCH_SYMBOLS") or "RELIANCE,TCS,INFY,HDFCBANK,ITC").split(",")
+        runs = [(None, url.hostname, url.port or 80, None)]
+    else:
+        # a deterministic stub stands in for T5, it costs `latency` per generate call whatever the batch size
+        analyzer = EnhancedStockAnalyzer(metrics=MetricsRegistry(track_gc=False))
+        analyzer.load_stock_data(args.csv)
+        install_stub(analyzer, latency=args.latency)
+        symbols = analyzer.records.symbols()
+        runs = [(int(size), None, None, analyzer) for size in args.max_batch_size.split(",")]
+    symbols = symbols[:args.distinct] if args.distinct else symbols
+
+    for batch_size, host, port, analyzer in runs:
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            state = None
+            if analyzer is not None:
+                analyzer.metrics.reset()
+                state = start_service(analyzer, dict(max_batch_size=batch_size, max_wait=args.max_wait_ms / 1000,
+                                                     max_queue=args.max_queue))
+                host, port = "127.0.0.1", state['service'].port
+            latencies, statuses, seconds = asyncio.run(load(host, port, symbols, concurrency, args.requests))
+            batches = coalesced = None
+            if state is not None:
+                stop_service(state)
+                snapshot = analyzer.metrics.to_dict()
+                sizes = [h for h in snapshot["histograms"] if h["name"] == "stock_analysis_service_batch_size"]
+                batches = sizes[0]["mean"] or 0 if sizes else 0
+                coalesced = sum(c["value"] for c in snapshot["counters"]
+                                if c["name"] == "stock_analysis_service_coalesced_total")
+
+            ok = np.array([lat for lat, status in zip(latencies, statuses) if status == 200])
+            # the mean is None or 0 when no batch formed, so it is formatted the same way whatever its type
+            batch_text = "-" if batches is None else f"{float(batches):.2f}"
+            print(f"{batch_size or '-':>5} {concurrency:>5} {len(statuses) / seconds:8.1f} "
+                  f"{np.percentile(ok, 50) * 1000 if len(ok) else 0:6.1f}ms "
+                  f"{np.percentile(ok, 99) * 1000 if len(ok) else 0:6.1f}ms "
+                  f"{statuses.count(503):>5} {sum(1 for s in statuses if s not in (200, 503)):>5} "
+                  f"{batch_text:>10} {coalesced if coalesced is not None else '-':>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from ingestion import STOCK_SCHEMA
+from snapshot_store import SnapshotStore
+from synthetic import make_payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append and query times for the snapshot history store")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--snapshots", type=int, default=750, help="75 intraday snapshots is one 5-minute session")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = make_payload(args.symbols)
+    base = SnapshotStore._records_frame(payload['data'])
+    rng = np.random.default_rng(0)
+    start_time = pd.Timestamp('2025-03-21 09:15:00')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SnapshotStore(os.path.join(tmp, 'history'))
+        start = time.perf_counter()
+        for k in range(args.snapshots):
+            frame = base.copy()
+            frame['lastPrice'] = frame['lastPrice'] * (1 + rng.normal(0, 0.002, len(frame)))
+            store.append_frame(frame, start_time + pd.Timedelta(minutes=5 * k))
+        append = time.perf_counter() - start
+        rows = args.symbols * args.snapshots
+        print(f"append  {args.snapshots} snapshots x {args.symbols} symbols: {append:.2f}s "
+              f"({append / args.snapshots * 1000:.2f} ms/snapshot, {len(store.manifest['segments'])} segments)")
+
+        store.compact(full=True)
+        symbols = base['symbol'].tolist()
+        end_time = start_time + pd.Timedelta(minutes=5 * (args.snapshots - 1))
+
+        start = time.perf_counter()
+        for _ in range(args.queries):
+            store.series(symbols[rng.integers(len(symbols))], start_time, end_time)
+        series = (time.perf_counter() - start) / args.queries
+        print(f"series  full range for one symbol: {series * 1000:.2f} ms")
+
+        start = time.perf_counter()
+        for _ in range(args.queries):
+            store.cross_section(start_time + pd.Timedelta(minutes=5 * int(rng.integers(args.snapshots))))
+        cross = (time.perf_counter() - start) / args.queries
+        print(f"cross   section at a random time: {cross * 1000:.2f} ms")
+        print(f"history {rows:,} rows x {len(STOCK_SCHEMA)} fields")
+
+
+if __name__ == "__main__":
+    main()
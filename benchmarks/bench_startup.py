@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in a fresh interpreter so every mode pays its own imports
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from main import EnhancedStockAnalyzer
+imported = time.perf_counter()
+analyzer = EnhancedStockAnalyzer(preload={preload!r}, rules_only={rules_only!r}, model_name={model_name!r})
+constructed = time.perf_counter()
+analyzer.load_stock_data({csv!r})
+loaded = time.perf_counter()
+result = analyzer.analyze_stock({symbol!r})
+analyzed = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "construct": constructed - imported,
+    "load_data": loaded - constructed,
+    "first_analysis": analyzed - loaded,
+    "torch_imported": "torch" in sys.modules,
+    "error": result.get("error"),
+}}))
+"""
+
+MODES = [
+    ("rules_only", {"preload": "lazy", "rules_only": True}),
+    ("lazy", {"preload": "lazy", "rules_only": False}),
+    ("background", {"preload": "background", "rules_only": False}),
+    ("eager", {"preload": "eager", "rules_only": False}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import + construction time of EnhancedStockAnalyzer per mode")
+    parser.add_argument("--csv", default="stock_data.csv")
+    parser.add_argument("--symbol", default="TCS")
+    parser.add_argument("--model-name", default="AventIQ-AI/t5-stockmarket-qa-chatbot")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'mode':<11} {'import':>8} {'construct':>10} {'ready':>8} {'1st analysis':>13}  torch")
+    for name, options in MODES:
+        runs = []
+        for _ in range(args.repeat):
+            code = CHILD.format(csv=args.csv, symbol=args.symbol, model_name=args.model_name, **options)
+            out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        best = min(runs, key=lambda r: r["import"] + r["construct"])
+        ready = best["import"] + best["construct"]
+        print(f"{name:<11} {best['import']:8.2f}s {best['construct']:9.2f}s {ready:7.2f}s "
+              f"{best['first_analysis']:12.2f}s  {'yes' if best['torch_imported'] else 'no'}"
+              + (f"  error: {best['error']}" if best["error"] else ""))
+
+
+if __name__ == "__main__":
+    main()
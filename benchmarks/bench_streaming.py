@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import EnhancedStockAnalyzer
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def blocking(analyzer, symbol):
+    # nothing is visible until analyze_stock returns, so first content and first token are the total
+    t0 = time.perf_counter()
+    analyzer.analyze_stock(symbol)
+    total = time.perf_counter() - t0
+    return total, total, total
+
+
+def streaming(analyzer, symbol):
+    t0 = time.perf_counter()
+    first_content = first_token = None
+    for event, _ in analyzer.analyze_stock_stream(symbol):
+        now = time.perf_counter() - t0
+        if first_content is None:
+            first_content = now
+        if event == "token" and first_token is None:
+            first_token = now
+    total = time.perf_counter() - t0
+    return first_content, first_token if first_token is not None else total, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first content / first token, blocking vs streaming")
+    parser.add_argument("--csv", default="stock_data.csv")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--profiles", default="fast,balanced,quality")
+    parser.add_argument("--model-name", default="AventIQ-AI/t5-stockmarket-qa-chatbot")
+    args = parser.parse_args()
+
+    # no cache, every call pays for generation
+    analyzer = EnhancedStockAnalyzer(preload="eager", model_name=args.model_name)
+    analyzer.load_stock_data(args.csv)
+    symbols = analyzer.records.symbols()[:args.limit]
+    # one untimed call so the first measurement does not include kernel warm-up
+    analyzer.analyze_stock(symbols[0])
+
+    print(f"{len(symbols)} symbols, medians\n")
+    print(f"{'profile':<9} {'path':<10} {'first content':>14} {'first token':>12} {'total':>8}")
+    for profile in args.profiles.split(","):
+        analyzer.set_profile(profile)
+        for name, run in (("blocking", blocking), ("streaming", streaming)):
+            runs = [run(analyzer, symbol) for symbol in symbols]
+            ttfc, ttft, total = (median([r[i] for r in runs]) for i in range(3))
+            print(f"{profile:<9} {name:<10} {ttfc:13.3f}s {ttft:11.3f}s {total:7.3f}s")
+        if analyzer.generation_kwargs.get("num_beams", 1) > 1:
+            print(f"{'':<9} beam search cannot stream, its text arrives in one chunk")
+
+
+if __name__ == "__main__":
+    main()
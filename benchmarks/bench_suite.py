@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from ingestion import ingest_json, load_frame
+from main import EnhancedStockAnalyzer
+from measure import peak_growth_mib, reset_peak, run_isolated, warm_up
+from stub_model import install_stub
+from synthetic import write_payload
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def _analyzer(paths, options, stub=False):
+    analyzer = EnhancedStockAnalyzer()
+    analyzer.load_stock_data(paths['columns'])
+    if stub:
+        install_stub(analyzer, options['output_tokens'], options['stub_latency'])
+    return analyzer
+
+
+def _sample(analyzer, size):
+    # evenly spaced so every size samples the whole universe, not just its first symbols
+    symbols = analyzer.records.symbols()
+    return symbols[::max(1, len(symbols) // size)][:size]
+
+
+# every stage is (setup, run): setup is untimed, run returns per-symbol latencies or None
+
+def setup_format(paths, options):
+    return paths
+
+
+def run_format(paths, options):
+    # what data_formatting.py does, minus the snapshot history
+    ingest_json(paths['json'], paths['scratch'])
+    load_frame(paths['scratch']).to_csv(paths['scratch_csv'], index=False)
+
+
+def setup_load(paths, options):
+    return EnhancedStockAnalyzer()
+
+
+def run_load_csv(analyzer, options):
+    analyzer.load_stock_data(options['paths']['csv'])
+
+
+def run_load_columnar(analyzer, options):
+    analyzer.load_stock_data(options['paths']['columns'])
+
+
+def setup_rules(paths, options):
+    analyzer = _analyzer(paths, options)
+    return analyzer, _sample(analyzer, options['sample'])
+
+
+def setup_stub(paths, options):
+    analyzer = _analyzer(paths, options, stub=True)
+    return analyzer, _sample(analyzer, options['sample'])
+
+
+def _per_symbol(fn, symbols):
+    latencies = []
+    for symbol in symbols:
+        t0 = time.perf_counter()
+        fn(symbol)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def run_key_insights(state, options):
+    analyzer, symbols = state
+    return _per_symbol(lambda symbol: analyzer.generate_key_insights(analyzer._find_stock(symbol)), symbols)
+
+
+def run_analyze_stock(state, options):
+    analyzer, symbols = state
+    return _per_symbol(analyzer.analyze_stock, symbols)
+
+
+def run_analyze_many(state, options):
+    analyzer, symbols = state
+    analyzer.analyze_many(symbols, batch_size=options['batch_size'])
+
+
+STAGES = {
+    'format': (setup_format, run_format),
+    'load_csv': (setup_load, run_load_csv),
+    'load_columnar': (setup_load, run_load_columnar),
+    'key_insights': (setup_rules, run_key_insights),
+    'analyze_stock': (setup_stub, run_analyze_stock),
+    'analyze_many': (setup_stub, run_analyze_many),
+}
+
+
+def _run(stage, paths, options, queue):
+    try:
+        warm_up()
+        setup, run = STAGES[stage]
+        state = setup(paths, dict(options, paths=paths))
+        before = reset_peak()
+        start = time.perf_counter()
+        latencies = run(state, dict(options, paths=paths))
+        elapsed = time.perf_counter() - start
+        queue.put((elapsed, latencies, peak_growth_mib(before)))
+    except Exception as e:
+        queue.put(e)
+
+
+def percentiles(latencies) -> dict:
+    if not latencies:
+        return None
+    ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def measure(stage, paths, options, repeat):
+    runs = [run_isolated(_run, stage, paths, options) for _ in range(repeat)]
+    # the median run by wall time, so one noisy run does not move the result
+    runs.sort(key=lambda r: r[0])
+    elapsed, latencies, peak = runs[len(runs) // 2]
+    return {
+        "wall_s": elapsed,
+        "wall_runs_s": [r[0] for r in runs],
+        "per_symbol": percentiles(latencies),
+        "peak_mib": peak,
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment(args) -> dict:
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "seed": args.seed,
+        "sample": args.sample,
+        "batch_size": args.batch_size,
+        "stub_latency": args.stub_latency,
+        "repeat": args.repeat,
+    }
+
+
+def compare(results, baseline, threshold, min_seconds=0.005, min_mib=1.0) -> list:
+    """Regressions of results against a previous run of the suite.
+
+    A metric regresses when it is more than threshold (relative) worse than the baseline and
+    the absolute difference is above the noise floor (min_seconds / min_mib).
+    """
+    previous = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    for row in results:
+        base = previous.get((row["size"], row["stage"]))
+        if base is None:
+            continue
+        checks = [("wall_s", row["wall_s"], base["wall_s"], min_seconds)]
+        if row["per_symbol"] and base.get("per_symbol"):
+            checks.append(("p95_ms", row["per_symbol"]["p95_ms"], base["per_symbol"]["p95_ms"], min_seconds * 1000))
+        if row["peak_mib"] is not None and base.get("peak_mib") is not None:
+            checks.append(("peak_mib", row["peak_mib"], base["peak_mib"], min_mib))
+        for metric, value, old, floor in checks:
+            if value > old * (1 + threshold) and value - old > floor:
+                regressions.append({"size": row["size"], "stage": row["stage"], "metric": metric,
+                                    "baseline": old, "value": value, "ratio": value / old if old else None})
+    return regressions
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else format("-", ">" + spec.split(".")[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Wall time, per-symbol latency and peak memory of every pipeline stage on synthetic universes")
+    parser.add_argument("--sizes", default="50,500,5000,50000")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--sample", type=int, default=1000, help="symbols timed by the per-symbol stages")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--output-tokens", type=int, default=32, help="tokens the stub model generates")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds the stub sleeps per generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="defaults to benchmarks/results/suite-<time>.json")
+    parser.add_argument("--baseline", default=None, help="earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    options = {
+        "sample": args.sample,
+        "batch_size": args.batch_size,
+        "output_tokens": args.output_tokens,
+        "stub_latency": args.stub_latency,
+    }
+    stages = args.stages.split(",")
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"unknown stage {stage}, pick from {', '.join(STAGES)}")
+
+    results = []
+    print(f"{'symbols':>8} {'stage':<14} {'wall s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [int(s) for s in args.sizes.split(",")]:
+            paths = {
+                "json": write_payload(os.path.join(tmp, f"payload_{n}.json"), n, args.seed),
+                "columns": os.path.join(tmp, f"stock_data_{n}.columns"),
+                "csv": os.path.join(tmp, f"stock_data_{n}.csv"),
+                "scratch": os.path.join(tmp, f"scratch_{n}.columns"),
+                "scratch_csv": os.path.join(tmp, f"scratch_{n}.csv"),
+            }
+            # inputs for the load and analysis stages, written once per size outside any measurement
+            ingest_json(paths["json"], paths["columns"])
+            load_frame(paths["columns"]).to_csv(paths["csv"], index=False)
+
+            for stage in stages:
+                row = dict(size=n, stage=stage, **measure(stage, paths, options, args.repeat))
+                results.append(row)
+                per_symbol = row["per_symbol"] or {}
+                print(f"{n:>8} {stage:<14} {row['wall_s']:9.3f} {_fmt(per_symbol.get('p50_ms'), '8.3f')} "
+                      f"{_fmt(per_symbol.get('p95_ms'), '8.3f')} {_fmt(per_symbol.get('p99_ms'), '8.3f')} "
+                      f"{_fmt(row['peak_mib'], '9.1f')}")
+
+    report = {"environment": environment(args), "results": results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f), args.threshold)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.baseline:
+        regressions = report["regressions"]
+        for r in regressions:
+            ratio = f" ({r['ratio']:.2f}x)" if r['ratio'] else ""
+            print(f"REGRESSION {r['size']:>8} {r['stage']:<14} {r['metric']:<8} "
+                  f"{r['baseline']:.3f} -> {r['value']:.3f}{ratio}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
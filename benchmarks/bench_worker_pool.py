@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import DEFAULT_MODEL_NAME
+from worker_pool import AnalysisWorkerPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and throughput of the pre-fork worker pool as workers scale")
+    parser.add_argument("--csv", default="stock_data.csv")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--model-name", default=DEFAULT_MODEL_NAME)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'req/s':>7} {'parent rss':>11} {'worker rss':>11} {'worker pss':>11} "
+          f"{'private':>8} {'total pss':>10} {'unshared':>9}")
+    for workers in [int(n) for n in args.workers.split(",")]:
+        with AnalysisWorkerPool(args.csv, workers=workers, model_name=args.model_name) as pool:
+            symbols = pool.analyzer.records.symbols()
+            # every worker generates once before the clock starts
+            pool.map(symbols[:workers])
+            requests = [symbols[i % len(symbols)] for i in range(args.requests)]
+
+            start = time.perf_counter()
+            futures = [pool.submit(symbol) for symbol in requests]
+            for future in futures:
+                future.result()
+            throughput = len(requests) / (time.perf_counter() - start)
+
+            stats = pool.stats()
+            parent, children = stats["parent"], stats["workers"]
+            mean = lambda key: sum(w[key] for w in children) / len(children)
+            total_pss = parent["pss_mb"] + sum(w["pss_mb"] for w in children)
+            # what the same workers would take as separate processes, each loading its own model
+            unshared = parent["rss_mb"] * workers
+            print(f"{workers:>7} {throughput:7.2f} {parent['rss_mb']:9.0f}Mi {mean('rss_mb'):9.0f}Mi "
+                  f"{mean('pss_mb'):9.0f}Mi {mean('private_mb'):6.0f}Mi {total_pss:8.0f}Mi {unshared:7.0f}Mi")
+
+
+if __name__ == "__main__":
+    main()
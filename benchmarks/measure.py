@@ -0,0 +1,53 @@
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+
+def status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def warm_up():
+    # first use of pandas pulls in lazily imported modules, keep that out of the measurement
+    import io
+    df = pd.read_csv(io.StringIO("a,b\nx,1\n"))
+    df['b'] = pd.to_numeric(df['b'], errors='coerce')
+    pd.DataFrame({'a': np.arange(3.0), 'b': np.array(['x', 'y', None], dtype=object)})
+
+
+def reset_peak():
+    """Returns the current RSS in KiB and resets VmHWM, None where that is not supported."""
+    try:
+        # Linux only: writing 5 to clear_refs resets VmHWM, so VmHWM afterwards is the peak from here on
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return status_kb('VmRSS')
+    except OSError:
+        return None
+
+
+def peak_growth_mib(before):
+    if before is None:
+        return None
+    return (status_kb('VmHWM') - before) / 1024
+
+
+def run_isolated(target, *args):
+    """Runs target(*args, queue) in a fresh spawned process and returns what it put on the queue.
+
+    An exception put on the queue is re-raised here, so a failing stage cannot hang the caller.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=target, args=args + (queue,))
+    process.start()
+    result = queue.get()
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
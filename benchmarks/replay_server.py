@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class ReplayServer:
+    """Local stand-in for the NSE API that serves recorded payloads.
+
+    `payloads` is a list of dicts shaped like stock_data.json. Each request to
+    /api/equity-stockIndices returns the current payload with `name` set to the
+    requested index; `advance()` moves on to the next recorded payload.
+    """
+
+    def __init__(self, payloads, latency=0.0, fail_first=0, port=0):
+        self.payloads = list(payloads)
+        self.position = 0
+        self.latency = latency
+        self.fail_first = fail_first
+        self.requests = 0
+        # encoded bodies per (position, index), so a repeated request costs no json.dumps
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/':
+                    self._send(200, b'ok', {'Set-Cookie': 'nsit=replay; Path=/'})
+                    return
+                if url.path != '/api/equity-stockIndices':
+                    self._send(404)
+                    return
+
+                with server._lock:
+                    server.requests += 1
+                    failing = server.requests <= server.fail_first
+                    position = server.position
+                    payload = server.payloads[position]
+                if server.latency:
+                    time.sleep(server.latency)
+                if failing:
+                    self._send(503)
+                    return
+                if 'nsit=replay' not in self.headers.get('Cookie', ''):
+                    self._send(401)
+                    return
+
+                index = parse_qs(url.query).get('index', [payload.get('name')])[0]
+                body = server._bodies.get((position, index))
+                if body is None:
+                    body = json.dumps(dict(payload, name=index)).encode('utf-8')
+                    server._bodies[(position, index)] = body
+                self._send(200, body, {'Content-Type': 'application/json'})
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def advance(self):
+        with self._lock:
+            self.position = min(self.position + 1, len(self.payloads) - 1)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,83 @@
+import time
+import zlib
+
+import numpy as np
+
+PAD_ID = 0
+EOS_ID = 1
+
+
+class StubTokenizer:
+    """Deterministic whitespace tokenizer with the slice of the T5Tokenizer API the analyzer uses.
+
+    Ids come from crc32 of each word, so they are the same in every process and run.
+    return_tensors is accepted and ignored, everything is plain lists.
+    """
+
+    pad_token_id = PAD_ID
+    eos_token_id = EOS_ID
+
+    def __init__(self, vocab_size=32000):
+        self.vocab_size = vocab_size
+
+    def encode(self, text, max_length=None, truncation=False, add_special_tokens=True):
+        ids = [zlib.crc32(word.encode()) % (self.vocab_size - 2) + 2 for word in text.split()]
+        if not add_special_tokens:
+            return ids
+        if truncation and max_length:
+            ids = ids[:max_length - 1]
+        return ids + [EOS_ID]
+
+    def __call__(self, text, return_tensors=None, max_length=None, truncation=False, add_special_tokens=True):
+        if isinstance(text, str):
+            return {"input_ids": [self.encode(text, max_length, truncation, add_special_tokens)]}
+        return {"input_ids": [self.encode(t, max_length, truncation, add_special_tokens) for t in text]}
+
+    def pad(self, batch, return_tensors=None):
+        width = max(len(ids) for ids in batch["input_ids"])
+        return {
+            "input_ids": [ids + [PAD_ID] * (width - len(ids)) for ids in batch["input_ids"]],
+            "attention_mask": [[1] * len(ids) + [0] * (width - len(ids)) for ids in batch["input_ids"]],
+        }
+
+    def decode(self, ids, skip_special_tokens=False):
+        return " ".join(f"w{i}" for i in ids if not (skip_special_tokens and i in (PAD_ID, EOS_ID)))
+
+    def batch_decode(self, sequences, skip_special_tokens=False):
+        return [self.decode(ids, skip_special_tokens) for ids in sequences]
+
+
+class StubModel:
+    """Stands in for T5ForConditionalGeneration.generate.
+
+    The output is a pure function of the input ids, so cached and uncached runs, batched and
+    per-symbol runs all return the same text. latency sleeps per generate call, 0 by default
+    so the timings are only the non-model code around it.
+    """
+
+    def __init__(self, output_tokens=32, latency=0.0):
+        self.output_tokens = output_tokens
+        self.latency = latency
+
+    def generate(self, input_ids, attention_mask=None, streamer=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        outputs = []
+        for ids in input_ids:
+            ids = [i for i in ids if i not in (PAD_ID, EOS_ID)]
+            outputs.append([PAD_ID] + [ids[(k * 7) % len(ids)] for k in range(self.output_tokens)] + [EOS_ID]
+                           if ids else [PAD_ID, EOS_ID])
+        if streamer is not None:
+            # same calls as transformers: the decoder start token first, then one token at a time, then end()
+            # the streamers read .shape / .tolist(), so the ids go in as small arrays
+            for token in outputs[0]:
+                streamer.put(np.array([token]))
+            streamer.end()
+        return outputs
+
+
+def install_stub(analyzer, output_tokens=32, latency=0.0):
+    # plain lists never touch torch, so inference_mode would only add the torch import
+    analyzer.inference.inference_mode = False
+    analyzer.set_model(StubTokenizer(), StubModel(output_tokens, latency))
+    return analyzer
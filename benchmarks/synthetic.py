@@ -0,0 +1,69 @@
+import copy
+import json
+import os
+import random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_PATH = os.path.join(ROOT, 'stock_data.json')
+
+
+def _templates(path=TEMPLATE_PATH):
+    with open(path) as f:
+        payload = json.load(f)
+    records = [r for r in payload['data'] if 'meta' in r]
+    return payload, records
+
+
+def make_record(template, symbol, rng, industries):
+    record = copy.deepcopy(template)
+    year_low = rng.uniform(20, 5000)
+    year_high = year_low * rng.uniform(1.05, 3.0)
+    previous_close = rng.uniform(year_low, year_high)
+    p_change = rng.gauss(0, 2.5)
+    last_price = previous_close * (1 + p_change / 100)
+    volume = rng.randint(1000, 50_000_000)
+
+    record.update({
+        'symbol': symbol,
+        'identifier': f"{symbol}EQN",
+        'open': round(previous_close * (1 + rng.gauss(0, 0.01)), 2),
+        'dayHigh': round(max(last_price, previous_close) * 1.01, 2),
+        'dayLow': round(min(last_price, previous_close) * 0.99, 2),
+        'lastPrice': round(last_price, 2),
+        'previousClose': round(previous_close, 2),
+        'change': round(last_price - previous_close, 2),
+        'pChange': round(p_change, 2),
+        'yearHigh': round(year_high, 2),
+        'yearLow': round(year_low, 2),
+        'totalTradedVolume': volume,
+        'totalTradedValue': round(volume * last_price, 2),
+        'perChange365d': round(rng.gauss(8, 30), 2),
+        'perChange30d': round(rng.gauss(1, 10), 2),
+    })
+    record['meta'].update({
+        'symbol': symbol,
+        'companyName': f"{symbol.title()} Industries Limited",
+        'industry': rng.choice(industries),
+    })
+    return record
+
+
+def make_payload(n, seed=0, template_path=TEMPLATE_PATH) -> dict:
+    """NSE-shaped payload with n synthetic constituents, deterministic for a given seed."""
+    rng = random.Random(seed)
+    payload, records = _templates(template_path)
+    industries = sorted({r['meta']['industry'] for r in records if r['meta'].get('industry')})
+
+    payload = {key: value for key, value in payload.items() if key != 'data'}
+    payload['name'] = f"SYNTHETIC {n}"
+    payload['data'] = [
+        make_record(records[i % len(records)], f"SYM{i:05d}", rng, industries)
+        for i in range(n)
+    ]
+    return payload
+
+
+def write_payload(path, n, seed=0) -> str:
+    with open(path, 'w') as f:
+        json.dump(make_payload(n, seed), f)
+    return path
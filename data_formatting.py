@@ -1,37 +1,20 @@
-import json
-import pandas as pd
+from ingestion import ingest_json, load_frame
+from snapshot_store import SnapshotStore
 
-# Load the data from the file
-with open('stock_data.json', 'r') as file:
-    data = json.load(file)
+# Stream the records from the JSON into typed columns (stock_data.columns/)
+layout = ingest_json('stock_data.json', 'stock_data.columns')
+print(f"Wrote {layout['rows']} records to 'stock_data.columns'")
 
-# Extract relevant data from the JSON
-formatted_data = []
-for record in data['data']:
-    formatted_data.append({
-        'symbol': record['symbol'],
-        'companyName': record['meta']['companyName'] if 'meta' in record else None,
-        'industry': record['meta']['industry'] if 'meta' in record else None,
-        'open': record['open'],
-        'dayHigh': record['dayHigh'],
-        'dayLow': record['dayLow'],
-        'lastPrice': record['lastPrice'],
-        'previousClose': record['previousClose'],
-        'change': record['change'],
-        'pChange': record['pChange'],
-        'yearHigh': record['yearHigh'],
-        'yearLow': record['yearLow'],
-        'totalTradedVolume': record['totalTradedVolume'],
-        'totalTradedValue': record['totalTradedValue'],
-        'perChange365d': record['perChange365d'],
-        'perChange30d': record['perChange30d']
-    })
-
-# Create a pandas DataFrame
-df = pd.DataFrame(formatted_data)
+df = load_frame('stock_data.columns')
 
 # Display the first 5 rows
 print(df.head())
 
 # Save to a CSV file (optional)
 df.to_csv('stock_data.csv', index=False)
+
+# Keep every scrape in the append-only history (stock_history/), keyed by the payload timestamp
+if SnapshotStore('stock_history').append_frame(df, layout['meta']['timestamp']):
+    print(f"Appended snapshot {layout['meta']['timestamp']} to 'stock_history'")
+else:
+    print(f"Snapshot {layout['meta']['timestamp']} already in 'stock_history'")
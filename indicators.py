@@ -0,0 +1,346 @@
+import numpy as np
+import pandas as pd
+
+from snapshot_store import IST, parse_timestamp
+
+# NSE's normal market, 09:15-15:30
+SESSION_SECONDS = 375 * 60
+# per-symbol state a snapshot can overwrite while its bar is still open
+_STATE = (('count', 0), ('changes', 0), ('last_price', np.nan), ('ema', np.nan), ('avg_gain', 0.0), ('avg_loss', 0.0),
+          ('peak', np.nan), ('drawdown', np.nan), ('max_drawdown', np.nan))
+
+INDICATOR_COLUMNS = ['sma', 'ema', 'rsi', 'volatility', 'vwap', 'drawdown', 'max_drawdown', 'sma_gap', 'vwap_gap',
+                     'observations']
+
+
+class _Window:
+    """Fixed-size ring buffer per symbol row with running sums, so a push is O(1) per row."""
+
+    def __init__(self, size, capacity, squares=False):
+        self.size = size
+        self.buf = np.zeros((capacity, size))
+        self.pos = np.zeros(capacity, dtype=np.int64)
+        self.filled = np.zeros(capacity, dtype=np.int64)
+        self.sum = np.zeros(capacity)
+        self.sumsq = np.zeros(capacity) if squares else None
+        # state before the open bar's push, and the slot value that push overwrote
+        self.saved_pos = np.zeros(capacity, dtype=np.int64)
+        self.saved_filled = np.zeros(capacity, dtype=np.int64)
+        self.saved_sum = np.zeros(capacity)
+        self.saved_sumsq = np.zeros(capacity)
+        self.saved_slot = np.zeros(capacity)
+
+    def grow(self, capacity):
+        extra = capacity - len(self.pos)
+        self.buf = np.vstack([self.buf, np.zeros((extra, self.size))])
+        for name in ('pos', 'filled', 'sum', 'sumsq', 'saved_pos', 'saved_filled', 'saved_sum', 'saved_sumsq',
+                     'saved_slot'):
+            current = getattr(self, name)
+            if current is not None:
+                setattr(self, name, np.concatenate([current, np.zeros(extra, dtype=current.dtype)]))
+
+    def mark(self, rows):
+        pos = self.pos[rows]
+        self.saved_pos[rows] = pos
+        self.saved_filled[rows] = self.filled[rows]
+        self.saved_sum[rows] = self.sum[rows]
+        if self.sumsq is not None:
+            self.saved_sumsq[rows] = self.sumsq[rows]
+        self.saved_slot[rows] = self.buf[rows, pos]
+
+    def rewind(self, rows):
+        # undoes the pushes since mark(), so the open bar's value can be pushed again
+        pos = self.saved_pos[rows]
+        self.buf[rows, pos] = self.saved_slot[rows]
+        self.pos[rows] = pos
+        self.filled[rows] = self.saved_filled[rows]
+        self.sum[rows] = self.saved_sum[rows]
+        if self.sumsq is not None:
+            self.sumsq[rows] = self.saved_sumsq[rows]
+
+    def push(self, rows, values):
+        pos = self.pos[rows]
+        # slots are 0 until written, so subtracting the outgoing value is right before the window is full too
+        old = self.buf[rows, pos]
+        self.sum[rows] += values - old
+        if self.sumsq is not None:
+            self.sumsq[rows] += values * values - old * old
+        self.buf[rows, pos] = values
+        self.pos[rows] = (pos + 1) % self.size
+        self.filled[rows] = np.minimum(self.filled[rows] + 1, self.size)
+
+    def resync(self):
+        # add-and-subtract accumulates float error over millions of ticks, recompute from the buffer now and then
+        self.sum = self.buf.sum(axis=1)
+        if self.sumsq is not None:
+            self.sumsq = (self.buf * self.buf).sum(axis=1)
+
+    def full(self):
+        return self.filled == self.size
+
+
+class IndicatorEngine:
+    """SMA, EMA, RSI, rolling volatility, VWAP and drawdown for a whole universe, updated per tick.
+
+    Every symbol is one row of flat state arrays. Windowed indicators keep a ring buffer of the
+    last values and their running sum, so a tick adds the new value and subtracts the one that
+    drops out instead of re-reading the window; EMA and Wilder's RSI averages are recursive and
+    drawdown only needs the running peak. An append updates all symbols of a snapshot with the
+    same handful of array operations, whatever the window lengths.
+
+    Windows count bars, not ticks. append() takes one bar per call. append_frame() folds NSE
+    snapshots into bars of bar_seconds (a day by default, keyed by the IST date of the payload
+    timestamp): each snapshot replaces the open bar's close instead of adding a bar, so a 20 bar
+    SMA is 20 sessions whether the feed is polled every 5 s or once a day. bar_seconds=None makes
+    every snapshot its own bar. periods_per_year annualizes volatility and is bars per year,
+    derived from bar_seconds (252 sessions of 375 minutes) unless given.
+
+    Feed it per-bar data with append(), NSE snapshots (cumulative day volume and value) with
+    append_frame(), or a whole history with load_history() / load_store(). values() and join()
+    return the current indicators; windowed ones are NaN until their window has filled.
+    """
+
+    def __init__(self, sma_window=20, ema_span=20, rsi_period=14, volatility_window=20, vwap_window=20,
+                 bar_seconds=86_400, periods_per_year=None, resync_every=10_000, capacity=64):
+        if periods_per_year is None:
+            bars_per_session = 1 if bar_seconds is None else max(1, SESSION_SECONDS // bar_seconds)
+            periods_per_year = 252 * bars_per_session
+        self.sma_window = sma_window
+        self.ema_span = ema_span
+        self.rsi_period = rsi_period
+        self.volatility_window = volatility_window
+        self.vwap_window = vwap_window
+        self.bar_seconds = bar_seconds
+        self.periods_per_year = periods_per_year
+        self.resync_every = resync_every
+        self.alpha = 2.0 / (ema_span + 1)
+
+        self.symbols = []
+        self.rows = {}
+        self.ticks = 0
+        self._capacity = capacity
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.changes = np.zeros(capacity, dtype=np.int64)
+        self.last_price = np.full(capacity, np.nan)
+        self.ema = np.full(capacity, np.nan)
+        self.avg_gain = np.zeros(capacity)
+        self.avg_loss = np.zeros(capacity)
+        self.peak = np.full(capacity, np.nan)
+        self.drawdown = np.full(capacity, np.nan)
+        self.max_drawdown = np.full(capacity, np.nan)
+        self.saved = {name: getattr(self, name).copy() for name, _ in _STATE}
+        # last cumulative day volume / value seen in a snapshot, to turn them into per-bar amounts
+        self.day_volume = np.zeros(capacity)
+        self.day_value = np.zeros(capacity)
+        # the bar each symbol's last snapshot went into, and what was traded in it so far
+        self.bar = np.full(capacity, -1, dtype=np.int64)
+        self.bar_volume = np.zeros(capacity)
+        self.bar_value = np.zeros(capacity)
+
+        self.prices = _Window(sma_window, capacity)
+        self.returns = _Window(volatility_window, capacity, squares=True)
+        self.traded_value = _Window(vwap_window, capacity)
+        self.traded_volume = _Window(vwap_window, capacity)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _grow(self, needed):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - self._capacity
+        for name, fill in _STATE + (('day_volume', 0.0), ('day_value', 0.0), ('bar', -1), ('bar_volume', 0.0),
+                                    ('bar_value', 0.0)):
+            current = getattr(self, name)
+            setattr(self, name, np.concatenate([current, np.full(extra, fill, dtype=current.dtype)]))
+        for name, fill in _STATE:
+            current = self.saved[name]
+            self.saved[name] = np.concatenate([current, np.full(extra, fill, dtype=current.dtype)])
+        for window in (self.prices, self.returns, self.traded_value, self.traded_volume):
+            window.grow(capacity)
+        self._capacity = capacity
+
+    def _rows_for(self, symbols) -> np.ndarray:
+        rows = np.empty(len(symbols), dtype=np.int64)
+        for i, symbol in enumerate(symbols):
+            row = self.rows.get(symbol)
+            if row is None:
+                row = len(self.symbols)
+                self.rows[symbol] = row
+                self.symbols.append(symbol)
+            rows[i] = row
+        if len(self.symbols) > self._capacity:
+            self._grow(len(self.symbols))
+        return rows
+
+    def append(self, symbols, prices, volumes=None, values=None):
+        """One tick: the latest price of each symbol (each symbol at most once) and, for VWAP,
+        the volume traded since the previous tick. values is the traded value of that volume;
+        when it is missing price * volume stands in for it."""
+        symbols = list(symbols)
+        rows = self._rows_for(symbols)
+        if len(np.unique(rows)) != len(rows):
+            raise ValueError("A symbol can appear only once per tick")
+        prices = np.asarray(prices, dtype=np.float64)
+        ok = np.isfinite(prices) & (prices > 0)
+        rows, prices = rows[ok], prices[ok]
+        if not len(rows):
+            return
+
+        first = self.count[rows] == 0
+        later = ~first
+        if later.any():
+            moved = rows[later]
+            price, previous = prices[later], self.last_price[moved]
+            change = price - previous
+            self.returns.push(moved, np.log(price / previous))
+            # Wilder's smoothing, a plain average over the first rsi_period changes
+            self.changes[moved] += 1
+            divisor = np.minimum(self.changes[moved], self.rsi_period)
+            self.avg_gain[moved] += (np.maximum(change, 0.0) - self.avg_gain[moved]) / divisor
+            self.avg_loss[moved] += (np.maximum(-change, 0.0) - self.avg_loss[moved]) / divisor
+
+        ema = self.ema[rows]
+        self.ema[rows] = np.where(first, prices, ema + self.alpha * (prices - ema))
+        self.prices.push(rows, prices)
+
+        peak = np.where(first, prices, np.fmax(self.peak[rows], prices))
+        drawdown = prices / peak - 1
+        self.peak[rows] = peak
+        self.drawdown[rows] = drawdown
+        self.max_drawdown[rows] = np.where(first, drawdown, np.fmin(self.max_drawdown[rows], drawdown))
+
+        if volumes is not None:
+            volume = np.nan_to_num(np.asarray(volumes, dtype=np.float64)[ok])
+            value = prices * volume if values is None else np.nan_to_num(np.asarray(values, dtype=np.float64)[ok])
+            self.traded_value.push(rows, value)
+            self.traded_volume.push(rows, volume)
+
+        self.last_price[rows] = prices
+        self.count[rows] += 1
+        self.ticks += 1
+        if self.ticks % self.resync_every == 0:
+            for window in (self.prices, self.returns, self.traded_value, self.traded_volume):
+                window.resync()
+
+    def append_frame(self, df, timestamp=None):
+        """One NSE snapshot, shaped like stock_data.csv, taken at timestamp (the payload's, now in
+        IST when missing). A snapshot in the same bar as the symbol's previous one revises that
+        bar's close, the first one in a new bar opens it. totalTradedVolume / totalTradedValue are
+        running totals for the day, so a bar's amounts add up the differences between its
+        snapshots; a total that went down means a new session started."""
+        df = df.drop_duplicates('symbol', keep='last')
+        symbols = df['symbol'].tolist()
+        rows = self._rows_for(symbols)
+        prices = pd.to_numeric(df['lastPrice'], errors='coerce').to_numpy(dtype=np.float64)
+        if self.bar_seconds is None:
+            same_bar = np.zeros(len(rows), dtype=bool)
+        else:
+            if timestamp is None:
+                timestamp = pd.Timestamp.now(tz=IST).tz_localize(None)
+            # NSE timestamps are IST wall clock, so a day bar is an IST date
+            bar = parse_timestamp(timestamp) // self.bar_seconds
+            same_bar = self.bar[rows] == bar
+            self.bar[rows] = bar
+
+        volumes = values = None
+        if 'totalTradedVolume' in df.columns:
+            day_volume = np.nan_to_num(pd.to_numeric(df['totalTradedVolume'], errors='coerce').to_numpy(dtype=np.float64))
+            day_value = (np.nan_to_num(pd.to_numeric(df['totalTradedValue'], errors='coerce').to_numpy(dtype=np.float64))
+                         if 'totalTradedValue' in df.columns else day_volume * np.nan_to_num(prices))
+            new_session = day_volume < self.day_volume[rows]
+            volume = np.where(new_session, day_volume, day_volume - self.day_volume[rows])
+            value = np.where(new_session, day_value, np.maximum(day_value - self.day_value[rows], 0.0))
+            volumes = np.where(same_bar, self.bar_volume[rows], 0.0) + volume
+            values = np.where(same_bar, self.bar_value[rows], 0.0) + value
+            self.bar_volume[rows] = volumes
+            self.bar_value[rows] = values
+            self.day_volume[rows] = day_volume
+            self.day_value[rows] = day_value
+
+        # the open bar is taken back out and pushed again with this snapshot's close; a symbol without
+        # a usable price keeps the close it had
+        ok = np.isfinite(prices) & (prices > 0)
+        self._rewind(rows[same_bar & ok])
+        self._mark(rows[~same_bar])
+        self.append(symbols, prices, volumes, values)
+
+    def _mark(self, rows):
+        for name, _ in _STATE:
+            self.saved[name][rows] = getattr(self, name)[rows]
+        for window in (self.prices, self.returns, self.traded_value, self.traded_volume):
+            window.mark(rows)
+
+    def _rewind(self, rows):
+        for name, _ in _STATE:
+            getattr(self, name)[rows] = self.saved[name][rows]
+        for window in (self.prices, self.returns, self.traded_value, self.traded_volume):
+            window.rewind(rows)
+
+    def load_history(self, df, time='timestamp', symbol='symbol', price='close', volume='volume', value=None):
+        """Replays a long-format history (one row per symbol and bar) in time order."""
+        columns = [c for c in (symbol, price, volume, value) if c is not None and c in df.columns]
+        ordered = df.sort_values(time, kind='stable')
+        for _, tick in ordered.groupby(time, sort=False)[columns]:
+            tick = tick.drop_duplicates(symbol, keep='last')
+            self.append(tick[symbol].tolist(), tick[price].to_numpy(dtype=np.float64),
+                        tick[volume].to_numpy(dtype=np.float64) if volume in tick.columns else None,
+                        tick[value].to_numpy(dtype=np.float64) if value is not None and value in tick.columns else None)
+        return self
+
+    def load_store(self, store, start=None, end=None):
+        """Replays the snapshots of a SnapshotStore between start and end."""
+        history = store.history(['lastPrice', 'totalTradedVolume', 'totalTradedValue'], start=start, end=end)
+        for timestamp, snapshot in history.groupby('timestamp', sort=False):
+            self.append_frame(snapshot, timestamp)
+        return self
+
+    @classmethod
+    def from_store(cls, store, start=None, end=None, **options) -> 'IndicatorEngine':
+        return cls(**options).load_store(store, start, end)
+
+    def values(self) -> pd.DataFrame:
+        n = len(self.symbols)
+        count = self.count[:n]
+        last = self.last_price[:n]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sma = np.where(self.prices.full()[:n], self.prices.sum[:n] / self.sma_window, np.nan)
+            ema = np.where(count >= self.ema_span, self.ema[:n], np.nan)
+
+            gain, loss = self.avg_gain[:n], self.avg_loss[:n]
+            rsi = np.where(loss > 0, 100 - 100 / (1 + gain / loss), np.where(gain > 0, 100.0, 50.0))
+            rsi = np.where(self.changes[:n] >= self.rsi_period, rsi, np.nan)
+
+            w = self.volatility_window
+            mean = self.returns.sum[:n] / w
+            variance = np.maximum(self.returns.sumsq[:n] - w * mean * mean, 0.0) / (w - 1)
+            volatility = np.where(self.returns.full()[:n], np.sqrt(variance * self.periods_per_year) * 100, np.nan)
+
+            traded = self.traded_volume.sum[:n]
+            vwap = np.where(traded > 0, self.traded_value.sum[:n] / traded, np.nan)
+
+            return pd.DataFrame({
+                'sma': sma,
+                'ema': ema,
+                'rsi': rsi,
+                'volatility': volatility,
+                'vwap': vwap,
+                'drawdown': self.drawdown[:n] * 100,
+                'max_drawdown': self.max_drawdown[:n] * 100,
+                'sma_gap': (last / sma - 1) * 100,
+                'vwap_gap': (last / vwap - 1) * 100,
+                'observations': count,
+            }, index=pd.Index(self.symbols, name='symbol'))
+
+    def join(self, df) -> pd.DataFrame:
+        """df with the current indicators as extra columns, NaN for symbols without history."""
+        values = self.values()
+        rows = np.array([self.rows.get(symbol, -1) for symbol in df['symbol']], dtype=np.int64)
+        known = rows >= 0
+        joined = df.drop(columns=[c for c in INDICATOR_COLUMNS if c in df.columns])
+        for col in INDICATOR_COLUMNS:
+            column = np.full(len(df), np.nan)
+            column[known] = values[col].to_numpy(dtype=np.float64)[rows[known]]
+            joined[col] = column
+        return joined
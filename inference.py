@@ -0,0 +1,65 @@
+from contextlib import nullcontext
+
+# "quality" is the original analyze_stock setting, the others trade detail for speed
+DECODING_PROFILES = {
+    "quality": {
+        "max_length": 300,
+        "num_beams": 5,
+        "temperature": 0.7,
+        "no_repeat_ngram_size": 3,
+        "top_k": 50,
+        "top_p": 0.95,
+        "early_stopping": True
+    },
+    "balanced": {
+        "max_length": 200,
+        "num_beams": 2,
+        "no_repeat_ngram_size": 3,
+        "early_stopping": True
+    },
+    "fast": {
+        "max_length": 150,
+        "num_beams": 1,
+        "no_repeat_ngram_size": 3
+    },
+}
+
+
+class InferenceConfig:
+    """How the T5 model runs on CPU.
+
+    quantize: dynamic int8 quantization of every nn.Linear (weights int8, activations float).
+    threads: torch intra-op thread count, None keeps torch's default.
+    inference_mode: run generate under torch.inference_mode() instead of plain eager autograd.
+    """
+
+    def __init__(self, profile="quality", quantize=False, threads=None, inference_mode=True):
+        if profile not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile: {profile}")
+        self.profile = profile
+        self.quantize = quantize
+        self.threads = threads
+        self.inference_mode = inference_mode
+
+    def generation_kwargs(self) -> dict:
+        return dict(DECODING_PROFILES[self.profile])
+
+    def prepare(self, model):
+        import torch
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        model.eval()
+        if self.quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def context(self):
+        if not self.inference_mode:
+            return nullcontext()
+        import torch
+        return torch.inference_mode()
+
+    def __repr__(self):
+        return (f"InferenceConfig(profile={self.profile!r}, quantize={self.quantize}, "
+                f"threads={self.threads}, inference_mode={self.inference_mode})")
@@ -0,0 +1,223 @@
+import json
+import os
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# column name -> (path inside an NSE record, dtype)
+STOCK_SCHEMA = {
+    'symbol': (('symbol',), 'str'),
+    'companyName': (('meta', 'companyName'), 'str'),
+    'industry': (('meta', 'industry'), 'str'),
+    'open': (('open',), 'float64'),
+    'dayHigh': (('dayHigh',), 'float64'),
+    'dayLow': (('dayLow',), 'float64'),
+    'lastPrice': (('lastPrice',), 'float64'),
+    'previousClose': (('previousClose',), 'float64'),
+    'change': (('change',), 'float64'),
+    'pChange': (('pChange',), 'float64'),
+    'yearHigh': (('yearHigh',), 'float64'),
+    'yearLow': (('yearLow',), 'float64'),
+    'totalTradedVolume': (('totalTradedVolume',), 'int64'),
+    'totalTradedValue': (('totalTradedValue',), 'float64'),
+    'perChange365d': (('perChange365d',), 'float64'),
+    'perChange30d': (('perChange30d',), 'float64'),
+}
+SCHEMA_FILE = 'schema.json'
+CHUNK_SIZE = 1 << 16
+# array typecodes for the numeric dtypes, missing ints are stored as 0 since there is no NaN
+_TYPECODES = {'float64': 'd', 'int64': 'q'}
+
+_decoder = json.JSONDecoder()
+_NUMBER_CHARS = set('0123456789.eE+-')
+
+
+class _Reader:
+    """Incremental reader that hands out one decoded JSON value at a time."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_ws(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return
+
+    def expect(self, char):
+        self.skip_ws()
+        if self.pos >= len(self.buf) or self.buf[self.pos] != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def peek(self):
+        self.skip_ws()
+        return self.buf[self.pos] if self.pos < len(self.buf) else ''
+
+    def value(self):
+        self.skip_ws()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # a number cut at the buffer edge still decodes ("2." -> 2), so only trust a value
+                # once the character after it is a real delimiter
+                if self.eof or (end < len(self.buf) and self.buf[end] not in _NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_records(f, key='data', meta=None):
+    """Yields the elements of the top-level `key` array without loading the whole payload.
+
+    Other top-level scalar fields (name, timestamp, ...) are collected into `meta`.
+    """
+    reader = _Reader(f)
+    reader.expect('{')
+    while reader.peek() != '}':
+        name = reader.value()
+        reader.expect(':')
+        if name == key:
+            reader.expect('[')
+            while reader.peek() != ']':
+                yield reader.value()
+                if reader.peek() == ',':
+                    reader.expect(',')
+            reader.expect(']')
+        else:
+            value = reader.value()
+            if meta is not None and not isinstance(value, (dict, list)):
+                meta[name] = value
+        if reader.peek() == ',':
+            reader.expect(',')
+
+
+def _field(record, path):
+    for part in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(part)
+    return record
+
+
+def records_frame(records, schema=STOCK_SCHEMA) -> pd.DataFrame:
+    """Typed frame of already decoded NSE records, with the same columns and dtypes as load_frame."""
+    columns = {name: [] for name in schema}
+    for record in records:
+        for name, (path, _) in schema.items():
+            columns[name].append(_field(record, path))
+    frame = {}
+    for name, (_, dtype) in schema.items():
+        if dtype == 'str':
+            frame[name] = np.array([None if value is None else str(value) for value in columns[name]], dtype=object)
+        else:
+            values = pd.to_numeric(pd.Series(columns[name], dtype=object), errors='coerce')
+            # same as ingest_json: missing ints become 0
+            frame[name] = values.fillna(0).to_numpy(dtype=dtype) if dtype == 'int64' else values.to_numpy(dtype=dtype)
+    return pd.DataFrame(frame)
+
+
+def ingest_json(json_path, out_dir, schema=STOCK_SCHEMA) -> dict:
+    """Streams an NSE payload into typed columns and writes them as .npy files under out_dir."""
+    numeric = {name: array(_TYPECODES[dtype]) for name, (_, dtype) in schema.items() if dtype != 'str'}
+    strings = {name: [] for name, (_, dtype) in schema.items() if dtype == 'str'}
+    meta = {}
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        for record in iter_records(f, meta=meta):
+            for name, column in numeric.items():
+                value = _field(record, schema[name][0])
+                try:
+                    column.append(float(value) if column.typecode == 'd' else int(value))
+                except (TypeError, ValueError):
+                    column.append(float('nan') if column.typecode == 'd' else 0)
+            for name, column in strings.items():
+                value = _field(record, schema[name][0])
+                column.append(None if value is None else str(value))
+
+    os.makedirs(out_dir, exist_ok=True)
+    columns = []
+    for name, (_, dtype) in schema.items():
+        if dtype == 'str':
+            # dictionary encoded: each distinct string is stored once, code -1 marks a missing value
+            lookup = {}
+            codes = np.fromiter((-1 if value is None else lookup.setdefault(value, len(lookup))
+                                 for value in strings[name]), dtype=np.int32, count=len(strings[name]))
+            _save(os.path.join(out_dir, f"{name}.codes.npy"), codes)
+            _save(os.path.join(out_dir, f"{name}.values.npy"), np.array(list(lookup), dtype=str))
+        else:
+            _save(os.path.join(out_dir, f"{name}.npy"), np.frombuffer(numeric[name], dtype=dtype))
+        columns.append({"name": name, "dtype": dtype})
+
+    layout = {"columns": columns, "rows": len(next(iter(numeric.values()), [])), "meta": meta}
+    # the schema goes last, so a reader never sees a layout whose column files are not written yet
+    tmp = os.path.join(out_dir, SCHEMA_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(layout, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, SCHEMA_FILE))
+    return layout
+
+
+def _save(path, array):
+    # load_frame memory-maps these files, so never write into them: a running analyzer would see
+    # the new values under its old rules (or SIGBUS once the file shrinks). A new file renamed over
+    # the old one leaves existing mappings on the old inode.
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def is_columnar(path) -> bool:
+    return os.path.isfile(os.path.join(path, SCHEMA_FILE))
+
+
+def read_layout(path) -> dict:
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        return json.load(f)
+
+
+def open_columns(path, mmap_mode='r') -> dict:
+    """Numeric columns as (memory-mapped) arrays, string columns as (codes, values) pairs."""
+    layout = read_layout(path)
+    columns = {}
+    for col in layout["columns"]:
+        name = col["name"]
+        if col["dtype"] == 'str':
+            columns[name] = (np.load(os.path.join(path, f"{name}.codes.npy"), mmap_mode=mmap_mode),
+                             np.load(os.path.join(path, f"{name}.values.npy")))
+        else:
+            columns[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+    return columns
+
+
+def decode_strings(codes, values) -> np.ndarray:
+    # the object array shares one str per distinct value, missing codes become NaN
+    lookup = np.append(values.astype(object), np.nan)
+    return lookup[np.where(codes < 0, len(values), codes)]
+
+
+def load_frame(path) -> pd.DataFrame:
+    frame = {}
+    # copy-on-write mappings: pages are only read when touched and edits never reach the file
+    for name, data in open_columns(path, mmap_mode='c').items():
+        frame[name] = decode_strings(*data) if isinstance(data, tuple) else data
+    # copy=False keeps every column on its own mapping instead of consolidating into one block
+    return pd.DataFrame(frame, copy=False)
@@ -0,0 +1,250 @@
+import numpy as np
+import pandas as pd
+
+# thresholds shared by generate_key_insights and analyze_stock
+YEARLY_MOVE = 20
+MONTHLY_MOVE = 10
+DAILY_MOVE = 3
+NEAR_HIGH = 80
+NEAR_LOW = 20
+OVERBOUGHT = 90
+OVERSOLD = 10
+HIGH_ACTIVITY_CR = 1000
+# rolling indicators, only present when the analyzer has an IndicatorEngine (see indicators.py)
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+HIGH_REALIZED_VOLATILITY = 40
+DEEP_DRAWDOWN = -20
+
+FLAG_COLUMNS = [
+    'flag_yearly_up', 'flag_yearly_down',
+    'flag_monthly_up', 'flag_monthly_down',
+    'flag_near_high', 'flag_near_low',
+    'flag_overbought', 'flag_oversold',
+    'flag_high_activity', 'flag_high_volatility',
+    'flag_has_industry',
+    'flag_rsi_overbought', 'flag_rsi_oversold',
+    'flag_above_sma', 'flag_below_sma',
+    'flag_high_realized_volatility', 'flag_deep_drawdown'
+]
+RULE_COLUMNS = ['price_position', 'value_cr'] + FLAG_COLUMNS
+
+
+def _column(df, col):
+    if col in df.columns:
+        return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+    return np.full(len(df), np.nan)
+
+
+def apply_rules(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds price_position, value_cr and every rule flag as columns, for all rows at once."""
+    yearly = _column(df, 'perChange365d')
+    monthly = _column(df, 'perChange30d')
+    daily = _column(df, 'pChange')
+    price = _column(df, 'lastPrice')
+    high = _column(df, 'yearHigh')
+    low = _column(df, 'yearLow')
+
+    span = high - low
+    with np.errstate(divide='ignore', invalid='ignore'):
+        position = (price - low) / span * 100
+    # a flat 52-week range has no meaningful position, treat it as mid-range
+    position = np.where(span == 0, 50.0, position)
+
+    value_cr = _column(df, 'totalTradedValue') / 10000000
+    rsi = _column(df, 'rsi')
+    sma_gap = _column(df, 'sma_gap')
+    volatility = _column(df, 'volatility')
+    drawdown = _column(df, 'drawdown')
+
+    # NaN compares False everywhere, same as the scalar float() comparisons did
+    with np.errstate(invalid='ignore'):
+        df['price_position'] = position
+        df['value_cr'] = value_cr
+        df['flag_yearly_up'] = yearly > YEARLY_MOVE
+        df['flag_yearly_down'] = yearly < -YEARLY_MOVE
+        df['flag_monthly_up'] = monthly > MONTHLY_MOVE
+        df['flag_monthly_down'] = monthly < -MONTHLY_MOVE
+        df['flag_near_high'] = position > NEAR_HIGH
+        df['flag_near_low'] = position < NEAR_LOW
+        df['flag_overbought'] = position > OVERBOUGHT
+        df['flag_oversold'] = position < OVERSOLD
+        df['flag_high_activity'] = value_cr > HIGH_ACTIVITY_CR
+        df['flag_high_volatility'] = np.abs(daily) > DAILY_MOVE
+        # without indicator columns these are NaN, so every indicator flag stays False
+        df['flag_rsi_overbought'] = rsi > RSI_OVERBOUGHT
+        df['flag_rsi_oversold'] = rsi < RSI_OVERSOLD
+        df['flag_above_sma'] = sma_gap > 0
+        df['flag_below_sma'] = sma_gap < 0
+        df['flag_high_realized_volatility'] = volatility > HIGH_REALIZED_VOLATILITY
+        df['flag_deep_drawdown'] = drawdown < DEEP_DRAWDOWN
+    if 'industry' in df.columns:
+        df['flag_has_industry'] = df['industry'].notna().to_numpy()
+    else:
+        df['flag_has_industry'] = False
+    return df
+
+
+def has_rule_columns(stock) -> bool:
+    return all(col in stock for col in RULE_COLUMNS)
+
+
+def ensure_rule_columns(stock) -> pd.Series:
+    # rows that did not come from load_stock_data get evaluated on the fly
+    if has_rule_columns(stock):
+        return stock
+    return apply_rules(stock.to_frame().T.copy()).iloc[0]
+
+
+def key_insights(stock) -> dict:
+    stock = ensure_rule_columns(stock)
+    insights = {
+        "growth_metrics": [],
+        "valuation_risks": [],
+        "technical_signals": [],
+        "market_risks": [],
+        "strategy": []
+    }
+    yearly_change = float(stock['perChange365d'])
+    monthly_change = float(stock['perChange30d'])
+    daily_change = float(stock['pChange'])
+    value_cr = float(stock['value_cr'])
+
+    if stock['flag_yearly_up']:
+        insights["growth_metrics"].append(f"Strong yearly growth of {yearly_change:.1f}%")
+    elif stock['flag_yearly_down']:
+        insights["growth_metrics"].append(f"Significant yearly decline of {yearly_change:.1f}%")
+
+    if stock['flag_monthly_up']:
+        insights["growth_metrics"].append(f"Robust monthly gains: +{monthly_change:.1f}%")
+    elif stock['flag_monthly_down']:
+        insights["growth_metrics"].append(f"Notable monthly decline: {monthly_change:.1f}%")
+
+    if stock['flag_near_high']:
+        insights["technical_signals"].append("Trading near 52-week high")
+        insights["valuation_risks"].append("Potential overvaluation risk at current levels")
+    elif stock['flag_near_low']:
+        insights["technical_signals"].append("Trading near 52-week low")
+        insights["strategy"].append("Consider gradual accumulation at these levels")
+
+    if stock['flag_high_activity']:
+        insights["technical_signals"].append(f"High trading activity: ₹{value_cr:.0f}Cr")
+
+    if stock['flag_overbought']:
+        insights["market_risks"].append("Overbought conditions - higher risk of pullback")
+        insights["strategy"].append("Consider booking partial profits")
+    elif stock['flag_oversold']:
+        insights["market_risks"].append("Oversold conditions - watch for reversal")
+        insights["strategy"].append("Opportunity for value investors")
+
+    if stock['flag_high_volatility']:
+        insights["technical_signals"].append(f"High volatility: {daily_change:+.1f}% today")
+        insights["strategy"].append("Use stop-loss for risk management")
+
+    if stock['flag_rsi_overbought']:
+        insights["technical_signals"].append(f"RSI overbought at {float(stock['rsi']):.0f}")
+    elif stock['flag_rsi_oversold']:
+        insights["technical_signals"].append(f"RSI oversold at {float(stock['rsi']):.0f}")
+
+    if stock['flag_above_sma']:
+        insights["technical_signals"].append(f"{float(stock['sma_gap']):.1f}% above its moving average")
+    elif stock['flag_below_sma']:
+        insights["technical_signals"].append(f"{-float(stock['sma_gap']):.1f}% below its moving average")
+
+    if stock['flag_high_realized_volatility']:
+        insights["market_risks"].append(f"Realized volatility of {float(stock['volatility']):.0f}% annualized")
+    if stock['flag_deep_drawdown']:
+        insights["market_risks"].append(f"{-float(stock['drawdown']):.1f}% below its peak")
+
+    if stock['flag_has_industry']:
+        insights["market_risks"].append(f"Monitor {stock['industry']} sector trends and competition")
+
+    return insights
+
+
+def analysis_insights(stock) -> dict:
+    stock = ensure_rule_columns(stock)
+    yearly_change = float(stock['perChange365d'])
+    monthly_change = float(stock['perChange30d'])
+    daily_change = float(stock['pChange'])
+    price_position = float(stock['price_position'])
+    value_cr = float(stock['value_cr'])
+    industry = stock['industry'] if 'industry' in stock else 'N/A'
+
+    insights = {
+        "growth": {
+            "icon": "✅",
+            "title": "Growth Analysis",
+            "details": []
+        },
+        "valuation": {
+            "icon": "⚠️",
+            "title": "Valuation Risk",
+            "details": []
+        },
+        "technical": {
+            "icon": "📈",
+            "title": "Technical Indicators",
+            "details": []
+        },
+        "market": {
+            "icon": "🌍",
+            "title": "Market Risks",
+            "details": []
+        },
+        "strategy": {
+            "icon": "💡",
+            "title": "Investment Strategy",
+            "details": []
+        }
+    }
+
+    if stock['flag_yearly_up']:
+        insights["growth"]["details"].append(f"Strong yearly growth of {yearly_change:.1f}%")
+    elif stock['flag_yearly_down']:
+        insights["growth"]["details"].append(f"Significant decline of {yearly_change:.1f}%")
+    if stock['flag_monthly_up']:
+        insights["growth"]["details"].append(f"Robust monthly performance: +{monthly_change:.1f}%")
+    if not insights["growth"]["details"]:
+        insights["growth"]["details"].append(f"Moderate growth with {yearly_change:.1f}% yearly change")
+
+    if stock['flag_near_high']:
+        insights["valuation"]["details"].append("Trading near 52-week high, potential overvaluation")
+    elif stock['flag_near_low']:
+        insights["valuation"]["details"].append("Trading near 52-week low, possible undervaluation")
+    else:
+        insights["valuation"]["details"].append(f"Trading at {price_position:.1f}% of 52-week range")
+
+    if stock['flag_overbought']:
+        insights["technical"]["details"].append("Strongly overbought conditions")
+    elif stock['flag_oversold']:
+        insights["technical"]["details"].append("Strongly oversold conditions")
+    if stock['flag_high_activity']:
+        insights["technical"]["details"].append(f"High trading activity: ₹{value_cr:.0f}Cr")
+    if stock['flag_rsi_overbought']:
+        insights["technical"]["details"].append(f"RSI overbought at {float(stock['rsi']):.0f}")
+    elif stock['flag_rsi_oversold']:
+        insights["technical"]["details"].append(f"RSI oversold at {float(stock['rsi']):.0f}")
+    if stock['flag_above_sma']:
+        insights["technical"]["details"].append(f"{float(stock['sma_gap']):.1f}% above its moving average")
+    elif stock['flag_below_sma']:
+        insights["technical"]["details"].append(f"{-float(stock['sma_gap']):.1f}% below its moving average")
+    if not insights["technical"]["details"]:
+        insights["technical"]["details"].append("Neutral technical indicators")
+
+    insights["market"]["details"].append(f"Monitor {industry} sector trends")
+    if stock['flag_high_volatility']:
+        insights["market"]["details"].append(f"High volatility: {daily_change:+.1f}% daily change")
+    if stock['flag_high_realized_volatility']:
+        insights["market"]["details"].append(f"Realized volatility of {float(stock['volatility']):.0f}% annualized")
+    if stock['flag_deep_drawdown']:
+        insights["market"]["details"].append(f"{-float(stock['drawdown']):.1f}% below its peak")
+
+    if stock['flag_near_high']:
+        insights["strategy"]["details"].append("Consider profit booking or staggered exit")
+    elif stock['flag_near_low']:
+        insights["strategy"]["details"].append("Opportunity for gradual accumulation")
+    else:
+        insights["strategy"]["details"].append("Hold with strict stop-loss")
+
+    return insights
@@ -1,245 +1,590 @@
+import numpy as np
 import pandas as pd
-from transformers import AutoTokenizer, AutoModelForCausalLM, T5ForConditionalGeneration, T5Tokenizer
-import torch
 import gc
+import threading
+import time
+from ingestion import is_columnar, load_frame
+from inference import DECODING_PROFILES, InferenceConfig
+from analysis_cache import cache_key
+from insight_rules import apply_rules, analysis_insights, key_insights
+from metrics import REGISTRY, TOKEN_BUCKETS
+from prompt_builder import EncodedPrompt, PromptBuilder
+from screener import Screener
+from stock_index import StockStore
+
+DEFAULT_MODEL_NAME = "AventIQ-AI/t5-stockmarket-qa-chatbot"
+
 
 class EnhancedStockAnalyzer:
-    def __init__(self):
-        gc.collect()
-
-        self.model_name = "AventIQ-AI/t5-stockmarket-qa-chatbot"
-        print("Loading model...")
-        self.tokenizer = T5Tokenizer.from_pretrained(self.model_name)
-        self.model = T5ForConditionalGeneration.from_pretrained(self.model_name)
-        print("Model loaded!")
+    # preload: "lazy" loads the model on the first AI request, "eager" in the constructor,
+    # "background" on a daemon thread started by the constructor.
+    # rules_only=True never imports torch/transformers and leaves ai_analysis as None.
+    # inference: an InferenceConfig picking the decoding profile, int8 quantization and threads.
+    # metrics: the MetricsRegistry stage timings, token counts and cache hits go to.
+    # prompt_budget: encoder tokens per prompt, defaults to max_input_length.
+    # indicators: an IndicatorEngine, its rolling indicators feed the rules and the prompt.
+    def __init__(self, cache=None, preload="lazy", rules_only=False, model_name=DEFAULT_MODEL_NAME,
+                 inference=None, metrics=None, prompt_budget=None, indicators=None):
+        if preload not in ("lazy", "eager", "background"):
+            raise ValueError(f"Unknown preload mode: {preload}")
+
+        self.model_name = model_name
+        self.rules_only = rules_only
+        self.inference = inference or InferenceConfig()
+        self.metrics = metrics if metrics is not None else REGISTRY
+        self._tokenizer = None
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._warm_thread = None
+
         self.stock_data = None
+        self.records = StockStore(pd.DataFrame())
+        # None after update_stock_rows until the next screener access rebuilds it
+        self._screener = Screener(pd.DataFrame())
+        self.snapshot_store = None
+        # joined onto every frame passed to set_stock_data, appending ticks to it is up to the caller
+        self.indicators = indicators
+        self.cache = cache
+
+        self.max_input_length = 512
+        self.prompt_builder = PromptBuilder(budget=prompt_budget or self.max_input_length)
+        # max_length can be increased depending how detailed analysis you desire
+        self.generation_kwargs = self.inference.generation_kwargs()
+
+        if not rules_only:
+            if preload == "eager":
+                self.load_model()
+            elif preload == "background":
+                self._warm_thread = threading.Thread(target=self._warm, name="model-warmup", daemon=True)
+                self._warm_thread.start()
+
+    def set_profile(self, profile):
+        if profile not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile: {profile}")
+        self.inference.profile = profile
+        self.generation_kwargs = self.inference.generation_kwargs()
+
+    def load_model(self):
+        if self.rules_only:
+            raise RuntimeError("Model is disabled in rules-only mode")
+        with self._model_lock:
+            if self._model is not None:
+                return
+            # imported here so rules-only use and cold start never pay for torch
+            from transformers import T5ForConditionalGeneration, T5Tokenizer
+
+            with self._stage("gc"):
+                gc.collect()
+            print("Loading model...")
+            with self.metrics.timer("stock_analysis_model_load_seconds", quantize=self.inference.quantize):
+                tokenizer = T5Tokenizer.from_pretrained(self.model_name)
+                model = self.inference.prepare(T5ForConditionalGeneration.from_pretrained(self.model_name))
+            self._tokenizer = tokenizer
+            self._model = model
+            print("Model loaded!")
+
+    def _stage(self, stage):
+        return self.metrics.timer("stock_analysis_stage_seconds", stage=stage)
+
+    def set_model(self, tokenizer, model):
+        # plug in an already loaded (or stand-in) tokenizer and model instead of from_pretrained
+        with self._model_lock:
+            self._tokenizer = tokenizer
+            self._model = model
+
+    def _warm(self):
+        try:
+            self.load_model()
+        except Exception as e:
+            # the next AI request retries and surfaces the error in its result
+            print(f"Error loading model in background: {str(e)}")
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self.load_model()
+        return self._tokenizer
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.load_model()
+        return self._model
 
     def load_stock_data(self, csv_path):
         try:
-            self.stock_data = pd.read_csv(csv_path)
+            # columnar files written by data_formatting.py are already typed
+            if is_columnar(csv_path):
+                with self._stage("load_data"):
+                    frame = load_frame(csv_path)
+                self.set_stock_data(frame)
+                print(f"Loaded data for {len(self.stock_data)} stocks")
+                return
+
+            with self._stage("load_data"):
+                self.stock_data = pd.read_csv(csv_path)
+
+                if 'industry' not in self.stock_data.columns:
+                    self.stock_data['industry'] = 'N/A'
 
-            if 'industry' not in self.stock_data.columns:
-                self.stock_data['industry'] = 'N/A'
+                numeric_columns = ['open', 'dayHigh', 'dayLow', 'lastPrice', 'previousClose',
+                                 'change', 'pChange', 'yearHigh', 'yearLow', 'totalTradedVolume',
+                                 'totalTradedValue', 'perChange365d', 'perChange30d']
 
-            numeric_columns = ['open', 'dayHigh', 'dayLow', 'lastPrice', 'previousClose',
-                             'change', 'pChange', 'yearHigh', 'yearLow', 'totalTradedVolume',
-                             'totalTradedValue', 'perChange365d', 'perChange30d']
+                for col in numeric_columns:
+                    if col in self.stock_data.columns:
+                        self.stock_data[col] = pd.to_numeric(self.stock_data[col], errors='coerce')
 
-            for col in numeric_columns:
-                if col in self.stock_data.columns:
-                    self.stock_data[col] = pd.to_numeric(self.stock_data[col], errors='coerce')
+            self.set_stock_data(self.stock_data)
 
             print(f"Loaded data for {len(self.stock_data)} stocks")
         except Exception as e:
             print(f"Error loading data: {str(e)}")
-            self.stock_data = pd.DataFrame()
+            self.set_stock_data(pd.DataFrame())
+
+    def load_snapshot(self, store, at=None):
+        # alternative to load_stock_data: the cross-section of a SnapshotStore at a point in time
+        try:
+            if self.indicators is not None and not len(self.indicators):
+                self.indicators.load_store(store, end=at)
+            self.set_stock_data(store.cross_section(at))
+            self.snapshot_store = store
+            print(f"Loaded snapshot data for {len(self.stock_data)} stocks")
+        except Exception as e:
+            print(f"Error loading snapshot: {str(e)}")
+            self.set_stock_data(pd.DataFrame())
+
+    def set_stock_data(self, df):
+        if self.indicators is not None:
+            with self._stage("indicators"):
+                df = self.indicators.join(df)
+        with self._stage("rules"):
+            self.stock_data = apply_rules(df)
+        with self._stage("index"):
+            self.records = StockStore(self.stock_data)
+        with self._stage("screener"):
+            self._screener = Screener(self.stock_data)
+
+    def update_stock_rows(self, df, removed=()):
+        """Publishes changed rows of the loaded universe without reloading it.
+
+        Rules (and indicators) run on the given rows only and are written over the loaded rows
+        into a new frame, so anyone holding the previous stock_data keeps an unchanged copy. New
+        or removed symbols change the row layout and go through set_stock_data instead. The
+        screener ranks across every row, it is rebuilt on its next use rather than on every update.
+        """
+        df = df.drop_duplicates('symbol', keep='last')
+        if self.stock_data is None or self.stock_data.empty:
+            self.set_stock_data(df.reset_index(drop=True))
+            return
+        removed = set(removed)
+        known = np.fromiter((symbol in self.records for symbol in df['symbol']), dtype=bool, count=len(df))
+        if removed or not known.all():
+            frame = _patch_rows(self.stock_data, self._positions(df[known]), df[known])
+            frame = frame[~frame['symbol'].isin(removed)]
+            self.set_stock_data(pd.concat([frame, df[~known]], ignore_index=True))
+            return
+        if df.empty:
+            return
+
+        if self.indicators is not None:
+            with self._stage("indicators"):
+                df = self.indicators.join(df)
+        with self._stage("rules"):
+            rows = apply_rules(df.copy())
+        with self._stage("index"):
+            positions = self._positions(rows)
+            moved_industry = ('industry' in rows.columns and 'industry' in self.stock_data.columns and not
+                              rows['industry'].reset_index(drop=True).equals(
+                                  self.stock_data['industry'].iloc[positions].reset_index(drop=True)))
+            frame = _patch_rows(self.stock_data, positions, rows)
+            records = StockStore(frame) if moved_industry else self.records.with_columns(frame, rows.columns)
+        # both are built before either is published, and each is swapped in by one assignment, so
+        # concurrent readers see the old or the new version, never a store that is half updated
+        self.stock_data, self.records = frame, records
+        self._screener = None
+
+    def _positions(self, df):
+        return [self.records.symbol_index[symbol] for symbol in df['symbol']]
+
+    @property
+    def screener(self) -> Screener:
+        screener = self._screener
+        if screener is None:
+            with self._stage("screener"):
+                screener = self._screener = Screener(self.stock_data)
+        return screener
 
     def generate_key_insights(self, stock) -> dict:
-        insights = {
-            "growth_metrics": [],
-            "valuation_risks": [],
-            "technical_signals": [],
-            "market_risks": [],
-            "strategy": []
+        return key_insights(stock)
+
+    def _find_stock(self, symbol):
+        return self.records.record(symbol)
+
+    def build_prompt(self, symbol, stock, insights) -> str:
+        return self.prompt_builder.build(symbol, stock, insights).text
+
+    def encode_prompt(self, symbol) -> EncodedPrompt:
+        # the encoder input analyze_stock would use, with its token_count and any dropped lines
+        _, _, prompt = self._prepare(symbol)
+        return self.prompt_builder.encode(prompt, self.tokenizer)
+
+    def _build_result(self, symbol, stock, insights, ai_analysis) -> dict:
+        industry = stock['industry'] if 'industry' in stock else 'N/A'
+        return {
+            "basic_info": {
+                "symbol": symbol,
+                "company": stock['companyName'] if 'companyName' in stock else symbol,
+                "industry": industry
+            },
+            "price_data": {
+                "current_price": float(stock['lastPrice']),
+                "day_range": {"low": float(stock['dayLow']), "high": float(stock['dayHigh'])},
+                "year_range": {"low": float(stock['yearLow']), "high": float(stock['yearHigh'])}
+            },
+            "performance": {
+                "daily_change": float(stock['pChange']),
+                "monthly_change": float(stock['perChange30d']),
+                "yearly_change": float(stock['perChange365d'])
+            },
+            "trading_info": {
+                "volume": int(stock['totalTradedVolume']),
+                "value_cr": float(stock['value_cr'])
+            },
+            "insights": insights,
+            "ai_analysis": ai_analysis
         }
-        yearly_change = float(stock['perChange365d'])
-        monthly_change = float(stock['perChange30d'])
-        daily_change = float(stock['pChange'])
-
-        if abs(yearly_change) > 20:
-            if yearly_change > 0:
-                insights["growth_metrics"].append(f"Strong yearly growth of {yearly_change:.1f}%")
-            else:
-                insights["growth_metrics"].append(f"Significant yearly decline of {yearly_change:.1f}%")
-
-        if abs(monthly_change) > 10:
-            if monthly_change > 0:
-                insights["growth_metrics"].append(f"Robust monthly gains: +{monthly_change:.1f}%")
-            else:
-                insights["growth_metrics"].append(f"Notable monthly decline: {monthly_change:.1f}%")
-
-        current_price = float(stock['lastPrice'])
-        year_high = float(stock['yearHigh'])
-        year_low = float(stock['yearLow'])
-        price_position = (current_price - year_low) / (year_high - year_low) * 100
-
-        if price_position > 80:
-            insights["technical_signals"].append("Trading near 52-week high")
-            insights["valuation_risks"].append("Potential overvaluation risk at current levels")
-        elif price_position < 20:
-            insights["technical_signals"].append("Trading near 52-week low")
-            insights["strategy"].append("Consider gradual accumulation at these levels")
-
-        value_cr = float(stock['totalTradedValue'])/10000000
-        if value_cr > 1000:
-            insights["technical_signals"].append(f"High trading activity: ₹{value_cr:.0f}Cr")
-
-        if price_position > 90:
-            insights["market_risks"].append("Overbought conditions - higher risk of pullback")
-            insights["strategy"].append("Consider booking partial profits")
-        elif price_position < 10:
-            insights["market_risks"].append("Oversold conditions - watch for reversal")
-            insights["strategy"].append("Opportunity for value investors")
-
-        if abs(daily_change) > 3:
-            insights["technical_signals"].append(f"High volatility: {daily_change:+.1f}% today")
-            insights["strategy"].append("Use stop-loss for risk management")
-
-        industry = stock['industry'] if 'industry' in stock else None
-        if pd.notna(industry):
-            insights["market_risks"].append(f"Monitor {industry} sector trends and competition")
-
-        return insights
-
-    def analyze_stock(self, symbol: str) -> dict:
+
+    def analyze_stock(self, symbol: str, include_ai: bool = True) -> dict:
         if self.stock_data is None or self.stock_data.empty:
             return {"error": "No data loaded"}
 
+        start = time.perf_counter()
         try:
-            stock = self.stock_data[self.stock_data['symbol'] == symbol].iloc[0]
-
-            yearly_change = float(stock['perChange365d'])
-            monthly_change = float(stock['perChange30d'])
-            daily_change = float(stock['pChange'])
-            current_price = float(stock['lastPrice'])
-            year_high = float(stock['yearHigh'])
-            year_low = float(stock['yearLow'])
-            price_position = (current_price - year_low) / (year_high - year_low) * 100
-            value_cr = float(stock['totalTradedValue'])/10000000
-
-            insights = {
-                "growth": {
-                    "icon": "✅",
-                    "title": "Growth Analysis",
-                    "details": []
-                },
-                "valuation": {
-                    "icon": "⚠️",
-                    "title": "Valuation Risk",
-                    "details": []
-                },
-                "technical": {
-                    "icon": "📈",
-                    "title": "Technical Indicators",
-                    "details": []
-                },
-                "market": {
-                    "icon": "🌍",
-                    "title": "Market Risks",
-                    "details": []
-                },
-                "strategy": {
-                    "icon": "💡",
-                    "title": "Investment Strategy",
-                    "details": []
-                }
-            }
-
-            if yearly_change > 20:
-                insights["growth"]["details"].append(f"Strong yearly growth of {yearly_change:.1f}%")
-            elif yearly_change < -20:
-                insights["growth"]["details"].append(f"Significant decline of {yearly_change:.1f}%")
-            if monthly_change > 10:
-                insights["growth"]["details"].append(f"Robust monthly performance: +{monthly_change:.1f}%")
-            if not insights["growth"]["details"]:
-                insights["growth"]["details"].append(f"Moderate growth with {yearly_change:.1f}% yearly change")
-
-            if price_position > 80:
-                insights["valuation"]["details"].append("Trading near 52-week high, potential overvaluation")
-            elif price_position < 20:
-                insights["valuation"]["details"].append("Trading near 52-week low, possible undervaluation")
-            else:
-                insights["valuation"]["details"].append(f"Trading at {price_position:.1f}% of 52-week range")
-
-            if price_position > 90:
-                insights["technical"]["details"].append("Strongly overbought conditions")
-            elif price_position < 10:
-                insights["technical"]["details"].append("Strongly oversold conditions")
-            if value_cr > 1000:
-                insights["technical"]["details"].append(f"High trading activity: ₹{value_cr:.0f}Cr")
-            if not insights["technical"]["details"]:
-                insights["technical"]["details"].append("Neutral technical indicators")
-
-            industry = stock['industry'] if 'industry' in stock else 'N/A'
-            insights["market"]["details"].append(f"Monitor {industry} sector trends")
-            if abs(daily_change) > 3:
-                insights["market"]["details"].append(f"High volatility: {daily_change:+.1f}% daily change")
-
-            if price_position > 80:
-                insights["strategy"]["details"].append("Consider profit booking or staggered exit")
-            elif price_position < 20:
-                insights["strategy"]["details"].append("Opportunity for gradual accumulation")
-            else:
-                insights["strategy"]["details"].append("Hold with strict stop-loss")
-
-            insight_prompt = f"""Question: Provide a detailed analysis for {symbol} ({stock['companyName']}) in the {industry} sector:
-
-Current Market Data:
-• Price: ₹{current_price:,.2f} ({daily_change:+.2f}% today)
-• 52-Week Range: ₹{year_low:,.2f} - ₹{year_high:,.2f}
-• Trading Value: ₹{value_cr:,.2f}Cr
-• Price Position: {price_position:.1f}% of 52-week range
-
-Performance Changes:
-• Daily: {daily_change:+.2f}%
-• Monthly: {monthly_change:+.2f}%
-• Yearly: {yearly_change:+.2f}%
-
-Technical Analysis:
-• Growth: {', '.join(insights['growth']['details'])}
-• Valuation: {', '.join(insights['valuation']['details'])}
-• Technical Indicators: {', '.join(insights['technical']['details'])}
-• Market Risks: {', '.join(insights['market']['details'])}
-• Strategy: {', '.join(insights['strategy']['details'])}
-
-Provide a structured analysis with the following sections:
-1. Overall Market Position: Current standing and momentum
-2. Key Strengths: Positive factors and opportunities
-3. Primary Concerns: Risk factors and challenges
-4. Investment Recommendations: Clear actionable steps
-5. Risk Monitoring: Specific factors to watch
-
-Answer: """
+            stock, insights, insight_prompt = self._prepare(symbol)
 
             # geneRating analysis using the model
-            inputs = self.tokenizer(insight_prompt, return_tensors="pt", max_length=512, truncation=True)
-            outputs = self.model.generate(
-                inputs["input_ids"],
-                max_length=300,  # can be increased depending how detailed analysis you desire
-                num_beams=5,
-                temperature=0.7,
-                no_repeat_ngram_size=3,
-                top_k=50,
-                top_p=0.95,
-                early_stopping=True
-            )
-            ai_analysis = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-            return {
-                "basic_info": {
-                    "symbol": symbol,
-                    "company": stock['companyName'] if 'companyName' in stock else symbol,
-                    "industry": industry
-                },
-                "price_data": {
-                    "current_price": current_price,
-                    "day_range": {"low": float(stock['dayLow']), "high": float(stock['dayHigh'])},
-                    "year_range": {"low": year_low, "high": year_high}
-                },
-                "performance": {
-                    "daily_change": daily_change,
-                    "monthly_change": monthly_change,
-                    "yearly_change": yearly_change
-                },
-                "trading_info": {
-                    "volume": int(stock['totalTradedVolume']),
-                    "value_cr": value_cr
-                },
-                "insights": insights,
-                "ai_analysis": ai_analysis
-            }
+            ai_analysis = self._generate(insight_prompt) if include_ai else None
+
+            if include_ai and not self.rules_only:
+                # the blocking path shows nothing, not even the rule-based parts, until the text is done
+                # rules-only results never run the model and would only pull the latency histograms down
+                elapsed = time.perf_counter() - start
+                self.metrics.observe("stock_analysis_ttfc_seconds", elapsed, mode="blocking")
+                self.metrics.observe("stock_analysis_ttft_seconds", elapsed, mode="blocking")
+            return self._build_result(symbol, stock, insights, ai_analysis)
 
         except Exception as e:
+            self.metrics.inc("stock_analysis_errors_total")
             return {"error": str(e)}
         finally:
-            gc.collect()
\ No newline at end of file
+            self.metrics.observe("stock_analysis_seconds", time.perf_counter() - start, mode="single")
+
+    def analyze_stock_stream(self, symbol: str):
+        """Streaming analyze_stock, yielding (event, payload) pairs as they become available.
+
+        ("result", dict) comes first, with ai_analysis None, as soon as the rule-based parts are
+        ready. ("token", str) follows for every chunk of T5 text as it is decoded, and ("done", dict)
+        ends the stream with the complete result. A failure yields ("error", {"error": ...}) instead.
+        Beam search (num_beams > 1) only settles on its text at the end, so the quality profile
+        sends the whole text as one chunk; greedy profiles such as "fast" stream word by word.
+        """
+        start = time.perf_counter()
+        if self.stock_data is None or self.stock_data.empty:
+            yield "error", {"error": "No data loaded"}
+            return
+
+        try:
+            stock, insights, insight_prompt = self._prepare(symbol)
+            # built here so a row analyze_stock reports as an error (e.g. NaN volume) does the same here
+            result = self._build_result(symbol, stock, insights, None)
+        except Exception as e:
+            self.metrics.inc("stock_analysis_errors_total")
+            yield "error", {"error": str(e)}
+            return
+
+        yield "result", result
+        if not self.rules_only:
+            # time to first content is a generation metric, a rules-only stream ends right here
+            self.metrics.observe("stock_analysis_ttfc_seconds", time.perf_counter() - start, mode="stream")
+
+        stream = self._generate_stream(insight_prompt)
+        first = True
+        try:
+            while True:
+                try:
+                    chunk = next(stream)
+                except StopIteration as stop:
+                    ai_analysis = stop.value
+                    break
+                if first:
+                    self.metrics.observe("stock_analysis_ttft_seconds", time.perf_counter() - start, mode="stream")
+                    first = False
+                yield "token", chunk
+            result = self._build_result(symbol, stock, insights, ai_analysis)
+        except Exception as e:
+            self.metrics.inc("stock_analysis_errors_total")
+            yield "error", {"error": str(e)}
+            return
+        finally:
+            self.metrics.observe("stock_analysis_seconds", time.perf_counter() - start, mode="stream")
+
+        yield "done", result
+
+    def _prepare(self, symbol):
+        with self._stage("lookup"):
+            stock = self._find_stock(symbol)
+        with self._stage("insights"):
+            insights = analysis_insights(stock)
+        with self._stage("prompt"):
+            prompt = self.prompt_builder.build(symbol, stock, insights)
+        return stock, insights, prompt
+
+    def analyze_many(self, symbols, batch_size: int = 8) -> dict:
+        if self.stock_data is None or self.stock_data.empty:
+            return {symbol: {"error": "No data loaded"} for symbol in symbols}
+
+        began = time.perf_counter()
+        results = {}
+        pending = []
+        for symbol in dict.fromkeys(symbols):
+            try:
+                pending.append((symbol, *self._prepare(symbol)))
+            except Exception as e:
+                results[symbol] = {"error": str(e)}
+
+        if self.rules_only:
+            for symbol, stock, insights, _ in pending:
+                results[symbol] = self._build_result(symbol, stock, insights, None)
+            pending = []
+
+        if self.cache is not None:
+            uncached = []
+            for item in pending:
+                symbol, stock, insights, prompt = item
+                with self._stage("cache"):
+                    cached = self.cache.get(self._cache_key(prompt))
+                if cached is None:
+                    self.metrics.inc("stock_analysis_cache_total", result="miss")
+                    uncached.append(item)
+                else:
+                    self.metrics.inc("stock_analysis_cache_total", result="hit")
+                    results[symbol] = self._build_result(symbol, stock, insights, cached)
+            pending = uncached
+
+        try:
+            order = []
+            if pending:
+                try:
+                    tokenizer = self.tokenizer
+                    with self._stage("tokenize"):
+                        encoded = self._encode_many([item[3] for item in pending], tokenizer)
+                    # sorting by length keeps each batch in one length bucket, so padding stays small
+                    order = sorted(range(len(pending)), key=lambda i: len(encoded[i]))
+                except Exception as e:
+                    # usually the model failed to load, which fails every remaining symbol alike
+                    for symbol, *_ in pending:
+                        results[symbol] = {"error": str(e)}
+
+                for start in range(0, len(order), batch_size):
+                    bucket = order[start:start + batch_size]
+                    try:
+                        texts = self._generate_batch([encoded[i] for i in bucket])
+                    except Exception:
+                        texts = None
+
+                    for pos, i in enumerate(bucket):
+                        symbol, stock, insights, prompt = pending[i]
+                        try:
+                            # a failed batch is retried one prompt at a time so errors stay per symbol
+                            text = texts[pos] if texts is not None else self._generate_batch([encoded[i]])[0]
+                            if self.cache is not None:
+                                self.cache.put(self._cache_key(prompt), text)
+                            results[symbol] = self._build_result(symbol, stock, insights, text)
+                        except Exception as e:
+                            results[symbol] = {"error": str(e)}
+        finally:
+            if pending:
+                with self._stage("gc"):
+                    gc.collect()
+            self.metrics.inc("stock_analysis_errors_total", sum(1 for r in results.values() if "error" in r))
+            self.metrics.observe("stock_analysis_seconds", time.perf_counter() - began, mode="batch")
+
+        return {symbol: results[symbol] for symbol in dict.fromkeys(symbols)}
+
+    def _cache_key(self, prompt) -> str:
+        return cache_key(self.model_name, str(prompt),
+                         dict(self.generation_kwargs, max_input_length=self.max_input_length,
+                              prompt_budget=self.prompt_builder.budget, quantize=self.inference.quantize))
+
+    def _encode(self, prompt, tokenizer) -> list:
+        return self._encode_many([prompt], tokenizer)[0]
+
+    def _encode_many(self, prompts, tokenizer) -> list:
+        budget = min(self.prompt_builder.budget, self.max_input_length)
+        encoded = self.prompt_builder.encode_many(prompts, tokenizer, budget)
+        dropped = sum(len(e.dropped) for e in encoded)
+        truncated = sum(1 for e in encoded if e.truncated)
+        if dropped:
+            self.metrics.inc("stock_analysis_prompt_lines_dropped_total", dropped)
+        if truncated:
+            self.metrics.inc("stock_analysis_prompt_truncated_total", truncated)
+        return [e.input_ids for e in encoded]
+
+    def _generate(self, prompt):
+        if self.rules_only:
+            return None
+
+        key = None
+        if self.cache is not None:
+            with self._stage("cache"):
+                key = self._cache_key(prompt)
+                cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.inc("stock_analysis_cache_total", result="hit")
+                return cached
+            self.metrics.inc("stock_analysis_cache_total", result="miss")
+
+        try:
+            # resolve the lazy properties first so model loading is not timed as tokenization
+            tokenizer, model = self.tokenizer, self.model
+            with self._stage("tokenize"):
+                input_ids = tokenizer.pad({"input_ids": [self._encode(prompt, tokenizer)]},
+                                          return_tensors="pt")["input_ids"]
+            with self.inference.context(), self._stage("generate") as timer:
+                outputs = model.generate(input_ids, **self.generation_kwargs)
+            with self._stage("decode"):
+                text = tokenizer.decode(outputs[0], skip_special_tokens=True)
+            self._record_generation(input_ids, outputs, timer.elapsed)
+        finally:
+            # only worth the pause when generation actually allocated something, cache hits skip it
+            with self._stage("gc"):
+                gc.collect()
+
+        if key is not None:
+            self.cache.put(key, text)
+        return text
+
+    def _generate_stream(self, prompt):
+        # yields text chunks and returns the exact decoded text, same as _generate would
+        if self.rules_only:
+            return None
+
+        if self.cache is not None:
+            with self._stage("cache"):
+                key = self._cache_key(prompt)
+                cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.inc("stock_analysis_cache_total", result="hit")
+                yield cached
+                return cached
+
+        if self.generation_kwargs.get("num_beams", 1) > 1:
+            # transformers cannot stream beam search, the blocking path does the same work
+            text = self._generate(prompt)
+            yield text
+            return text
+
+        if self.cache is not None:
+            self.metrics.inc("stock_analysis_cache_total", result="miss")
+
+        from transformers import TextIteratorStreamer
+
+        tokenizer, model = self.tokenizer, self.model
+        with self._stage("tokenize"):
+            input_ids = tokenizer.pad({"input_ids": [self._encode(prompt, tokenizer)]},
+                                      return_tensors="pt")["input_ids"]
+        # skip_prompt drops the decoder start token, the only "prompt" an encoder-decoder streams
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        outcome = {}
+
+        def run():
+            # inference_mode is per thread, so the context is entered here and not by the caller
+            try:
+                with self.inference.context(), self._stage("generate") as timer:
+                    outcome["outputs"] = model.generate(input_ids, streamer=streamer, **self.generation_kwargs)
+                outcome["seconds"] = timer.elapsed
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                # always unblock the consumer: a failed or streamer-less generate never ends it, and
+                # a second stop signal after generate's own end() is never read
+                streamer.end()
+
+        worker = threading.Thread(target=run, name="stream-generate", daemon=True)
+        worker.start()
+        try:
+            for chunk in streamer:
+                if chunk:
+                    yield chunk
+            worker.join()
+            if "error" in outcome:
+                raise outcome["error"]
+
+            outputs = outcome["outputs"]
+            with self._stage("decode"):
+                text = tokenizer.decode(outputs[0], skip_special_tokens=True)
+            self._record_generation(input_ids, outputs, outcome["seconds"])
+        finally:
+            worker.join()
+            with self._stage("gc"):
+                gc.collect()
+
+        if self.cache is not None:
+            self.cache.put(key, text)
+        return text
+
+    def _generate_batch(self, input_ids) -> list:
+        tokenizer, model = self.tokenizer, self.model
+        with self._stage("pad"):
+            batch = tokenizer.pad({"input_ids": input_ids}, return_tensors="pt")
+        with self.inference.context(), self._stage("generate") as timer:
+            outputs = model.generate(
+                batch["input_ids"],
+                attention_mask=batch["attention_mask"],
+                **self.generation_kwargs
+            )
+        with self._stage("decode"):
+            texts = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        self._record_generation(input_ids, outputs, timer.elapsed)
+        return texts
+
+    def _record_generation(self, input_ids, outputs, seconds):
+        if not self.metrics.enabled or seconds is None:
+            return
+        pad_id = getattr(self.tokenizer, "pad_token_id", None)
+        self.metrics.observe("stock_analysis_generate_seconds", seconds, profile=self.inference.profile,
+                             num_beams=self.generation_kwargs.get("num_beams", 1), batch_size=len(outputs))
+        for ids in input_ids:
+            self.metrics.observe("stock_analysis_input_tokens", _token_count(ids, pad_id), buckets=TOKEN_BUCKETS)
+        for ids in outputs:
+            self.metrics.observe("stock_analysis_output_tokens", _token_count(ids, pad_id), buckets=TOKEN_BUCKETS)
+
+
+def _patch_rows(frame, positions, rows) -> pd.DataFrame:
+    # a copy of frame with rows written over the given row positions, built from whole column arrays
+    # since per-cell setitem costs more than the rules it would save
+    columns = {}
+    for col in frame.columns.union(rows.columns, sort=False):
+        current = frame[col].to_numpy() if col in frame.columns else None
+        if col not in rows.columns:
+            columns[col] = current
+            continue
+        values = rows[col].to_numpy()
+        if current is None:
+            current = np.full(len(frame), np.nan, dtype=values.dtype if values.dtype.kind == 'f' else object)
+        # e.g. an int column getting NaN, widen it instead of letting the assignment fail
+        current = current.astype(np.result_type(current.dtype, values.dtype)
+                                 if current.dtype != object and values.dtype != object else object)
+        current[positions] = values
+        columns[col] = current
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+
+def _token_count(ids, pad_id):
+    ids = ids.tolist() if hasattr(ids, "tolist") else ids
+    return sum(1 for i in ids if i != pad_id)
@@ -1,8 +1,12 @@
+import os
+import queue
 import streamlit as st
 import pandas as pd
 from main import EnhancedStockAnalyzer
+from analysis_cache import AnalysisCache
+from analysis_jobs import AnalysisJobQueue
+from ingestion import SCHEMA_FILE, is_columnar
 import plotly.graph_objects as go
-import torch
 
 st.set_page_config(
     page_title="Deep Research Agent",
@@ -13,19 +17,111 @@ st.title("📈 Deep Research Agent")
 
 @st.cache_resource
 def load_analyzer():
-    return EnhancedStockAnalyzer()
+    # the model loads on a background thread, so the page and the rule-based data show up right away
+    return EnhancedStockAnalyzer(cache=AnalysisCache("analysis_cache.sqlite"), preload="background")
+
+@st.cache_resource
+def load_job_queue():
+    # shared by every session, so two users asking for the same stock share one model run
+    # streaming jobs expose the text as it is decoded, the fragment below renders it progressively
+    return AnalysisJobQueue(load_analyzer(), stream=True)
+
+@st.cache_resource
+def loaded_data():
+    # which data file version the shared analyzer holds, so every session sees the same state
+    return {"path": None, "mtime": None}
+
+@st.fragment(run_every=0.5)
+def ai_commentary(symbol):
+    job = jobs.status(symbol)
+    if job is None or job.status == "dropped":
+        try:
+            job = jobs.submit(symbol)
+        except queue.Full:
+            # the fragment reruns every half second, so this retries on its own
+            st.warning("⏳ The analysis queue is busy, retrying...")
+            return
+    if job.status == "done":
+        st.write(job.result['ai_analysis'] or "No AI commentary available.")
+    elif job.status == "failed":
+        st.error(f"Error in AI analysis: {job.error}")
+    elif job.chunks:
+        st.write(job.partial_text + " ▌")
+    else:
+        st.info(f"⏳ Generating AI commentary ({job.status})...")
+
+RANK_LABELS = {
+    "30-day change": "perChange30d",
+    "1-year change": "perChange365d",
+    "Today's change": "pChange",
+    "Trading value (Cr)": "value_cr",
+    "Position in 52-week range": "price_position",
+    "Distance from 52-week high": "pct_from_high",
+    "1-year change vs industry": "yearly_vs_industry",
+}
+
+@st.fragment
+def screener_view():
+    # a fragment, so changing a filter reruns only this block against the precomputed indexes
+    screener = analyzer.screener
+    col1, col2, col3 = st.columns(3)
+    industries = col1.multiselect("Industries", screener.industry_names)
+    rank_label = col2.selectbox("Rank by", list(RANK_LABELS))
+    ascending = col2.toggle("Lowest first", value=rank_label == "Distance from 52-week high")
+    limit = col3.number_input("Show top", min_value=5, max_value=500, value=20, step=5)
+
+    col1, col2, col3 = st.columns(3)
+    min_monthly = col1.number_input("Min 30-day change %", value=None, step=1.0)
+    near_high = col2.number_input("Within % of 52-week high", value=None, min_value=0.0, step=1.0)
+    min_value = col3.number_input("Min trading value (Cr)", value=None, min_value=0.0, step=100.0)
+
+    query = screener.query()
+    if industries:
+        query = query.industry(*industries)
+    if min_monthly is not None:
+        query = query.where('perChange30d', '>=', min_monthly)
+    if near_high is not None:
+        query = query.near_high(near_high)
+    if min_value is not None:
+        query = query.where('value_cr', '>=', min_value)
+
+    by = RANK_LABELS[rank_label]
+    columns = list(dict.fromkeys(['symbol', 'companyName', 'industry', 'lastPrice', 'pChange',
+                                  'perChange30d', 'perChange365d', 'value_cr', by]))
+    st.caption(f"{query.count()} of {screener.size} stocks match")
+    st.dataframe(query.result(by=by, ascending=ascending, limit=int(limit), columns=columns), hide_index=True)
+
+    st.markdown("#### Industry aggregates")
+    summary = screener.industry_summary()
+    if industries:
+        summary = summary.loc[[name for name in summary.index if name in industries]]
+    st.dataframe(summary[['count', 'pChange_median', 'perChange30d_median', 'perChange365d_median',
+                          'value_cr_total', 'advancers', 'decliners']])
+
 try:
     analyzer = load_analyzer()
-    analyzer.load_stock_data("stock_data.csv")
-    st.success("✅ Model and data loaded successfully!")
+    jobs = load_job_queue()
+    # typed columns written by data_formatting.py load without re-parsing, CSV is the fallback
+    data_path = "stock_data.columns" if is_columnar("stock_data.columns") else "stock_data.csv"
+    # data_formatting.py replaces schema.json last, so its mtime marks a finished rewrite
+    mtime = os.path.getmtime(os.path.join(data_path, SCHEMA_FILE) if is_columnar(data_path) else data_path)
+    loaded = loaded_data()
+    if (loaded["path"], loaded["mtime"]) != (data_path, mtime):
+        analyzer.load_stock_data(data_path)
+        # finished and in-flight jobs hold AI text generated from the old data
+        jobs.invalidate()
+        loaded.update(path=data_path, mtime=mtime)
+    if analyzer.model_loaded:
+        st.success("✅ Model and data loaded successfully!")
+    else:
+        st.success("✅ Data loaded successfully! The AI model is still loading in the background.")
 except Exception as e:
     st.error(f"❌ Error loading model or data: {str(e)}")
     st.stop()
 
 st.sidebar.header("Stock Filters")
 
-industries = analyzer.stock_data['industry'].dropna().unique().tolist() if 'industry' in analyzer.stock_data.columns else []
-industry_list = ['All'] + sorted(industries)
+industry_list = ['All'] + analyzer.records.industries()
 
 selected_industry = st.sidebar.selectbox(
     "Filter by Industry",
@@ -33,22 +129,16 @@ selected_industry = st.sidebar.selectbox(
 )
 
 if selected_industry == "All":
-    filtered_stocks = analyzer.stock_data
+    stock_options = analyzer.records.symbols()
 else:
-    filtered_stocks = analyzer.stock_data[analyzer.stock_data['industry'] == selected_industry]
-
-stock_options = filtered_stocks['symbol'].tolist()
+    stock_options = analyzer.records.symbols_for_industry(selected_industry)
 
 def format_stock_display(symbol):
     # handling NIFTY 50 separately
     if symbol == "NIFTY 50":
         return "NIFTY 50"
 
-    stock_data = analyzer.stock_data[analyzer.stock_data['symbol'] == symbol]
-    if stock_data.empty:
-        return symbol
-
-    company_name = stock_data['companyName'].iloc[0]
+    company_name = analyzer.records.value(symbol, 'companyName')
     if pd.notna(company_name):
         return f"{symbol} - {company_name}"
 
@@ -60,151 +150,209 @@ selected_stock = st.sidebar.selectbox(
     format_func=format_stock_display
 )
 
-if st.button("Analyze Stock"):
-    with st.spinner("Analyzing stock..."):
-        analysis = analyzer.analyze_stock(selected_stock)
+with st.expander("🔎 Screener"):
+    screener_view()
 
-        if "error" in analysis:
-            st.error(f"Error in analysis: {analysis['error']}")
-        else:
-            st.subheader("📊 Market Overview")
-            company_name = analysis['basic_info']['company']
-            symbol = analysis['basic_info']['symbol']
-            industry = analysis['basic_info']['industry']
-
-            if symbol == "NIFTY 50":
-                company_name = "NSE Indices"
-                industry = "Market Index"
-
-            st.write(f"""
-            **{company_name}** ({symbol}) | {industry}
-            Current Price: ₹{analysis['price_data']['current_price']:,.2f} ({analysis['performance']['daily_change']:+.2f}%)
-            """)
-
-            st.subheader("🤖 AI Summary")
-
-            st.markdown("#### 📈 Key Stock Insights")
-            st.write(f"Analysis as of {pd.Timestamp.now().strftime('%Y-%m-%d')}")
-
-            summary_tab, metrics_tab, details_tab = st.tabs(["Analysis Summary", "Key Metrics", "Detailed Insights"])
-
-            with summary_tab:
-                daily_change = analysis['performance']['daily_change']
-                daily_change_color = "red" if daily_change < 0 else "green"
-                daily_change_arrow = "↓" if daily_change < 0 else "↑"
-
-                st.metric(
-                    "Current Trading Price",
-                    f"₹{analysis['price_data']['current_price']:,.2f}",
-                    f"{daily_change_arrow} {daily_change:+.2f}% Today",
-                    delta_color="normal"  
-                )
+if st.button("Analyze Stock"):
+    st.session_state["analyzed_stock"] = selected_stock
+    try:
+        jobs.submit(selected_stock)
+    except queue.Full:
+        st.warning("The analysis queue is busy, please retry in a moment.")
+    # while the user reads this one, warm up the rest of its industry
+    industry = analyzer.records.value(selected_stock, 'industry')
+    if pd.notna(industry):
+        jobs.prefetch([s for s in analyzer.records.symbols_for_industry(industry) if s != selected_stock])
+
+if st.session_state.get("analyzed_stock") == selected_stock:
+    # the rule-based sections are cheap, the AI commentary fills in once its background job is done
+    analysis = analyzer.analyze_stock(selected_stock, include_ai=False)
+
+    if "error" in analysis:
+        st.error(f"Error in analysis: {analysis['error']}")
+    else:
+        st.subheader("📊 Market Overview")
+        company_name = analysis['basic_info']['company']
+        symbol = analysis['basic_info']['symbol']
+        industry = analysis['basic_info']['industry']
+
+        if symbol == "NIFTY 50":
+            company_name = "NSE Indices"
+            industry = "Market Index"
+
+        st.write(f"""
+        **{company_name}** ({symbol}) | {industry}
+        Current Price: ₹{analysis['price_data']['current_price']:,.2f} ({analysis['performance']['daily_change']:+.2f}%)
+        """)
+
+        st.subheader("🤖 AI Summary")
+
+        ai_commentary(selected_stock)
+
+        st.markdown("#### 📈 Key Stock Insights")
+        st.write(f"Analysis as of {pd.Timestamp.now().strftime('%Y-%m-%d')}")
+
+        summary_tab, metrics_tab, details_tab = st.tabs(["Analysis Summary", "Key Metrics", "Detailed Insights"])
+
+        with summary_tab:
+            daily_change = analysis['performance']['daily_change']
+            daily_change_color = "red" if daily_change < 0 else "green"
+            daily_change_arrow = "↓" if daily_change < 0 else "↑"
+
+            st.metric(
+                "Current Trading Price",
+                f"₹{analysis['price_data']['current_price']:,.2f}",
+                f"{daily_change_arrow} {daily_change:+.2f}% Today",
+                delta_color="normal"  
+            )
 
-            with metrics_tab:
-                col1, col2, col3 = st.columns(3)
-
-                def format_delta(value, prefix=""):
-                    arrow = "↓" if value < 0 else "↑"
-                    return f"{prefix}{arrow} {value:+.2f}%"
-
-                with col1:
-                    year_low = analysis['price_data']['year_range']['low']
-                    st.metric(
-                        "Price Range",
-                        f"₹{analysis['price_data']['year_range']['high']:,.2f}",
-                        format_delta(year_low, "Low: ₹"),
-                        delta_color="normal"
-                    )
-
-                with col2:
-                    yearly_change = analysis['performance']['yearly_change']
-                    monthly_change = analysis['performance']['monthly_change']
-                    st.metric(
-                        "Performance",
-                        format_delta(yearly_change) + " (1Y)",
-                        format_delta(monthly_change) + " (1M)",
-                        delta_color="normal"
-                    )
-
-                with col3:
-                    daily_change = analysis['performance']['daily_change']
-                    st.metric(
-                        "Trading Activity",
-                        f"₹{analysis['trading_info']['value_cr']:,.0f}Cr",
-                        format_delta(daily_change),
-                        delta_color="normal"
-                    )
-
-            with details_tab:
-                for category, (icon, color) in [
-                    ('growth', ('📈', 'green')),
-                    ('valuation', ('⚖️', 'orange')),
-                    ('technical', ('📊', 'blue')),
-                    ('market', ('🌍', 'red')),
-                    ('strategy', ('💡', 'purple'))
-                ]:
-                    if analysis['insights'][category]['details']:
-                        with st.expander(f"{icon} {analysis['insights'][category]['title']}"):
-                            for detail in analysis['insights'][category]['details']:
-                                st.markdown(f"• {detail}")
-
-            st.subheader("📈 Performance Metrics")
+        with metrics_tab:
             col1, col2, col3 = st.columns(3)
 
+            def format_delta(value, prefix=""):
+                arrow = "↓" if value < 0 else "↑"
+                return f"{prefix}{arrow} {value:+.2f}%"
+
             with col1:
-                yearly_change = analysis['performance']['yearly_change']
+                year_low = analysis['price_data']['year_range']['low']
                 st.metric(
-                    "1 Year Change",
-                    f"{yearly_change:+.2f}%",
-                    f"High: ₹{analysis['price_data']['year_range']['high']:,.2f}",
+                    "Price Range",
+                    f"₹{analysis['price_data']['year_range']['high']:,.2f}",
+                    format_delta(year_low, "Low: ₹"),
                     delta_color="normal"
                 )
 
             with col2:
+                yearly_change = analysis['performance']['yearly_change']
                 monthly_change = analysis['performance']['monthly_change']
                 st.metric(
-                    "30 Day Change",
-                    f"{monthly_change:+.2f}%",
-                    f"Low: ₹{analysis['price_data']['year_range']['low']:,.2f}",
+                    "Performance",
+                    format_delta(yearly_change) + " (1Y)",
+                    format_delta(monthly_change) + " (1M)",
                     delta_color="normal"
                 )
 
             with col3:
                 daily_change = analysis['performance']['daily_change']
                 st.metric(
-                    "Trading Value",
+                    "Trading Activity",
                     f"₹{analysis['trading_info']['value_cr']:,.0f}Cr",
                     format_delta(daily_change),
                     delta_color="normal"
                 )
 
-            performance_data = {
-                'periods': ['Daily', '30 Days', '1 Year'],
-                'changes': [
-                    analysis['performance']['daily_change'],
-                    analysis['performance']['monthly_change'],
-                    analysis['performance']['yearly_change']
-                ]
-            }
-
-            colors = ['#00ff00' if change >= 0 else '#ff0000'
-                     for change in performance_data['changes']]
-
-            fig = go.Figure(data=[
-                go.Bar(
-                    x=performance_data['periods'],
-                    y=performance_data['changes'],
-                    marker_color=colors
-                )
-            ])
-
-            fig.update_layout(
-                title="Performance Comparison",
-                yaxis_title="Change %",
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                yaxis=dict(gridcolor='rgba(128,128,128,0.1)'),
-                xaxis=dict(gridcolor='rgba(128,128,128,0.1)')
+        with details_tab:
+            for category, (icon, color) in [
+                ('growth', ('📈', 'green')),
+                ('valuation', ('⚖️', 'orange')),
+                ('technical', ('📊', 'blue')),
+                ('market', ('🌍', 'red')),
+                ('strategy', ('💡', 'purple'))
+            ]:
+                if analysis['insights'][category]['details']:
+                    with st.expander(f"{icon} {analysis['insights'][category]['title']}"):
+                        for detail in analysis['insights'][category]['details']:
+                            st.markdown(f"• {detail}")
+
+        st.subheader("📈 Performance Metrics")
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            yearly_change = analysis['performance']['yearly_change']
+            st.metric(
+                "1 Year Change",
+                f"{yearly_change:+.2f}%",
+                f"High: ₹{analysis['price_data']['year_range']['high']:,.2f}",
+                delta_color="normal"
+            )
+
+        with col2:
+            monthly_change = analysis['performance']['monthly_change']
+            st.metric(
+                "30 Day Change",
+                f"{monthly_change:+.2f}%",
+                f"Low: ₹{analysis['price_data']['year_range']['low']:,.2f}",
+                delta_color="normal"
             )
 
-            st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+        with col3:
+            daily_change = analysis['performance']['daily_change']
+            st.metric(
+                "Trading Value",
+                f"₹{analysis['trading_info']['value_cr']:,.0f}Cr",
+                format_delta(daily_change),
+                delta_color="normal"
+            )
+
+        performance_data = {
+            'periods': ['Daily', '30 Days', '1 Year'],
+            'changes': [
+                analysis['performance']['daily_change'],
+                analysis['performance']['monthly_change'],
+                analysis['performance']['yearly_change']
+            ]
+        }
+
+        colors = ['#00ff00' if change >= 0 else '#ff0000'
+                 for change in performance_data['changes']]
+
+        fig = go.Figure(data=[
+            go.Bar(
+                x=performance_data['periods'],
+                y=performance_data['changes'],
+                marker_color=colors
+            )
+        ])
+
+        fig.update_layout(
+            title="Performance Comparison",
+            yaxis_title="Change %",
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            yaxis=dict(gridcolor='rgba(128,128,128,0.1)'),
+            xaxis=dict(gridcolor='rgba(128,128,128,0.1)')
+        )
+
+        st.plotly_chart(fig, use_container_width=True)
+if st.sidebar.checkbox("Show diagnostics", value=False):
+    st.subheader("🩺 Diagnostics")
+    metrics = analyzer.metrics.to_dict()
+
+    def histogram_rows(name, label):
+        rows = []
+        for h in metrics['histograms']:
+            if h['name'] == name:
+                rows.append({
+                    label: ", ".join(f"{k}={v}" if len(h['labels']) > 1 else v
+                                     for k, v in h['labels'].items()) or "-",
+                    "count": h['count'],
+                    "mean ms": h['mean'] * 1000,
+                    "p50 ms": h['p50'] * 1000,
+                    "p95 ms": h['p95'] * 1000,
+                    "max ms": h['max'] * 1000,
+                    "total s": h['sum'],
+                })
+        return pd.DataFrame(rows)
+
+    st.markdown("#### Time per stage")
+    st.dataframe(histogram_rows('stock_analysis_stage_seconds', 'stage'), hide_index=True)
+    st.markdown("#### Generation by decoding settings")
+    st.dataframe(histogram_rows('stock_analysis_generate_seconds', 'settings'), hide_index=True)
+    st.markdown("#### Garbage collection pauses")
+    st.dataframe(histogram_rows('python_gc_pause_seconds', 'generation'), hide_index=True)
+
+    tokens = {h['name']: h for h in metrics['histograms'] if h['name'].endswith('_tokens')}
+    counters = {(c['name'], tuple(c['labels'].values())): c['value'] for c in metrics['counters']}
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Avg input tokens", f"{tokens['stock_analysis_input_tokens']['mean']:.0f}"
+                if 'stock_analysis_input_tokens' in tokens else "-")
+    col2.metric("Avg output tokens", f"{tokens['stock_analysis_output_tokens']['mean']:.0f}"
+                if 'stock_analysis_output_tokens' in tokens else "-")
+    col3.metric("Cache hits / misses", f"{counters.get(('stock_analysis_cache_total', ('hit',)), 0)} / "
+                                       f"{counters.get(('stock_analysis_cache_total', ('miss',)), 0)}")
+    col4.metric("Analysis errors", counters.get(('stock_analysis_errors_total', ()), 0))
+    st.caption(f"Decoding: {analyzer.inference!r} | Job queue: {jobs.stats}, {jobs.pending_count()} pending")
+
+    col1, col2 = st.columns(2)
+    col1.download_button("Download JSON", analyzer.metrics.to_json(indent=2), "metrics.json", "application/json")
+    col2.download_button("Download Prometheus text", analyzer.metrics.to_prometheus(), "metrics.prom", "text/plain")
@@ -0,0 +1,212 @@
+import bisect
+import gc
+import json
+import math
+import threading
+import time
+from collections import deque
+
+# seconds, from a dict lookup up to a slow beam search
+TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 384, 512, 1024)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'min', 'max', 'recent')
+
+    def __init__(self, buckets, recent=1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        # the last observations, for exact percentiles in the diagnostics views
+        self.recent = deque(maxlen=recent)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    def to_dict(self) -> dict:
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets + ('+Inf',), self.counts):
+            running += n
+            cumulative[str(bound)] = running
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": cumulative,
+        }
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start', 'elapsed')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.registry.observe(self.name, self.elapsed, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ('elapsed',)
+
+    def __init__(self):
+        self.elapsed = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class MetricsRegistry:
+    """In-process histograms and counters, exportable as JSON or Prometheus text.
+
+    Metrics are keyed by name plus labels, e.g. observe("stage_seconds", 0.2, stage="generate").
+    With track_gc=True every garbage collection pause is recorded as python_gc_pause_seconds.
+    """
+
+    def __init__(self, enabled=True, track_gc=True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        # gc callbacks can fire while this thread holds _lock, so they only append here
+        self._gc_pauses = deque(maxlen=10000)
+        self._gc_start = {}
+        if track_gc:
+            gc.callbacks.append(self._on_gc)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, value, buckets=TIME_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels) if self.enabled else _NullTimer()
+
+    def _on_gc(self, phase, info):
+        if not self.enabled:
+            return
+        if phase == "start":
+            self._gc_start[threading.get_ident()] = time.perf_counter()
+        else:
+            start = self._gc_start.pop(threading.get_ident(), None)
+            if start is not None:
+                self._gc_pauses.append((info["generation"], time.perf_counter() - start, info["collected"]))
+
+    def _drain_gc(self):
+        # two exports can drain at once (/metrics and the diagnostics panel), so empty ends the loop,
+        # not a length check another thread can invalidate before popleft
+        while True:
+            try:
+                generation, seconds, collected = self._gc_pauses.popleft()
+            except IndexError:
+                break
+            self.observe("python_gc_pause_seconds", seconds, generation=generation)
+            self.inc("python_gc_collected_objects_total", collected, generation=generation)
+
+    def close(self):
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+        self._gc_pauses.clear()
+
+    def to_dict(self) -> dict:
+        self._drain_gc()
+        with self._lock:
+            return {
+                "histograms": [dict(name=name, labels=dict(labels), **h.to_dict())
+                               for (name, labels), h in sorted(self._histograms.items())],
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self._counters.items())],
+            }
+
+    def to_json(self, indent=None) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        self._drain_gc()
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                running = 0
+                for bound, n in zip(h.buckets + ('+Inf',), h.counts):
+                    running += n
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {running}")
+                lines.append(f"{name}_sum{fmt(labels)} {h.sum}")
+                lines.append(f"{name}_count{fmt(labels)} {h.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# shared by every analyzer that is not given its own registry
+REGISTRY = MetricsRegistry()
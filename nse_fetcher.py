@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+NSE_BASE_URL = 'https://www.nseindia.com'
+INDEX_PATH = '/api/equity-stockIndices'
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0'
+}
+# NSE answers 401/403 once the session cookie from the home page has expired
+REWARM_STATUSES = {401, 403}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HostRateLimiter:
+    """Spaces requests to each host at least 1 / requests_per_second apart."""
+
+    def __init__(self, requests_per_second=3.0):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class NSEFetcher:
+    def __init__(self, base_url=NSE_BASE_URL, max_workers=4, timeout=10, retries=3,
+                 backoff=0.5, requests_per_second=3.0, headers=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = HostRateLimiter(requests_per_second)
+
+        # one pooled session for every worker, so cookies and keep-alive connections are shared
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._warm_lock = threading.Lock()
+        self._warmed = False
+
+    def warm(self, force=False):
+        with self._warm_lock:
+            if self._warmed and not force:
+                return
+            self._request(self.base_url)
+            self._warmed = True
+
+    def _request(self, url, params=None):
+        self.limiter.wait(urlparse(url).netloc)
+        return self.session.get(url, params=params, timeout=self.timeout)
+
+    def fetch_index(self, index='NIFTY 50') -> dict:
+        return self._fetch_index(index).json()
+
+    def fetch_index_raw(self, index='NIFTY 50') -> bytes:
+        # the undecoded body, so a poller can hash it and skip json decoding when nothing changed
+        return self._fetch_index(index).content
+
+    def _fetch_index(self, index):
+        self.warm()
+        url = self.base_url + INDEX_PATH
+
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = self._request(url, params={'index': index})
+                if response.status_code in REWARM_STATUSES and not last:
+                    self.warm(force=True)
+                elif response.status_code in RETRY_STATUSES and not last:
+                    pass
+                else:
+                    response.raise_for_status()
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if last:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def fetch_indices(self, indices) -> dict:
+        indices = list(dict.fromkeys(indices))
+
+        # each fetch warms the session itself, behind the warm lock the first one does it and the
+        # rest wait for it, and a failed warm-up is reported per index like any other error
+        def fetch(index):
+            try:
+                return self.fetch_index(index)
+            except Exception as e:
+                return {"error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            payloads = pool.map(fetch, indices)
+            return dict(zip(indices, payloads))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,198 @@
+import threading
+
+# lower numbers are kept longer; KEEP lines are never dropped
+KEEP = 0
+HEADER = None
+
+SECTION_LINES = [
+    "Provide a structured analysis with the following sections:",
+    "1. Overall Market Position: Current standing and momentum",
+    "2. Key Strengths: Positive factors and opportunities",
+    "3. Primary Concerns: Risk factors and challenges",
+    "4. Investment Recommendations: Clear actionable steps",
+    "5. Risk Monitoring: Specific factors to watch",
+]
+
+
+class PromptLine:
+    """One line of the prompt: a static part, encoded once, and an optional dynamic part.
+
+    The line text is static + " " + dynamic. T5's tokenizer splits on whitespace first, so
+    encoding the two halves separately gives the same ids as encoding the whole line.
+    """
+
+    __slots__ = ('static', 'dynamic', 'priority', 'group')
+
+    def __init__(self, static, dynamic=None, priority=KEEP, group=None):
+        self.static = static
+        self.dynamic = dynamic
+        self.priority = priority
+        self.group = group
+
+    @property
+    def text(self) -> str:
+        return self.static if self.dynamic is None else f"{self.static} {self.dynamic}"
+
+
+class Prompt:
+    """The lines of one analysis prompt; text is exactly what build_prompt always produced."""
+
+    __slots__ = ('lines', 'text')
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.text = "\n".join(line.text for line in lines)
+
+    def __str__(self):
+        return self.text
+
+
+class EncodedPrompt:
+    __slots__ = ('input_ids', 'text', 'dropped', 'truncated')
+
+    def __init__(self, input_ids, text, dropped, truncated):
+        self.input_ids = input_ids
+        self.text = text
+        # static text of every line left out to fit the budget, in prompt order
+        self.dropped = dropped
+        self.truncated = truncated
+
+    @property
+    def token_count(self) -> int:
+        return len(self.input_ids)
+
+
+class PromptBuilder:
+    """Builds analysis prompts and encodes them within a token budget.
+
+    Static text (headers, labels, the section list) is tokenized once per tokenizer and reused,
+    only the per-stock values are tokenized per call. When a prompt is over budget, lines are
+    dropped lowest priority first (later lines first on ties), along with headers whose lines
+    are all gone. Only if the KEEP lines alone are too long is the tail truncated, which is
+    what tokenizer truncation used to do to every long prompt.
+    """
+
+    def __init__(self, budget=512):
+        self.budget = budget
+        self._tokenizer = None
+        self._static = {}
+        self._lock = threading.Lock()
+
+    def build(self, symbol, stock, insights) -> Prompt:
+        yearly_change = float(stock['perChange365d'])
+        monthly_change = float(stock['perChange30d'])
+        daily_change = float(stock['pChange'])
+        current_price = float(stock['lastPrice'])
+        year_high = float(stock['yearHigh'])
+        year_low = float(stock['yearLow'])
+        price_position = float(stock['price_position'])
+        value_cr = float(stock['value_cr'])
+        industry = stock['industry'] if 'industry' in stock else 'N/A'
+
+        def details(name):
+            return ', '.join(insights[name]['details'])
+
+        # only with an IndicatorEngine attached; without one the prompt is unchanged
+        rolling = indicator_summary(stock)
+
+        return Prompt([
+            PromptLine("Question: Provide a detailed analysis for",
+                       f"{symbol} ({stock['companyName']}) in the {industry} sector:"),
+            PromptLine("", group="market"),
+            PromptLine("Current Market Data:", priority=HEADER, group="market"),
+            PromptLine("• Price:", f"₹{current_price:,.2f} ({daily_change:+.2f}% today)", 1, "market"),
+            PromptLine("• 52-Week Range:", f"₹{year_low:,.2f} - ₹{year_high:,.2f}", 2, "market"),
+            PromptLine("• Trading Value:", f"₹{value_cr:,.2f}Cr", 3, "market"),
+            PromptLine("• Price Position:", f"{price_position:.1f}% of 52-week range", 3, "market"),
+            PromptLine("", group="performance"),
+            PromptLine("Performance Changes:", priority=HEADER, group="performance"),
+            # daily change is already on the price line, so it is the first thing to go
+            PromptLine("• Daily:", f"{daily_change:+.2f}%", 4, "performance"),
+            PromptLine("• Monthly:", f"{monthly_change:+.2f}%", 2, "performance"),
+            PromptLine("• Yearly:", f"{yearly_change:+.2f}%", 2, "performance"),
+            PromptLine("", group="technical"),
+            PromptLine("Technical Analysis:", priority=HEADER, group="technical"),
+            PromptLine("• Growth:", details('growth'), 2, "technical"),
+            PromptLine("• Valuation:", details('valuation'), 3, "technical"),
+            PromptLine("• Technical Indicators:", details('technical'), 3, "technical"),
+            *([PromptLine("• Rolling Indicators:", rolling, 3, "technical")] if rolling else []),
+            PromptLine("• Market Risks:", details('market'), 2, "technical"),
+            PromptLine("• Strategy:", details('strategy'), 1, "technical"),
+            PromptLine(""),
+            *[PromptLine(line) for line in SECTION_LINES],
+            PromptLine(""),
+            PromptLine("Answer: "),
+        ])
+
+    def encode(self, prompt: Prompt, tokenizer, budget=None) -> EncodedPrompt:
+        return self.encode_many([prompt], tokenizer, budget)[0]
+
+    def encode_many(self, prompts, tokenizer, budget=None) -> list:
+        budget = budget or self.budget
+        with self._lock:
+            if tokenizer is not self._tokenizer:
+                self._tokenizer = tokenizer
+                self._static = {}
+            missing = list({line.static for prompt in prompts for line in prompt.lines} - self._static.keys())
+            if missing:
+                self._static.update(zip(missing, _encode_texts(tokenizer, missing)))
+            static = self._static
+
+        # every per-stock value of every prompt goes through the tokenizer in a single call
+        dynamic = [line.dynamic for prompt in prompts for line in prompt.lines if line.dynamic is not None]
+        dynamic_ids = iter(_encode_texts(tokenizer, dynamic))
+
+        eos = [tokenizer.eos_token_id] if tokenizer.eos_token_id is not None else []
+        encoded = []
+        for prompt in prompts:
+            pieces = [static[line.static] + next(dynamic_ids) if line.dynamic is not None else static[line.static]
+                      for line in prompt.lines]
+            encoded.append(self._fit(prompt, pieces, budget - len(eos), eos))
+        return encoded
+
+    def _fit(self, prompt, pieces, limit, eos) -> EncodedPrompt:
+        total = sum(len(ids) for ids in pieces)
+        kept = [True] * len(prompt.lines)
+        if total > limit:
+            candidates = sorted((i for i, line in enumerate(prompt.lines) if line.priority),
+                                key=lambda i: (-prompt.lines[i].priority, -i))
+            for i in candidates:
+                if total <= limit:
+                    break
+                kept[i] = False
+                total -= len(pieces[i])
+            self._drop_empty_groups(prompt, kept)
+
+        ids = [token for i, piece in enumerate(pieces) if kept[i] for token in piece]
+        truncated = len(ids) > limit
+        text = "\n".join(line.text for i, line in enumerate(prompt.lines) if kept[i])
+        dropped = [line.static for i, line in enumerate(prompt.lines) if not kept[i] and line.static]
+        return EncodedPrompt(ids[:limit] + eos, text, dropped, truncated)
+
+    @staticmethod
+    def _drop_empty_groups(prompt, kept):
+        # a header and its blank separator are only worth their tokens while a line of the group is left
+        alive = {line.group for i, line in enumerate(prompt.lines) if kept[i] and line.priority}
+        for i, line in enumerate(prompt.lines):
+            if line.group is not None and line.group not in alive:
+                kept[i] = False
+
+
+def indicator_summary(stock) -> str:
+    def value(col):
+        return float(stock[col]) if col in stock else float('nan')
+
+    parts = []
+    for col, template in (('rsi', "RSI {:.0f}"), ('sma', "SMA ₹{:,.2f}"), ('ema', "EMA ₹{:,.2f}"),
+                          ('vwap', "VWAP ₹{:,.2f}"), ('volatility', "volatility {:.0f}% annualized"),
+                          ('drawdown', "drawdown {:.1f}%")):
+        v = value(col)
+        if v == v:
+            parts.append(template.format(v))
+    return ', '.join(parts)
+
+
+def _encode_texts(tokenizer, texts) -> list:
+    if not texts:
+        return []
+    return tokenizer(texts, add_special_tokens=False)["input_ids"]
@@ -0,0 +1,337 @@
+import argparse
+import hashlib
+import io
+import json
+import threading
+import time
+from datetime import datetime, time as dtime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ingestion import STOCK_SCHEMA, iter_records, records_frame
+from snapshot_store import IST
+
+PRE_OPEN = dtime(9, 0)
+MARKET_OPEN = dtime(9, 15)
+MARKET_CLOSE = dtime(15, 30)
+# closing price session, the index payload settles on its 16:00 timestamp after it
+SESSION_END = dtime(16, 0)
+
+# seconds between polls per market phase
+DEFAULT_INTERVALS = {
+    'open': 5.0,
+    'pre_open': 15.0,
+    'closing': 30.0,
+    'closed': 900.0,
+}
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class MarketCalendar:
+    """NSE phases in IST: pre-open 09:00-09:15, normal market until 15:30, closing session until 16:00."""
+
+    def __init__(self, holidays=()):
+        self.holidays = {pd.Timestamp(day).date() for day in holidays}
+
+    def is_trading_day(self, day) -> bool:
+        return day.weekday() < 5 and day not in self.holidays
+
+    def phase(self, now) -> str:
+        now = now.astimezone(IST)
+        if not self.is_trading_day(now.date()):
+            return 'closed'
+        clock = now.time()
+        if PRE_OPEN <= clock < MARKET_OPEN:
+            return 'pre_open'
+        if MARKET_OPEN <= clock < MARKET_CLOSE:
+            return 'open'
+        if MARKET_CLOSE <= clock < SESSION_END:
+            return 'closing'
+        return 'closed'
+
+    def next_session(self, now) -> datetime:
+        # start of the next pre-open, today's if it is still ahead
+        now = now.astimezone(IST)
+        day = now.date()
+        while True:
+            start = datetime.combine(day, PRE_OPEN, tzinfo=IST)
+            if start > now and self.is_trading_day(day):
+                return start
+            day += timedelta(days=1)
+
+
+def peek_stamp(body):
+    """(timestamp, lastUpdateTime) from the top-level fields ahead of the records, None when there are none.
+
+    NSE puts them before `data`, so this reads a few hundred bytes instead of decoding the payload.
+    """
+    meta = {}
+    try:
+        next(iter_records(io.TextIOWrapper(io.BytesIO(body), encoding='utf-8'), meta=meta), None)
+    except ValueError:
+        return None
+    if meta.get('timestamp') is None and meta.get('lastUpdateTime') is None:
+        return None
+    return meta.get('timestamp'), meta.get('lastUpdateTime')
+
+
+class ChangeDetector:
+    """Decides how much of a polled payload is new, cheapest check first.
+
+    1. the raw body hashes the same as last time: nothing to decode
+    2. the payload timestamp / lastUpdateTime did not move: nothing to decode either, only
+       fields like metadata.timeVal were re-rendered
+    3. each record is compared as a raw dict with its last published version, and only the
+       records that differ are parsed and compared on the typed STOCK_SCHEMA columns, so rows
+       whose analysis inputs did not change never go downstream
+    """
+
+    def __init__(self):
+        self.digest = None
+        self.stamp = None
+        # last published records per symbol: raw dicts and typed row tuples
+        self.records = None
+        self.rows = None
+        self._pending = None
+
+    def seed(self, df):
+        # rows already loaded into the analyzer count as published
+        self.rows = _row_tuples(df)
+
+    def same_body(self, body) -> bool:
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        same = digest == self.digest
+        self.digest = digest
+        return same
+
+    def same_stamp(self, body) -> bool:
+        stamp = peek_stamp(body)
+        same = stamp is not None and stamp == self.stamp
+        self.stamp = stamp
+        return same
+
+    def reset(self):
+        # after a failed publish the same payload has to go through every check again
+        self.digest = self.stamp = self._pending = None
+
+    def commit(self):
+        if self._pending is not None:
+            self.records, self.rows = self._pending
+            self._pending = None
+
+    def changed_rows(self, records):
+        """Typed frame of the records that are new or changed since the last commit, and the symbols
+        that disappeared. They only count as published once commit() is called."""
+        current = {record.get('symbol'): record for record in records if isinstance(record, dict)}
+        previous = self.records or {}
+        candidates = [record for symbol, record in current.items() if previous.get(symbol) != record]
+        frame = records_frame(candidates)
+
+        rows = dict(self.rows or {})
+        changed = []
+        for symbol, row in _row_tuples(frame).items():
+            changed.append(rows.get(symbol) != row)
+            rows[symbol] = row
+        removed = [symbol for symbol in rows if symbol not in current]
+        for symbol in removed:
+            del rows[symbol]
+        self._pending = (current, rows)
+        return frame[np.array(changed, dtype=bool)].reset_index(drop=True), removed
+
+
+def _row_tuples(df) -> dict:
+    # symbol -> values of the schema columns, NaN as None so equal rows compare equal
+    columns = [c for c in STOCK_SCHEMA if c in df.columns]
+    df = df[columns].drop_duplicates('symbol', keep='last')
+    values = df.astype(object).where(df.notna(), None)
+    return {row[0]: row for row in values.itertuples(index=False, name=None)}
+
+
+class RefreshScheduler:
+    """Long-running poller that keeps an analyzer's universe current from the NSE index API.
+
+    Polls every few seconds while the market is open and backs off around and outside it:
+    slower in pre-open and the closing session, once per `closed` interval (but never past the
+    next pre-open) when the market is shut. Inside a phase the interval doubles on every poll that
+    brought nothing new, up to max_idle_factor, and on errors, up to max_backoff.
+
+    Unchanged payloads are dropped before any parsing (see ChangeDetector); with
+    trust_timestamp=False a body whose timestamp did not move still gets its rows compared.
+    Changed rows go to analyzer.update_stock_rows, the IndicatorEngine and the SnapshotStore
+    when attached, and on_change(symbols, removed) afterwards, e.g. to regenerate analyses.
+    """
+
+    def __init__(self, fetcher, analyzer=None, index='NIFTY 50', calendar=None, intervals=None,
+                 max_idle_factor=4, max_backoff=600.0, store=None, on_change=None, trust_timestamp=True,
+                 clock=time.time):
+        self.fetcher = fetcher
+        self.analyzer = analyzer
+        self.index = index
+        self.calendar = calendar or MarketCalendar()
+        self.intervals = dict(DEFAULT_INTERVALS, **(intervals or {}))
+        self.max_idle_factor = max_idle_factor
+        self.max_backoff = max_backoff
+        self.store = store
+        self.on_change = on_change
+        self.trust_timestamp = trust_timestamp
+        self.clock = clock
+        self.metrics = analyzer.metrics if analyzer is not None else None
+
+        self.detector = ChangeDetector()
+        if analyzer is not None and analyzer.stock_data is not None and not analyzer.stock_data.empty:
+            self.detector.seed(analyzer.stock_data)
+        self.idle = 0
+        self.errors = 0
+        self.last_result = None
+        self.totals = {"polls": 0, "unchanged_body": 0, "unchanged_timestamp": 0, "unchanged_rows": 0,
+                       "published": 0, "rows_published": 0, "rows_removed": 0, "errors": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock(), IST)
+
+    def poll(self) -> dict:
+        """One fetch, change check and publish. Returns what happened."""
+        start = time.perf_counter()
+        result = {"status": None, "changed": 0, "removed": 0}
+        try:
+            body = self.fetcher.fetch_index_raw(self.index)
+            if self.detector.same_body(body):
+                result["status"] = "unchanged_body"
+            elif self.detector.same_stamp(body) and self.trust_timestamp:
+                result["status"] = "unchanged_timestamp"
+            else:
+                payload = json.loads(body)
+                changed, removed = self.detector.changed_rows(payload.get('data', []))
+                if changed.empty and not removed:
+                    result["status"] = "unchanged_rows"
+                else:
+                    self._publish(payload, changed, removed)
+                    result.update(status="published", changed=len(changed), removed=len(removed),
+                                  timestamp=payload.get('timestamp'))
+                self.detector.commit()
+            self.errors = 0
+        except Exception as e:
+            self.detector.reset()
+            self.errors += 1
+            result.update(status="error", error=str(e))
+            print(f"Error refreshing {self.index}: {str(e)}")
+
+        if result["status"] == "published":
+            self.idle = 0
+        elif result["status"] != "error":
+            self.idle += 1
+        result["seconds"] = time.perf_counter() - start
+        self._record(result)
+        self.last_result = result
+        return result
+
+    def _publish(self, payload, changed, removed):
+        if self.analyzer is not None:
+            if self.analyzer.indicators is not None:
+                # a changed row is the symbol's latest close in the bar of this payload's timestamp
+                self.analyzer.indicators.append_frame(changed, payload.get('timestamp'))
+            self.analyzer.update_stock_rows(changed, removed)
+        if self.store is not None and payload.get('timestamp'):
+            # cross_section takes the latest row per symbol, so the changed rows are enough as long as
+            # the store knows which symbols are still in the index
+            members = [record.get('symbol') for record in payload.get('data', []) if isinstance(record, dict)]
+            self.store.append_frame(changed, payload['timestamp'], members=members)
+        if self.on_change is not None:
+            self.on_change(changed['symbol'].tolist(), removed)
+
+    def _record(self, result):
+        status = result["status"]
+        self.totals["polls"] += 1
+        self.totals["errors" if status == "error" else status] += 1
+        self.totals["rows_published"] += result["changed"]
+        self.totals["rows_removed"] += result["removed"]
+        if self.metrics is not None:
+            self.metrics.inc("stock_analysis_refresh_polls_total", result=status)
+            self.metrics.observe("stock_analysis_refresh_seconds", result["seconds"], result=status)
+            if status == "published":
+                self.metrics.observe("stock_analysis_refresh_changed_rows", result["changed"], buckets=ROW_BUCKETS)
+
+    def next_delay(self, now=None) -> float:
+        """Seconds until the next poll, given the market phase and the recent poll results."""
+        now = now or self.now()
+        phase = self.calendar.phase(now)
+        interval = self.intervals[phase]
+        if self.errors:
+            interval = max(interval, min(self.intervals['open'] * 2 ** self.errors, self.max_backoff))
+        else:
+            interval *= min(2 ** self.idle, self.max_idle_factor)
+        if phase == 'closed':
+            # wake up for the pre-open however long the closed interval is
+            interval = min(interval, (self.calendar.next_session(now) - now).total_seconds())
+        return max(interval, 0.0)
+
+    def run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.next_delay())
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return dict(self.totals, phase=self.calendar.phase(self.now()), idle=self.idle, errors_in_a_row=self.errors,
+                    last=self.last_result)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    from main import EnhancedStockAnalyzer
+    from nse_fetcher import NSEFetcher
+    from snapshot_store import SnapshotStore
+
+    parser = argparse.ArgumentParser(description="Keep the stock data current from the NSE index API")
+    parser.add_argument("--index", default="NIFTY 50")
+    parser.add_argument("--data", default="stock_data.csv", help="initial universe, polls only publish changes to it")
+    parser.add_argument("--base-url", default=None, help="e.g. a ReplayServer url instead of nseindia.com")
+    parser.add_argument("--store", default=None, help="append changed rows to this SnapshotStore directory")
+    parser.add_argument("--holidays", default="", help="comma separated trading holidays, YYYY-MM-DD")
+    parser.add_argument("--open-interval", type=float, default=DEFAULT_INTERVALS['open'])
+    parser.add_argument("--closed-interval", type=float, default=DEFAULT_INTERVALS['closed'])
+    args = parser.parse_args()
+
+    analyzer = EnhancedStockAnalyzer(rules_only=True)
+    analyzer.load_stock_data(args.data)
+    fetcher = NSEFetcher(**({"base_url": args.base_url} if args.base_url else {}))
+    scheduler = RefreshScheduler(
+        fetcher, analyzer, index=args.index,
+        calendar=MarketCalendar([d for d in args.holidays.split(",") if d]),
+        intervals={'open': args.open_interval, 'closed': args.closed_interval},
+        store=SnapshotStore(args.store) if args.store else None,
+        on_change=lambda symbols, removed: print(f"Published {len(symbols)} changed rows, {len(removed)} removed")
+    )
+    try:
+        while True:
+            result = scheduler.poll()
+            delay = scheduler.next_delay()
+            print(f"{scheduler.now():%H:%M:%S} {result['status']}, next poll in {delay:.0f}s")
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fetcher.close()
+
+
+if __name__ == "__main__":
+    main()
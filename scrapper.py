@@ -1,20 +1,27 @@
-import requests
 import json
+import sys
 
-# URL for NIFTY 50 data
-url = 'https://www.nseindia.com/api/equity-stockIndices?index=NIFTY%2050'
-headers = {
-    'User-Agent': 'Mozilla/5.0'
-}
+from nse_fetcher import NSEFetcher
 
-# Start session and load data
-session = requests.Session()
-session.get('https://www.nseindia.com', headers=headers)
-response = session.get(url, headers=headers)
-data = response.json()
+# indices to fetch, NIFTY 50 by default
+indices = sys.argv[1:] or ['NIFTY 50']
 
-# Save to JSON file
-with open('stock_data.json', 'w') as json_file:
-    json.dump(data, json_file, indent=4)
+with NSEFetcher() as fetcher:
+    payloads = fetcher.fetch_indices(indices)
 
-print("Data saved to 'stock_data'")
\ No newline at end of file
+for index, data in payloads.items():
+    if 'error' in data:
+        print(f"Error fetching {index}: {data['error']}")
+        continue
+
+    # first index keeps the original file name, others get their own file
+    if index == indices[0]:
+        file_name = 'stock_data.json'
+    else:
+        file_name = f"stock_data_{index.replace(' ', '_').lower()}.json"
+
+    # Save to JSON file
+    with open(file_name, 'w') as json_file:
+        json.dump(data, json_file, indent=4)
+
+    print(f"Data for {index} saved to '{file_name}'")
@@ -0,0 +1,210 @@
+import operator
+
+import numpy as np
+import pandas as pd
+
+NUMERIC_COLUMNS = ['open', 'dayHigh', 'dayLow', 'lastPrice', 'previousClose', 'change', 'pChange',
+                   'yearHigh', 'yearLow', 'totalTradedVolume', 'totalTradedValue', 'perChange365d',
+                   'perChange30d', 'price_position', 'value_cr',
+                   # from an IndicatorEngine, all NaN without one
+                   'rsi', 'volatility', 'drawdown', 'sma_gap']
+# computed once at load, alongside the columns they come from
+DERIVED_COLUMNS = ['pct_from_high', 'pct_from_low', 'yearly_vs_industry', 'monthly_vs_industry']
+# columns that get a precomputed sort order, i.e. everything a query can rank by
+RANK_COLUMNS = ['pChange', 'perChange30d', 'perChange365d', 'lastPrice', 'value_cr', 'totalTradedVolume',
+                'price_position', 'rsi', 'volatility', 'drawdown', 'sma_gap'] + DERIVED_COLUMNS
+AGGREGATE_COLUMNS = ['pChange', 'perChange30d', 'perChange365d', 'price_position', 'value_cr']
+DEFAULT_COLUMNS = ['symbol', 'companyName', 'industry', 'lastPrice', 'pChange', 'perChange30d',
+                   'perChange365d', 'price_position', 'value_cr']
+
+OPERATORS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+    '==': operator.eq, '!=': operator.ne,
+}
+
+
+class Screener:
+    """Cross-sectional filter and rank queries over a loaded stock frame.
+
+    Everything that does not depend on the query is computed in the constructor: float
+    columns, industry codes and row groups, per-industry aggregates, industry-relative
+    columns and one sort order per rank column. A query is then a few vectorized masks and
+    a walk over an existing order, with no sorting.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        n = len(df)
+        self.size = n
+        self.symbols = df['symbol'].to_numpy() if 'symbol' in df.columns else np.empty(0, dtype=object)
+        self.text = {col: df[col].to_numpy() for col in ('symbol', 'companyName', 'industry') if col in df.columns}
+
+        self.values = {}
+        for col in NUMERIC_COLUMNS:
+            if col in df.columns:
+                self.values[col] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+            else:
+                self.values[col] = np.full(n, np.nan)
+        self.flags = {col: df[col].to_numpy(dtype=bool) for col in df.columns if col.startswith('flag_')}
+
+        industry = df['industry'] if 'industry' in df.columns else pd.Series([None] * n)
+        codes, names = pd.factorize(industry, sort=True)
+        self.industry_codes = codes
+        self.industry_names = list(names)
+        self.industry_rows = {name: np.flatnonzero(codes == i) for i, name in enumerate(self.industry_names)}
+
+        self._derive()
+        self.industry_stats = self._aggregate()
+        self.industry_medians = {col: self.industry_stats[f'{col}_median'] for col in AGGREGATE_COLUMNS}
+        self._add_relative()
+
+        self.order = {}
+        for col in RANK_COLUMNS:
+            values = self.values[col]
+            order = np.argsort(values, kind='stable')
+            # argsort puts NaN last, drop them so neither direction ever ranks a missing value
+            self.order[col] = order[:n - int(np.isnan(values).sum())]
+
+    def _derive(self):
+        price, high, low = self.values['lastPrice'], self.values['yearHigh'], self.values['yearLow']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.values['pct_from_high'] = (high - price) / high * 100
+            self.values['pct_from_low'] = (price - low) / low * 100
+
+    def _aggregate(self) -> pd.DataFrame:
+        frame = pd.DataFrame({col: self.values[col] for col in AGGREGATE_COLUMNS})
+        frame['industry'] = pd.Categorical.from_codes(self.industry_codes, categories=self.industry_names)
+        grouped = frame.groupby('industry', observed=True)
+        stats = grouped.agg(**{
+            'count': ('pChange', 'size'),
+            **{f'{col}_median': (col, 'median') for col in AGGREGATE_COLUMNS},
+            **{f'{col}_mean': (col, 'mean') for col in AGGREGATE_COLUMNS},
+            'value_cr_total': ('value_cr', 'sum'),
+            'advancers': ('pChange', lambda s: int((s > 0).sum())),
+            'decliners': ('pChange', lambda s: int((s < 0).sum())),
+        })
+        stats.index = stats.index.astype(object)
+        return stats
+
+    def _add_relative(self):
+        codes = self.industry_codes
+        for col, derived in (('perChange365d', 'yearly_vs_industry'), ('perChange30d', 'monthly_vs_industry')):
+            # one extra NaN slot so rows without an industry (code -1) index it
+            medians = np.append(self.industry_medians[col].reindex(self.industry_names).to_numpy(dtype=np.float64),
+                                np.nan)
+            self.values[derived] = self.values[col] - medians[codes]
+
+    def query(self) -> 'Query':
+        return Query(self)
+
+    def industry_summary(self, sort_by='value_cr_total', ascending=False) -> pd.DataFrame:
+        return self.industry_stats.sort_values(sort_by, ascending=ascending)
+
+    def industry_stat(self, industry, column, stat='median'):
+        return float(self.industry_stats.loc[industry, f'{column}_{stat}'])
+
+    def screen(self, industry=None, filters=(), flags=(), near_high=None, near_low=None, by=None,
+               ascending=False, limit=None, columns=None) -> pd.DataFrame:
+        """One-call form of a query, e.g. from a request body.
+
+        filters is a list of (column, op, value), flags a list of flag names such as 'near_high'.
+        """
+        query = self.query()
+        if industry:
+            query = query.industry(*([industry] if isinstance(industry, str) else industry))
+        for column, op, value in filters:
+            query = query.where(column, op, value)
+        for flag in flags:
+            query = query.flag(flag)
+        if near_high is not None:
+            query = query.near_high(near_high)
+        if near_low is not None:
+            query = query.near_low(near_low)
+        return query.result(by=by, ascending=ascending, limit=limit, columns=columns)
+
+    def frame(self, rows, columns=None) -> pd.DataFrame:
+        columns = columns or DEFAULT_COLUMNS
+        data = {}
+        for col in columns:
+            if col in self.text:
+                data[col] = self.text[col][rows]
+            elif col in self.values:
+                data[col] = self.values[col][rows]
+            elif col in self.flags:
+                data[col] = self.flags[col][rows]
+            else:
+                raise KeyError(f"Unknown column: {col}")
+        return pd.DataFrame(data)
+
+
+class Query:
+    """Immutable filter chain; every method returns a new Query.
+
+    screener.query().industry("Banks").where("value_cr", ">", 500).top(10, by="perChange30d")
+    """
+
+    def __init__(self, screener, mask=None):
+        self.screener = screener
+        self.mask = mask
+
+    def _and(self, mask) -> 'Query':
+        return Query(self.screener, mask if self.mask is None else self.mask & mask)
+
+    def where(self, column, op, value) -> 'Query':
+        values = self.screener.values.get(column)
+        if values is None:
+            raise KeyError(f"Unknown numeric column: {column}")
+        if op == 'between':
+            low, high = value
+            with np.errstate(invalid='ignore'):
+                return self._and((values >= low) & (values <= high))
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+        with np.errstate(invalid='ignore'):
+            return self._and(OPERATORS[op](values, value))
+
+    def industry(self, *industries) -> 'Query':
+        codes = [self.screener.industry_names.index(name) for name in industries
+                 if name in self.screener.industry_rows]
+        return self._and(np.isin(self.screener.industry_codes, codes))
+
+    def symbols(self, symbols) -> 'Query':
+        return self._and(np.isin(self.screener.symbols, list(symbols)))
+
+    def flag(self, name) -> 'Query':
+        column = name if name.startswith('flag_') else f'flag_{name}'
+        if column not in self.screener.flags:
+            raise KeyError(f"Unknown flag: {name}")
+        return self._and(self.screener.flags[column])
+
+    def near_high(self, pct) -> 'Query':
+        # within pct % below the 52-week high
+        return self.where('pct_from_high', '<=', pct)
+
+    def near_low(self, pct) -> 'Query':
+        return self.where('pct_from_low', '<=', pct)
+
+    def rows(self, by=None, ascending=False, limit=None) -> np.ndarray:
+        screener = self.screener
+        if by is None:
+            rows = np.arange(screener.size) if self.mask is None else np.flatnonzero(self.mask)
+            return rows[:limit]
+        if by not in screener.order:
+            raise KeyError(f"Cannot rank by {by}, pick one of {', '.join(RANK_COLUMNS)}")
+        order = screener.order[by]
+        if not ascending:
+            order = order[::-1]
+        if self.mask is not None:
+            order = order[self.mask[order]]
+        return order[:limit]
+
+    def count(self) -> int:
+        return self.screener.size if self.mask is None else int(self.mask.sum())
+
+    def result(self, by=None, ascending=False, limit=None, columns=None) -> pd.DataFrame:
+        return self.screener.frame(self.rows(by, ascending, limit), columns)
+
+    def top(self, n, by, columns=None) -> pd.DataFrame:
+        return self.result(by=by, ascending=False, limit=n, columns=columns)
+
+    def bottom(self, n, by, columns=None) -> pd.DataFrame:
+        return self.result(by=by, ascending=True, limit=n, columns=columns)
@@ -0,0 +1,171 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from insight_rules import FLAG_COLUMNS
+
+# field -> (mode, amount): how far an input may drift before its analysis counts as stale
+DEFAULT_TOLERANCES = {
+    'lastPrice': ('relative', 0.005),
+    'dayHigh': ('relative', 0.005),
+    'dayLow': ('relative', 0.005),
+    'yearHigh': ('relative', 0.0),
+    'yearLow': ('relative', 0.0),
+    'pChange': ('absolute', 0.25),
+    'perChange30d': ('absolute', 0.5),
+    'perChange365d': ('absolute', 0.5),
+    'value_cr': ('relative', 0.05),
+}
+TEXT_COLUMNS = ['companyName', 'industry']
+
+
+class SnapshotDiff:
+    def __init__(self, crossed, moved, added, removed, unchanged):
+        self.crossed = crossed
+        self.moved = moved
+        self.added = added
+        self.removed = removed
+        self.unchanged = unchanged
+
+    @property
+    def changed(self) -> set:
+        return set(self.crossed) | set(self.moved) | set(self.added)
+
+    def __repr__(self):
+        return (f"SnapshotDiff(crossed={len(self.crossed)}, moved={len(self.moved)}, "
+                f"added={len(self.added)}, removed={len(self.removed)}, unchanged={self.unchanged})")
+
+
+def diff_snapshots(previous, current, tolerances=None) -> SnapshotDiff:
+    """Compares two rule-annotated stock frames (see insight_rules.apply_rules) symbol by symbol."""
+    tolerances = DEFAULT_TOLERANCES if tolerances is None else tolerances
+    prev = previous.drop_duplicates('symbol').set_index('symbol')
+    cur = current.drop_duplicates('symbol').set_index('symbol')
+
+    added = cur.index.difference(prev.index, sort=False).tolist()
+    removed = prev.index.difference(cur.index, sort=False).tolist()
+    common = cur.index.intersection(prev.index, sort=False)
+    p = prev.loc[common]
+    c = cur.loc[common]
+
+    crossed = np.zeros(len(common), dtype=bool)
+    for col in FLAG_COLUMNS:
+        if col in p.columns and col in c.columns:
+            crossed |= p[col].to_numpy(dtype=bool) != c[col].to_numpy(dtype=bool)
+
+    moved = np.zeros(len(common), dtype=bool)
+    for field, (mode, amount) in tolerances.items():
+        if field not in p.columns or field not in c.columns:
+            continue
+        before = pd.to_numeric(p[field], errors='coerce').to_numpy(dtype=np.float64)
+        after = pd.to_numeric(c[field], errors='coerce').to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = np.abs(after - before)
+            if mode == 'relative':
+                delta = np.where(before != 0, delta / np.abs(before), np.where(delta > 0, np.inf, 0.0))
+        moved |= delta > amount
+        moved |= np.isnan(before) != np.isnan(after)
+    for col in TEXT_COLUMNS:
+        if col in p.columns and col in c.columns:
+            a = p[col].astype(object).to_numpy()
+            b = c[col].astype(object).to_numpy()
+            moved |= (a != b) & ~(pd.isna(a) & pd.isna(b))
+
+    moved &= ~crossed
+    return SnapshotDiff(
+        crossed=common[crossed].tolist(),
+        moved=common[moved].tolist(),
+        added=added,
+        removed=removed,
+        unchanged=int((~(crossed | moved)).sum())
+    )
+
+
+class IncrementalAnalyzer:
+    """Keeps analyses across snapshots and regenerates only those whose inputs changed.
+
+    Staleness is judged against the rows each result was generated from, not against the previous
+    snapshot, so many small moves that each stay inside the tolerances still add up to a regeneration.
+    """
+
+    def __init__(self, analyzer, tolerances=None, batch_size=8):
+        self.analyzer = analyzer
+        self.tolerances = tolerances
+        self.batch_size = batch_size
+        self.results = {}
+        # the stock_data rows the cached results were generated from
+        self.basis = None
+        self.last_diff = None
+        self.last_stats = None
+        self.totals = {"refreshes": 0, "regenerated": 0, "skipped": 0}
+
+    def analyze(self, symbol) -> dict:
+        result = self.results.get(symbol)
+        if result is None:
+            result = self.analyzer.analyze_stock(symbol)
+            if "error" not in result:
+                self.results[symbol] = result
+                self._remember([symbol])
+        return result
+
+    def _remember(self, symbols):
+        current = self.analyzer.stock_data
+        rows = current[current['symbol'].isin(symbols)].drop_duplicates('symbol')
+        if self.basis is not None:
+            kept = self.basis['symbol'].isin(self.results) & ~self.basis['symbol'].isin(symbols)
+            rows = pd.concat([self.basis[kept], rows], ignore_index=True)
+        self.basis = rows
+
+    def refresh(self, df, timestamp=None) -> dict:
+        start = time.perf_counter()
+        previous = self.analyzer.stock_data
+        if self.analyzer.indicators is not None:
+            # every refresh is the next snapshot, the engine folds it into the bar of its timestamp
+            self.analyzer.indicators.append_frame(df, timestamp)
+        self.analyzer.set_stock_data(df)
+        current = self.analyzer.stock_data
+
+        if previous is None or previous.empty:
+            diff = SnapshotDiff([], [], current['symbol'].drop_duplicates().tolist(), [], 0)
+        else:
+            diff = diff_snapshots(previous, current, self.tolerances)
+
+        for symbol in diff.removed:
+            self.results.pop(symbol, None)
+        stale = []
+        if self.results and self.basis is not None:
+            # compared with what each kept result was generated from, so drift cannot accumulate
+            changed = diff_snapshots(self.basis[self.basis['symbol'].isin(self.results)], current,
+                                     self.tolerances).changed
+            stale = [symbol for symbol in self.results if symbol in changed]
+        # counted before regenerating, a result that fails to regenerate is dropped from self.results
+        held = len(self.results)
+        if stale:
+            regenerated = []
+            for symbol, result in self.analyzer.analyze_many(stale, batch_size=self.batch_size).items():
+                if "error" in result:
+                    self.results.pop(symbol, None)
+                else:
+                    self.results[symbol] = result
+                    regenerated.append(symbol)
+            self._remember(regenerated)
+
+        kept = held - len(stale)
+        self.last_diff = diff
+        self.last_stats = {
+            "symbols": len(current),
+            "crossed_threshold": len(diff.crossed),
+            "moved_beyond_tolerance": len(diff.moved),
+            "added": len(diff.added),
+            "removed": len(diff.removed),
+            "unchanged": diff.unchanged,
+            "regenerated": len(stale),
+            "skipped": kept,
+            "skipped_fraction": kept / held if held else 0.0,
+            "seconds": time.perf_counter() - start
+        }
+        self.totals["refreshes"] += 1
+        self.totals["regenerated"] += len(stale)
+        self.totals["skipped"] += kept
+        return self.last_stats
@@ -0,0 +1,326 @@
+import json
+import os
+import threading
+from datetime import timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from ingestion import STOCK_SCHEMA, iter_records, records_frame
+
+NSE_TIME_FORMAT = '%d-%b-%Y %H:%M:%S'
+# NSE timestamps are IST wall clock, and NSE trades on IST all year, there is no daylight saving to follow
+IST = timezone(timedelta(hours=5, minutes=30))
+FIELDS = [name for name, (_, dtype) in STOCK_SCHEMA.items() if dtype != 'str']
+# every segment column is a headerless fixed-width file, so appends are plain writes
+COLUMN_DTYPES = dict({'ts': np.int64, 'sym': np.int32, 'key': np.int64}, **{f: np.float64 for f in FIELDS})
+MANIFEST = 'manifest.json'
+SYMBOLS = 'symbols.json'
+# [ts, sorted symbol ids] every time the set of constituents changes
+MEMBERSHIP = 'membership.json'
+
+
+def parse_timestamp(value) -> int:
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(pd.Timestamp(pd.to_datetime(value, format=NSE_TIME_FORMAT)).timestamp())
+        except ValueError:
+            pass
+    return int(pd.Timestamp(value).timestamp())
+
+
+def _key(sym, ts):
+    # (symbol, time) packed into one sortable int64, seconds fit in the low 32 bits until 2106
+    return (np.asarray(sym, dtype=np.int64) << 32) | np.asarray(ts, dtype=np.int64)
+
+
+class SnapshotStore:
+    """Append-only history of NSE snapshots, keyed by payload timestamp and symbol.
+
+    New snapshots go to time-ordered raw segments. Once `compact_after` raw segments
+    exist they are merged into one segment sorted by (symbol, time), where a series or
+    cross-section lookup is a binary search over memory-mapped columns.
+    """
+
+    def __init__(self, path, segment_rows=100_000, compact_after=8):
+        self.path = path
+        self.segment_rows = segment_rows
+        self.compact_after = compact_after
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.join(path, 'segments'), exist_ok=True)
+        self.manifest = self._read_json(MANIFEST, {"segments": [], "last_ts": None, "snapshots": 0, "next_id": 0})
+        self.symbols = self._read_json(SYMBOLS, [])
+        self.symbol_ids = {info['symbol']: i for i, info in enumerate(self.symbols)}
+        self.membership = self._read_json(MEMBERSHIP, [])
+
+    def _read_json(self, name, default):
+        file_path = os.path.join(self.path, name)
+        if not os.path.exists(file_path):
+            return default
+        with open(file_path) as f:
+            return json.load(f)
+
+    def _write_json(self, name, value):
+        file_path = os.path.join(self.path, name)
+        with open(file_path + '.tmp', 'w') as f:
+            json.dump(value, f)
+        os.replace(file_path + '.tmp', file_path)
+
+    def _segment_dir(self, segment):
+        return os.path.join(self.path, 'segments', segment['name'])
+
+    def _column(self, segment, name):
+        rows = segment['rows']
+        if rows == 0:
+            return np.empty(0, dtype=COLUMN_DTYPES[name])
+        return np.memmap(os.path.join(self._segment_dir(segment), f"{name}.bin"),
+                         dtype=COLUMN_DTYPES[name], mode='r', shape=(rows,))
+
+    def _new_segment(self, sorted_):
+        segment = {"name": f"seg-{self.manifest['next_id']:06d}", "rows": 0,
+                   "ts_min": None, "ts_max": None, "sorted": sorted_}
+        self.manifest['next_id'] += 1
+        os.makedirs(self._segment_dir(segment), exist_ok=True)
+        return segment
+
+    def _write_rows(self, segment, columns):
+        rows = len(columns['ts'])
+        for name, dtype in COLUMN_DTYPES.items():
+            with open(os.path.join(self._segment_dir(segment), f"{name}.bin"), 'ab') as f:
+                # drop rows a crashed append wrote but never recorded in the manifest
+                f.truncate(segment['rows'] * np.dtype(dtype).itemsize)
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        segment['rows'] += rows
+        ts_min, ts_max = int(columns['ts'].min()), int(columns['ts'].max())
+        segment['ts_min'] = ts_min if segment['ts_min'] is None else min(segment['ts_min'], ts_min)
+        segment['ts_max'] = ts_max if segment['ts_max'] is None else max(segment['ts_max'], ts_max)
+
+    def _symbol_id(self, symbol, company, industry):
+        sym = self.symbol_ids.get(symbol)
+        info = {"symbol": symbol,
+                "companyName": None if pd.isna(company) else company,
+                "industry": None if pd.isna(industry) else industry}
+        if sym is None:
+            sym = len(self.symbols)
+            self.symbols.append(info)
+            self.symbol_ids[symbol] = sym
+        else:
+            self.symbols[sym] = info
+        return sym
+
+    def append_frame(self, df, timestamp, members=None) -> bool:
+        """Adds one snapshot. Returns False when a snapshot for this timestamp is already stored.
+
+        members are the symbols in the universe at this time, by default those of df. Pass them when
+        df only holds the rows that changed, so unchanged symbols are not taken as dropped.
+        """
+        ts = parse_timestamp(timestamp)
+        with self._lock:
+            if self.manifest['last_ts'] is not None and ts <= self.manifest['last_ts']:
+                return False
+
+            company = df['companyName'] if 'companyName' in df.columns else [None] * len(df)
+            industry = df['industry'] if 'industry' in df.columns else [None] * len(df)
+            sym = np.fromiter((self._symbol_id(s, c, i) for s, c, i in zip(df['symbol'], company, industry)),
+                              dtype=np.int32, count=len(df))
+            columns = {'ts': np.full(len(df), ts, dtype=np.int64), 'sym': sym, 'key': _key(sym, ts)}
+            for field in FIELDS:
+                if field in df.columns:
+                    columns[field] = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=np.float64)
+                else:
+                    columns[field] = np.full(len(df), np.nan)
+
+            raw = [s for s in self.manifest['segments'] if not s['sorted']]
+            if not raw or raw[-1]['rows'] + len(df) > self.segment_rows:
+                raw.append(self._new_segment(False))
+                self.manifest['segments'].append(raw[-1])
+            if len(df):
+                self._write_rows(raw[-1], columns)
+
+            members = sorted({self.symbol_ids[s] for s in (df['symbol'] if members is None else members)
+                              if s in self.symbol_ids})
+            if not self.membership or self.membership[-1][1] != members:
+                self.membership.append([ts, members])
+                self._write_json(MEMBERSHIP, self.membership)
+
+            self.manifest['last_ts'] = ts
+            self.manifest['snapshots'] += 1
+            self._write_json(SYMBOLS, self.symbols)
+            self._write_json(MANIFEST, self.manifest)
+
+            if len(raw) >= self.compact_after:
+                self.compact()
+        return True
+
+    @staticmethod
+    def _records_frame(records) -> pd.DataFrame:
+        return records_frame(records)
+
+    def append_json(self, json_path) -> bool:
+        # streams the records like ingestion does, the payload timestamp keys the snapshot
+        meta = {}
+        with open(json_path, 'r', encoding='utf-8') as f:
+            df = self._records_frame(iter_records(f, meta=meta))
+        return self.append_frame(df, meta['timestamp'])
+
+    def append_payload(self, payload) -> bool:
+        return self.append_frame(self._records_frame(payload['data']), payload['timestamp'])
+
+    def compact(self, full=False):
+        """Merges raw segments (or every segment with full=True) into one (symbol, time)-sorted segment."""
+        with self._lock:
+            merge = [s for s in self.manifest['segments'] if full or not s['sorted']]
+            if not merge:
+                return
+            keys = np.concatenate([self._column(s, 'key') for s in merge])
+            order = np.argsort(keys, kind='stable')
+
+            segment = self._new_segment(True)
+            columns = {name: np.concatenate([self._column(s, name) for s in merge])[order]
+                       for name in COLUMN_DTYPES}
+            if len(order):
+                self._write_rows(segment, columns)
+
+            self.manifest['segments'] = [s for s in self.manifest['segments'] if s not in merge] + [segment]
+            self._write_json(MANIFEST, self.manifest)
+            for old in merge:
+                for name in COLUMN_DTYPES:
+                    file_path = os.path.join(self._segment_dir(old), f"{name}.bin")
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                os.rmdir(self._segment_dir(old))
+
+    def series(self, symbol, start=None, end=None, fields=None) -> pd.DataFrame:
+        """One symbol's rows between start and end (inclusive), oldest first."""
+        fields = fields or ['lastPrice']
+        lo = parse_timestamp(start) if start is not None else 0
+        hi = parse_timestamp(end) if end is not None else (1 << 32) - 1
+        sym = self.symbol_ids.get(symbol)
+        parts = {name: [] for name in ['ts'] + fields}
+        # the lock keeps compaction from removing segment files halfway through a query
+        with self._lock:
+            for segment in self.manifest['segments'] if sym is not None else []:
+                if not segment['rows'] or segment['ts_max'] < lo or segment['ts_min'] > hi:
+                    continue
+                if segment['sorted']:
+                    key = self._column(segment, 'key')
+                    rows = slice(np.searchsorted(key, _key(sym, lo), side='left'),
+                                 np.searchsorted(key, _key(sym, hi), side='right'))
+                else:
+                    ts = self._column(segment, 'ts')
+                    first = np.searchsorted(ts, lo, side='left')
+                    last = np.searchsorted(ts, hi, side='right')
+                    rows = first + np.flatnonzero(self._column(segment, 'sym')[first:last] == sym)
+                for name in parts:
+                    parts[name].append(np.asarray(self._column(segment, name)[rows]))
+
+        data = {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=COLUMN_DTYPES[name])
+                for name, chunks in parts.items()}
+        order = np.argsort(data['ts'], kind='stable')
+        frame = pd.DataFrame({name: values[order] for name, values in data.items()})
+        frame.insert(0, 'timestamp', pd.to_datetime(frame.pop('ts'), unit='s'))
+        return frame
+
+    def history(self, fields=None, start=None, end=None) -> pd.DataFrame:
+        """Every stored row between start and end, one snapshot after another in time order."""
+        fields = fields or ['lastPrice']
+        lo = parse_timestamp(start) if start is not None else 0
+        hi = parse_timestamp(end) if end is not None else (1 << 32) - 1
+        parts = {name: [] for name in ['ts', 'sym'] + fields}
+        with self._lock:
+            for segment in self.manifest['segments']:
+                if not segment['rows'] or segment['ts_max'] < lo or segment['ts_min'] > hi:
+                    continue
+                ts = np.asarray(self._column(segment, 'ts'))
+                rows = np.flatnonzero((ts >= lo) & (ts <= hi))
+                for name in parts:
+                    parts[name].append(np.asarray(self._column(segment, name)[rows]))
+            names = np.array([info['symbol'] for info in self.symbols], dtype=object)
+
+        data = {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=COLUMN_DTYPES[name])
+                for name, chunks in parts.items()}
+        order = np.lexsort((data['sym'], data['ts']))
+        frame = pd.DataFrame({'timestamp': pd.to_datetime(data['ts'][order], unit='s'),
+                              'symbol': names[data['sym'][order]]})
+        for name in fields:
+            frame[name] = data[name][order]
+        return frame
+
+    def cross_section(self, at=None) -> pd.DataFrame:
+        """Latest stored row of every symbol in the universe at `at`, shaped like the CSV stock data.
+
+        Symbols that had dropped out of the index by then are left out rather than returned with
+        their last (stale) row. Stores written before membership was recorded keep every symbol.
+        """
+        with self._lock:
+            at = parse_timestamp(at) if at is not None else self.manifest['last_ts']
+            if at is None or not self.symbols:
+                return pd.DataFrame(columns=list(STOCK_SCHEMA))
+            return self._cross_section(at)
+
+    def _cross_section(self, at):
+        segments = self.manifest['segments']
+        symbols = self.symbols
+
+        n = len(symbols)
+        best_ts = np.full(n, -1, dtype=np.int64)
+        best_seg = np.full(n, -1, dtype=np.int64)
+        best_row = np.zeros(n, dtype=np.int64)
+        for i, segment in enumerate(segments):
+            if not segment['rows'] or segment['ts_min'] > at:
+                continue
+            if segment['sorted']:
+                # last row at or before `at` for every symbol: one vectorized binary search
+                key = self._column(segment, 'key')
+                sym_ids = np.arange(n, dtype=np.int64)
+                rows = np.searchsorted(key, _key(sym_ids, at), side='right') - 1
+                hit = rows >= 0
+                found = np.asarray(key[rows[hit]])
+                hit[hit] = (found >> 32) == sym_ids[hit]
+                ts = np.full(n, -1, dtype=np.int64)
+                ts[hit] = np.asarray(key[rows[hit]]) & 0xFFFFFFFF
+            else:
+                end = np.searchsorted(self._column(segment, 'ts'), at, side='right')
+                seg_sym = np.asarray(self._column(segment, 'sym')[:end])
+                seg_ts = np.asarray(self._column(segment, 'ts')[:end])
+                rows = np.full(n, -1, dtype=np.int64)
+                # rows are time ordered, so the last write per symbol wins
+                rows[seg_sym] = np.arange(end)
+                ts = np.full(n, -1, dtype=np.int64)
+                hit = rows >= 0
+                ts[hit] = seg_ts[rows[hit]]
+            newer = ts > best_ts
+            best_ts[newer] = ts[newer]
+            best_seg[newer] = i
+            best_row[newer] = rows[newer]
+
+        present = np.flatnonzero(best_ts >= 0)
+        members = self._members(at)
+        if members is not None:
+            present = np.intersect1d(present, members)
+        frame = {
+            'symbol': [symbols[s]['symbol'] for s in present],
+            'companyName': [symbols[s]['companyName'] or np.nan for s in present],
+            'industry': [symbols[s]['industry'] or np.nan for s in present],
+        }
+        for field in FIELDS:
+            values = np.full(len(present), np.nan)
+            for i in np.unique(best_seg[present]):
+                mask = best_seg[present] == i
+                values[mask] = self._column(segments[i], field)[best_row[present][mask]]
+            frame[field] = values
+        frame = pd.DataFrame(frame)
+        frame['snapshot_time'] = pd.to_datetime(best_ts[present], unit='s')
+        return frame
+
+    def _members(self, at):
+        # membership of the latest snapshot at or before `at`, None when none was recorded
+        times = [ts for ts, _ in self.membership]
+        i = np.searchsorted(times, at, side='right') - 1
+        return np.asarray(self.membership[i][1], dtype=np.int64) if i >= 0 else None
+
+    def snapshot_count(self) -> int:
+        return self.manifest['snapshots']
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+
+class StockRecord:
+    """Row view over a StockStore, indexable like the pandas row it replaces."""
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._store.columns[key][self._row]
+
+    def __contains__(self, key):
+        return key in self._store.columns
+
+    def get(self, key, default=None):
+        column = self._store.columns.get(key)
+        return default if column is None else column[self._row]
+
+    def keys(self):
+        return self._store.columns.keys()
+
+    def to_dict(self) -> dict:
+        return {key: column[self._row] for key, column in self._store.columns.items()}
+
+    def __repr__(self):
+        return f"StockRecord({self.get('symbol')!r})"
+
+
+class StockStore:
+    """Column arrays for a loaded stock frame plus symbol and industry indexes."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.columns = {col: df[col].to_numpy() for col in df.columns}
+        symbols = self.columns.get('symbol', np.empty(0, dtype=object))
+
+        # first occurrence wins, same as the old mask lookup with .iloc[0]
+        self.symbol_index = {}
+        for row, symbol in enumerate(symbols):
+            self.symbol_index.setdefault(symbol, row)
+
+        self.industry_index = {}
+        if 'industry' in self.columns:
+            for symbol, industry in zip(symbols, self.columns['industry']):
+                if pd.notna(industry):
+                    self.industry_index.setdefault(industry, []).append(symbol)
+
+    def __len__(self):
+        return len(self.symbol_index)
+
+    def with_columns(self, df, columns) -> 'StockStore':
+        """A store for df, which has this store's row layout with only columns changed.
+
+        The indexes are shared and the untouched arrays reused. This store is left as it was,
+        so a reader holding it never sees half of an update.
+        """
+        store = object.__new__(StockStore)
+        store.columns = {**self.columns, **{col: df[col].to_numpy() for col in columns}}
+        store.symbol_index = self.symbol_index
+        store.industry_index = self.industry_index
+        return store
+
+    def __contains__(self, symbol):
+        return symbol in self.symbol_index
+
+    def record(self, symbol) -> StockRecord:
+        row = self.symbol_index.get(symbol)
+        if row is None:
+            raise LookupError(f"Symbol {symbol} not found")
+        return StockRecord(self, row)
+
+    def value(self, symbol, column, default=None):
+        row = self.symbol_index.get(symbol)
+        if row is None or column not in self.columns:
+            return default
+        return self.columns[column][row]
+
+    def symbols(self) -> list:
+        return list(self.symbol_index)
+
+    def industries(self) -> list:
+        return sorted(self.industry_index)
+
+    def symbols_for_industry(self, industry) -> list:
+        return self.industry_index.get(industry, [])
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from main import EnhancedStockAnalyzer
+from metrics import MetricsRegistry
+from snapshot_diff import IncrementalAnalyzer
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stock_data.csv')
+
+
+def test_refresh_counts_skipped_when_a_regeneration_fails():
+    analyzer = EnhancedStockAnalyzer(rules_only=True, metrics=MetricsRegistry(track_gc=False))
+    analyzer.load_stock_data(DATA)
+    incremental = IncrementalAnalyzer(analyzer)
+    for symbol in ('TCS', 'INFY', 'ITC', 'SBIN'):
+        assert "error" not in incremental.analyze(symbol)
+
+    analyze_many = analyzer.analyze_many
+
+    def failing(symbols, **options):
+        results = analyze_many([s for s in symbols if s != 'TCS'], **options)
+        results['TCS'] = {"error": "model failed"}
+        return results
+
+    analyzer.analyze_many = failing
+    frame = pd.read_csv(DATA)
+    moved = frame['symbol'].isin(['TCS', 'INFY'])
+    frame.loc[moved, 'lastPrice'] *= 1.2
+    stats = incremental.refresh(frame)
+
+    assert stats["regenerated"] == 2
+    assert stats["skipped"] == 2
+    assert stats["skipped_fraction"] == 0.5
+    assert incremental.totals["skipped"] == 2
+    assert 'TCS' not in incremental.results and 'INFY' in incremental.results
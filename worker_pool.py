@@ -0,0 +1,235 @@
+import gc
+import itertools
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+from analysis_cache import AnalysisCache
+from main import EnhancedStockAnalyzer
+
+
+def _proc_kb(pid, path, fields) -> dict:
+    values = dict.fromkeys(fields, 0)
+    try:
+        with open(f'/proc/{pid}/{path}') as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in values:
+                    values[name] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def memory_usage(pid) -> dict:
+    """RSS, PSS and the shared/private split of a process, in MiB (Linux)."""
+    status = _proc_kb(pid, 'status', ('VmRSS',))
+    rollup = _proc_kb(pid, 'smaps_rollup', ('Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'))
+    return {
+        "rss_mb": status['VmRSS'] / 1024,
+        # PSS charges every shared page to its sharers in equal parts, so it sums to real usage
+        "pss_mb": rollup['Pss'] / 1024,
+        "shared_mb": (rollup['Shared_Clean'] + rollup['Shared_Dirty']) / 1024,
+        "private_mb": (rollup['Private_Clean'] + rollup['Private_Dirty']) / 1024,
+    }
+
+
+def _worker_main(index, analyzer, conn, threads, cache_path):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    # the parent's SQLite connection must not be shared, every worker opens its own
+    analyzer.cache = AnalysisCache(cache_path) if cache_path else None
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        task_id, method, args = task
+        try:
+            result = getattr(analyzer, method)(*args)
+        except Exception as e:
+            result = {"error": str(e)}
+        conn.send((task_id, result))
+
+
+class AnalysisWorkerPool:
+    """Loads the model once and forks workers that share its weights copy-on-write.
+
+    The parent loads the stock data and the model (quantized too, if the InferenceConfig asks
+    for it), freezes the gc generations so collections in the children do not dirty those
+    pages, then forks. Each worker only gets private pages for what it allocates while
+    generating. Every worker has its own pipe and the parent hands the next request to
+    whichever worker is idle, so it always knows what a worker was running if it dies.
+    Linux only: it needs fork and /proc for the memory numbers.
+    """
+
+    def __init__(self, data_path, workers=2, threads_per_worker=None, cache_path=None, **analyzer_options):
+        self._ctx = multiprocessing.get_context("fork")
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.cache_path = cache_path
+
+        self.analyzer = EnhancedStockAnalyzer(preload="eager", **analyzer_options)
+        self.analyzer.load_stock_data(data_path)
+        gc.collect()
+        gc.freeze()
+
+        self._ids = itertools.count()
+        self._futures = {}
+        self._backlog = deque()
+        self._idle = deque()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._closing = False
+
+        self.completed = [0] * workers
+        self.restarts = 0
+        self._processes = [None] * workers
+        self._conns = [None] * workers
+        for index in range(workers):
+            self._spawn(index)
+        self._collector = threading.Thread(target=self._collect, name="worker-pool-results", daemon=True)
+        self._collector.start()
+
+    def _spawn(self, index):
+        conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.analyzer, child_conn, self.threads_per_worker, self.cache_path),
+            name=f"analysis-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._processes[index] = process
+        self._conns[index] = conn
+        self._idle.append(index)
+
+    def _dispatch(self):
+        # caller holds the lock
+        while self._backlog and self._idle:
+            index = self._idle.popleft()
+            task = self._backlog.popleft()
+            self._in_flight[index] = task[0]
+            self._conns[index].send(task)
+
+    def _submit(self, method, *args) -> Future:
+        if self._closing:
+            raise RuntimeError("Worker pool is closed")
+        future = Future()
+        with self._lock:
+            task_id = next(self._ids)
+            self._futures[task_id] = future
+            self._backlog.append((task_id, method, args))
+            self._dispatch()
+        return future
+
+    def submit(self, symbol) -> Future:
+        return self._submit("analyze_stock", symbol)
+
+    def submit_many(self, symbols, batch_size=8) -> Future:
+        # one task, analyze_many batches inside a single worker
+        return self._submit("analyze_many", list(symbols), batch_size)
+
+    def analyze(self, symbol, timeout=None) -> dict:
+        return self.submit(symbol).result(timeout)
+
+    def map(self, symbols, timeout=None) -> dict:
+        futures = {symbol: self.submit(symbol) for symbol in dict.fromkeys(symbols)}
+        return {symbol: future.result(timeout) for symbol, future in futures.items()}
+
+    def _collect(self):
+        while not self._closing:
+            conns = {conn: index for index, conn in enumerate(self._conns)}
+            sentinels = {process.sentinel: index for index, process in enumerate(self._processes)}
+            for ready in wait(list(conns) + list(sentinels), timeout=0.5):
+                if self._closing:
+                    break
+                if ready in conns:
+                    self._receive(conns[ready])
+                elif not self._processes[sentinels[ready]].is_alive():
+                    self._restart(sentinels[ready])
+
+    def _receive(self, index):
+        try:
+            task_id, result = self._conns[index].recv()
+        except (EOFError, OSError):
+            # the worker died, its sentinel is ready too
+            return
+        with self._lock:
+            self._in_flight.pop(index, None)
+            self.completed[index] += 1
+            future = self._futures.pop(task_id, None)
+            self._idle.append(index)
+            self._dispatch()
+        if future is not None:
+            future.set_result(result)
+
+    def _restart(self, index):
+        process = self._processes[index]
+        with self._lock:
+            if self._processes[index] is not process or self._closing:
+                return
+            task_id = self._in_flight.pop(index, None)
+            future = self._futures.pop(task_id, None) if task_id is not None else None
+            if index in self._idle:
+                self._idle.remove(index)
+            self._conns[index].close()
+            print(f"Analysis worker {index} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+            self._spawn(index)
+            self.restarts += 1
+            self._dispatch()
+        if future is not None:
+            future.set_exception(RuntimeError(f"Worker {process.pid} exited with code {process.exitcode}"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._futures)
+            queued = len(self._backlog)
+        return {
+            "parent": dict(pid=os.getpid(), **memory_usage(os.getpid())),
+            "workers": [dict(index=index, pid=process.pid, alive=process.is_alive(), completed=self.completed[index],
+                             **memory_usage(process.pid))
+                        for index, process in enumerate(self._processes)],
+            "pending": pending,
+            "queued": queued,
+            "restarts": self.restarts,
+            "threads_per_worker": self.threads_per_worker,
+        }
+
+    def close(self, timeout=10):
+        if self._closing:
+            return
+        self._closing = True
+        self._collector.join(timeout)
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._conns:
+            conn.close()
+        with self._lock:
+            futures, self._futures = list(self._futures.values()), {}
+            self._backlog.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError("Worker pool closed"))
+        gc.unfreeze()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False